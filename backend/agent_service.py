@@ -1,10 +1,17 @@
 # c:/Users/dbmar/Downloads/ai_planner/backend/services/agent_service.py
+import asyncio
+import os
+import queue
 import time
 import json
-from flask import current_app
 import ast
+import contextlib
+import functools
+import re
+import threading
 import traceback
-from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, List, Dict, Any, Optional, Set
 
 # Import the Mission model using a flexible path so this file works
 # both as a package module and as a standalone script import.
@@ -13,50 +20,251 @@ try:
 except Exception:
     from mission import Mission, MissionStatus
 from . import db
+from . import llm_cache
+from . import metrics
+from . import plan_library
+from .json_stream import ArrayItemParser
+from .llm_router import LLMRouter, RoutedLLM
+from .log_buffer import MissionLogBuffer, get_console_logger
+from .mission_persister import MissionPersister, TERMINAL_STATUSES
+from .tool_engine import StubSearchBackend, ToolEngine
 
-# LangChain and LangGraph imports
-from langgraph.graph import StateGraph, END
-from langchain_core.tools import tool
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser, JsonOutputParser
-from langchain_ollama import ChatOllama
+# LangChain and LangGraph are imported lazily (see get_llm and
+# AgentService._build_graph) so importing this module stays cheap and never
+# touches the network.
 
 # --- 1. Service Configuration ---
 CONFIG = {
     'llm_model': 'llama3.2:1b', # Using a more general model name
     'temperature': 0.2,
+    'keep_alive': '30m',     # How long Ollama keeps the model loaded after a call
+    'max_parallel_steps': 4, # Upper bound on plan steps executed concurrently
+    'step_delay': 1.5,       # Simulated work time per step, in seconds
+    'llm_cache_enabled': True, # Reuse cached clarify/plan responses for identical prompts
+    'report_chunk_chars': 80,    # Stream report text once this many characters are buffered...
+    'report_chunk_interval': 0.1, # ...or this many seconds have passed since the last chunk
+    'report_token_budget': 3000, # Largest report prompt sent in one call; bigger logs are summarized in parts
+    'report_max_parallel': 4,  # Partial summaries generated at once
+    'report_max_rounds': 3,    # Rounds of summarizing summaries before the report is written anyway
+    'log_flush_interval': 0.1, # Max seconds a log line waits before its batch is sent
+    'log_batch_size': 50,      # Send a log batch as soon as it holds this many lines
+    'persist_delay': 0.5,      # Coalesce mission DB writes made within this many seconds
+    'max_tool_calls_per_step': 3, # Tool calls the model may request for one step
+    'tool_hints': True,        # Ask the model to pick tools only for steps matching a tool's TOOL_HINTS
+    'tool_workers': 8,         # Threads shared by all missions for running tool calls
+    'tools': {                 # Per-tool concurrency limit, timeout (s) and result TTL (s)
+        'web_search': {'max_concurrency': 2, 'timeout': 10.0, 'ttl': 600.0},
+    },
+    'search_latency': 1.0,     # Simulated latency of the offline search backend, in seconds
+    'llm_timeout': 300,        # HTTP timeout for a single Ollama request, in seconds
+    'llm_max_connections': 16, # Keep-alive HTTP connections per Ollama endpoint for async missions
+    # Ollama servers requests are spread over, from a comma-separated OLLAMA_HOSTS
+    'llm_endpoints': [h.strip() for h in os.environ.get('OLLAMA_HOSTS', 'http://127.0.0.1:11434').split(',')
+                      if h.strip()],
+    'llm_hedge_delay': 3.0,    # Also send a JSON request to a second endpoint if no token arrived by then (None disables)
+    'llm_failure_threshold': 3, # Consecutive failures that eject an endpoint...
+    'llm_reset_timeout': 30,   # ...for this many seconds before it gets a trial request
+    'llm_health_interval': 15, # Seconds between endpoint health checks (None disables them)
+    'mission_timeout': 900,    # Whole-mission deadline in seconds (None disables it)
+    'node_timeouts': {         # Per-node deadlines in seconds (None disables one)
+        'clarify_goal': 120,
+        'create_plan': 180,
+        'clarify_and_plan': 300,  # Fused planning (see FUSED_PLANNING)
+        'execute_step': 300,
+        'synthesize_report': 300,
+    },
 }
 
-def initialize_llm():
-    """Initializes and validates the LLM connection."""
+# The JSON-mode model used by the clarify/plan nodes and the plain-text model
+# used for reports. Both are created on first use by get_llm/get_report_llm
+# and route their requests over the endpoints in CONFIG['llm_endpoints'].
+llm = None
+report_llm = None
+async_llm = None
+router = None
+_llm_lock = threading.Lock()
+
+# Readiness of the Ollama model, reported by /api/health.
+# state is one of: cold, warming, ready, unavailable
+LLM_STATUS = {'state': 'cold', 'model': CONFIG['llm_model'], 'error': None}
+
+
+def initialize_llm(json_mode: bool = True, base_url: Optional[str] = None, **extra):
+    """Creates a ChatOllama client for one endpoint. This does not contact
+    the server; `extra` is passed on to ChatOllama."""
+    from langchain_ollama import ChatOllama
+    kwargs = {'format': 'json'} if json_mode else {}
+    if base_url:
+        kwargs['base_url'] = base_url
+    return ChatOllama(model=CONFIG['llm_model'], temperature=CONFIG['temperature'],
+                      keep_alive=CONFIG['keep_alive'],
+                      client_kwargs={'timeout': CONFIG['llm_timeout']}, **extra, **kwargs)
+
+
+def get_router() -> LLMRouter:
+    """Returns the router over the configured Ollama endpoints, shared by all models."""
+    global router
+    if router is None:
+        with _llm_lock:
+            if router is None:
+                router = LLMRouter(CONFIG['llm_endpoints'],
+                                   failure_threshold=CONFIG['llm_failure_threshold'],
+                                   reset_timeout=CONFIG['llm_reset_timeout'])
+    return router
+
+
+def _routed_llm(factory, format: Optional[str]) -> RoutedLLM:
+    return RoutedLLM(get_router(), factory, model=CONFIG['llm_model'],
+                     temperature=CONFIG['temperature'], format=format,
+                     hedge_delay=CONFIG['llm_hedge_delay'])
+
+
+def get_llm():
+    """Returns the shared JSON-mode LLM, creating it on first use."""
+    global llm
+    if llm is None:
+        routed = _routed_llm(lambda url: initialize_llm(json_mode=True, base_url=url), 'json')
+        with _llm_lock:
+            if llm is None:
+                llm = routed
+    return llm
+
+
+def get_report_llm():
+    """Returns the shared plain-text LLM used for reports, creating it on first use."""
+    global report_llm
+    if report_llm is None:
+        routed = _routed_llm(lambda url: initialize_llm(json_mode=False, base_url=url), None)
+        with _llm_lock:
+            if report_llm is None:
+                report_llm = routed
+    return report_llm
+
+
+def get_async_llm():
+    """Returns the LLM shared by missions running in async mode.
+
+    A single client per endpoint serves every async mission, so their
+    requests go through one bounded pool of keep-alive connections to each
+    Ollama server. It has no default output format; JSON calls pass
+    format='json' per request.
+    """
+    global async_llm
+    if async_llm is None:
+        import httpx
+        limits = httpx.Limits(max_connections=CONFIG['llm_max_connections'],
+                              max_keepalive_connections=CONFIG['llm_max_connections'],
+                              keepalive_expiry=60)
+        routed = _routed_llm(lambda url: initialize_llm(json_mode=False, base_url=url,
+                                                        async_client_kwargs={'limits': limits}), None)
+        with _llm_lock:
+            if async_llm is None:
+                async_llm = routed
+    return async_llm
+
+
+def warm_up():
+    """Loads the model into Ollama ahead of the first mission.
+
+    Meant to run as a background task at startup; the outcome is recorded in
+    LLM_STATUS instead of being raised.
+    """
+    LLM_STATUS.update(state='warming', error=None)
+    # Pre-import LangGraph so the first mission does not pay for it.
+    import langgraph.graph  # noqa: F401
+    model = get_llm()
+    prompt = "Respond with only the word 'test'"
     try:
-        llm = ChatOllama(model=CONFIG['llm_model'], temperature=CONFIG['temperature'], format="json")
-        llm.invoke("Respond with only the word 'test'")
+        if isinstance(model, RoutedLLM):
+            # Load the model on every endpoint; one that answers is enough.
+            errors = model.warm_up(prompt)
+            for url, error in errors.items():
+                if error:
+                    print(f"✗ Failed to connect to Ollama at {url}: {error}")
+            if all(errors.values()):
+                raise ConnectionError('; '.join(errors.values()))
+        else:
+            model.invoke(prompt)
+        LLM_STATUS.update(state='ready')
         print(f"✓ Connected to Ollama (model: {CONFIG['llm_model']})")
-        return llm
     except Exception as e:
+        LLM_STATUS.update(state='unavailable', error=str(e))
         print(f"✗ Failed to connect to Ollama: {e}")
-        return None
 
-llm = initialize_llm()
-# Create a separate LLM instance for generating plain text reports (without JSON formatting)
-report_llm = ChatOllama(model=CONFIG['llm_model'], temperature=CONFIG['temperature'])
-if llm:
-    print("✓ Report LLM is also ready.")
+
+class MissionCancelled(Exception):
+    """Raised inside a mission's nodes once the mission has been cancelled."""
+
+
+class DeadlineExceeded(Exception):
+    """Raised inside a mission that ran past its node or mission deadline."""
+
+
+class StepDiscarded(Exception):
+    """Raised inside a plan step that was dropped from the plan while it ran."""
+
 
 # --- 2. Tool Definitions ---
-@tool
+# Searches are answered by an offline stub until a real search API is wired in.
+search_backend = StubSearchBackend(latency=CONFIG['search_latency'])
+
 def web_search(query: str) -> str:
-    """Simulates a web search for a given query."""
-    print(f"🔍 TOOL: web_search(query='{query}')")
-    time.sleep(1)
-    return f"Search results for '{query}': Found relevant information about market trends and industry insights."
+    """Searches the web for a given query."""
+    return search_backend.search(query)
+
+# How each tool is described to the model when it picks tools for a step.
+TOOL_DESCRIPTIONS = {
+    'web_search': "web_search(query: string): searches the web and summarizes the results",
+}
+
+# The kind of steps each tool can help with. A step that matches no tool's
+# pattern runs without asking the model for tools, which saves a full LLM
+# round trip; a tool without hints is offered for every step.
+TOOL_HINTS = {
+    'web_search': re.compile(
+        r"\b(research|search|find|look(ing)? (up|for|into)|identify|investigat|analy[sz]|compar|survey|"
+        r"gather|collect|review|assess|evaluat|benchmark|market|competit|trend|pric|cost|regulat|legal|"
+        r"law|permit|licen[cs]|data|statistic|stud(y|ies)|source|supplier|vendor|option|locat|news)",
+        re.IGNORECASE),
+}
+
+_tool_engine = None
+_tool_engine_lock = threading.Lock()
+
+def get_tool_engine() -> ToolEngine:
+    """Returns the tool engine shared by all missions, so tool concurrency
+    limits and the result cache apply across missions."""
+    global _tool_engine
+    if _tool_engine is None:
+        with _tool_engine_lock:
+            if _tool_engine is None:
+                engine = ToolEngine(max_workers=CONFIG['tool_workers'])
+                engine.register('web_search', web_search, **CONFIG['tools']['web_search'])
+                _tool_engine = engine
+    return _tool_engine
 
-tools = [web_search]
+_tools = None
+
+def get_tools():
+    """Returns the LangChain tool wrappers, building them on first use."""
+    global _tools
+    if _tools is None:
+        from langchain_core.tools import tool
+        _tools = [tool(web_search)]
+    return _tools
 
 # --- 3. Graph State Definition ---
 class GraphState(dict):
-    """A dictionary-based state for the graph."""
+    """A dictionary-based state for the graph.
+
+    The annotations declare the state keys so LangGraph creates a channel
+    for each one and carries them between nodes.
+    """
+    mission: Mission
+    execution_results: List[Dict]
+    current_step_index: int
+    step_dependencies: List[List[int]]
+
     @property
     def mission(self) -> Mission:
         return self['mission']
@@ -113,94 +321,486 @@ def _ensure_graph_state(state: Any, default_mission: Optional[Mission] = None) -
 
     return state
 
+
+def _message_text(raw: Any) -> str:
+    """Extract the text payload from an LLM response.
+
+    LangChain chat models return message objects whose text lives in
+    `.content`; `str()` on the message would include the metadata too.
+    """
+    if hasattr(raw, 'content'):
+        return raw.content
+    return str(raw)
+
+
+def estimate_tokens(text: str) -> int:
+    """Roughly estimates how many tokens `text` is for the model: words and
+    punctuation marks count one each, long words a little more."""
+    return sum(1 + len(piece) // 8 for piece in re.findall(r"\w+|[^\w\s]", text))
+
+
+def _compact_json(value: Any) -> str:
+    """Serializes `value` for a prompt without spending tokens on whitespace."""
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
+
+def _normalize_steps(raw_steps: Any):
+    """Normalize the planner's 'steps' value into display strings plus a
+    dependency list.
+
+    Returns `(steps, dependencies)` where `dependencies[i]` holds the 0-based
+    indices of the earlier steps that step `i` needs. Steps may be plain
+    strings or objects such as {"step": "...", "depends_on": [1, 2]} with
+    1-based references. Only references to earlier steps are kept, which
+    guarantees the result is a DAG.
+    """
+    # Defensive: ensure 'steps' is a proper list. Models may return None,
+    # a string, or other unexpected types.
+    steps = []
+    if raw_steps is None:
+        steps = []
+    elif isinstance(raw_steps, list):
+        steps = raw_steps
+    elif isinstance(raw_steps, str):
+        # Try to parse JSON-like list string, then python list literal
+        s = raw_steps.strip()
+        if s.startswith('['):
+            try:
+                parsed = json.loads(s)
+                if isinstance(parsed, list):
+                    steps = parsed
+                else:
+                    steps = [raw_steps]
+            except Exception:
+                try:
+                    parsed = ast.literal_eval(s)
+                    if isinstance(parsed, list):
+                        steps = parsed
+                    else:
+                        steps = [raw_steps]
+                except Exception:
+                    steps = [raw_steps]
+        else:
+            steps = [raw_steps]
+    else:
+        # Any other iterable (tuple, set) -> convert to list; otherwise single
+        try:
+            steps = list(raw_steps)
+        except Exception:
+            steps = [str(raw_steps)]
+
+    texts = []
+    dependencies = []
+    for index, item in enumerate(steps):
+        deps = []
+        if isinstance(item, dict):
+            text = item.get('step') or item.get('description') or json.dumps(item)
+            raw_deps = item.get('depends_on') or []
+            if not isinstance(raw_deps, (list, tuple)):
+                raw_deps = [raw_deps]
+            for ref in raw_deps:
+                try:
+                    dep = int(ref) - 1
+                except (TypeError, ValueError):
+                    continue
+                if 0 <= dep < index and dep not in deps:
+                    deps.append(dep)
+        else:
+            text = item
+        # Normalize elements to strings for display
+        texts.append(str(text))
+        dependencies.append(deps)
+    return texts, dependencies
+
 # --- 4. Agent Service Class ---
 class AgentService:
     """
     Manages the lifecycle and execution of an AI mission.
     This class encapsulates the core business logic (the AI agent).
     """
-    def __init__(self, goal: str, socketio, app):
+    def __init__(self, goal: str, socketio, app, use_cache: Optional[bool] = None,
+                 async_mode: Optional[bool] = None, fused_planning: Optional[bool] = None,
+                 reuse_plans: Optional[bool] = None):
         self.mission = Mission(goal=goal)
         self.socketio = socketio
         self.app = app  # Store the app instance
+        # Per-mission opt-out of the LLM response cache (None = global default)
+        self.use_cache = CONFIG['llm_cache_enabled'] if use_cache is None else use_cache
+        # Per-mission opt-out of reusing plan library plans (None = reuse
+        # whenever the library is enabled); similar plans are still shown to
+        # the planner as examples.
+        self.reuse_plans = True if reuse_plans is None else reuse_plans
+        # Async missions run their graph on an event loop instead of a thread
+        # of their own (see arun); None follows the app's MISSION_EXECUTION.
+        if async_mode is None:
+            async_mode = app.config.get('MISSION_EXECUTION') == 'async'
+        self.async_mode = async_mode
+        # Everything that waits (LLM calls, tools, steps, sleeps) goes through
+        # the mode's I/O; the nodes themselves are shared (see _run_blocking).
+        self._io = _AsyncIO(self) if async_mode else _BlockingIO(self)
+        # Fused planning clarifies and plans the goal in a single LLM call;
+        # None follows the app's FUSED_PLANNING.
+        if fused_planning is None:
+            fused_planning = app.config.get('FUSED_PLANNING', False)
+        self.fused_planning = fused_planning
+        # Log lines are coalesced into 'log_batch' events instead of one frame each.
+        self._log_buffer = MissionLogBuffer(self._emit_log_batch,
+                                            flush_interval=CONFIG['log_flush_interval'],
+                                            max_batch=CONFIG['log_batch_size'])
+        # Mission state is written behind, coalescing changes across nodes.
+        self.persister = MissionPersister(app, self.mission, delay=CONFIG['persist_delay'])
+        self._log_lock = threading.Lock()
+        self._current_node = None
+        self._plan_reused = False
+        # Steps of a plan that is still being streamed start running early
+        # on this runner; execute_step takes it over (see _start_plan_stream).
+        self._step_runner: Optional[_StepRunner] = None
+        self._plan_complete = True
+        # A fused response's clarified goal, read from the stream before its
+        # steps so that they are executed towards it (see _step_goal).
+        self._streamed_goal: Optional[str] = None
+        # Nodes finished in an earlier run and the graph state they left
+        # behind, restored from the mission's checkpoint (see resume).
+        self._completed_nodes: List[str] = []
+        self._resume_state: Dict[str, Any] = {}
+        # Cancellation and deadlines. _stop wakes up anything waiting inside
+        # the mission once it has to end early.
+        self._cancelled = False
+        self._stop = threading.Event()
+        self._deadline: Optional[float] = None
+        self._node_deadline: Optional[float] = None
+        self._node_name: Optional[str] = None
+        # Chunk queues of the LLM requests in flight (see _BlockingIO._stream).
+        self._streams: Set[queue.Queue] = set()
+        self._logger = get_console_logger()
         self.graph = self._build_graph()
 
-    def _emit_log(self, message: str):
-        self.socketio.emit('log', {'message': message})
-        print(f"LOG: {message}")
+    @classmethod
+    def resume(cls, row, socketio, app, use_cache: Optional[bool] = None,
+               fused_planning: Optional[bool] = None, reuse_plans: Optional[bool] = None) -> 'AgentService':
+        """Rebuilds the service for a mission interrupted by a restart or
+        crash, restoring its last checkpoint so that finished nodes (and the
+        LLM calls they made) are not repeated. A mission without a
+        checkpoint runs from the start, with the given options.
+
+        `row` is the mission's database row. Must be called inside an
+        application context.
+        """
+        service = cls(row['goal'], socketio, app, use_cache=use_cache, fused_planning=fused_planning,
+                      reuse_plans=reuse_plans)
+        mission = service.mission
+        mission.id = row['id']
+        mission.status = MissionStatus(row['status'])
+        checkpoint = db.get_checkpoint(mission.id) or {}
+        saved = checkpoint.get('mission', {})
+        mission.clarified_goal = saved.get('clarified_goal', row['clarified_goal'] or '')
+        mission.plan = saved.get('plan', [])
+        mission.report = saved.get('report', '')
+        # Continue the log numbering where the interrupted run stopped.
+        while True:
+            rows = db.get_mission_events(mission.id, after=len(mission.logs), limit=1000)
+            mission.logs.extend(db.mission_event_to_dict(r) for r in rows)
+            if len(rows) < 1000:
+                break
+        service._completed_nodes = checkpoint.get('completed_nodes', [])
+        # Continue with the graph variant the mission was started with.
+        if 'clarify_and_plan' in service._completed_nodes and not service.fused_planning:
+            service.fused_planning = True
+            service.graph = service._build_graph()
+        elif 'clarify_goal' in service._completed_nodes and service.fused_planning:
+            service.fused_planning = False
+            service.graph = service._build_graph()
+        service._plan_reused = checkpoint.get('plan_reused', False)
+        service._resume_state = {key: checkpoint[key] for key in
+                                 ('execution_results', 'current_step_index', 'step_dependencies')
+                                 if key in checkpoint}
+        return service
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def cancel(self):
+        """Asks the mission to stop. A running mission stops at its next
+        check, aborting any LLM request in flight; a mission that has not
+        started yet is marked CANCELLED as soon as run() is called."""
+        self._cancelled = True
+        self._stop.set()
+        for chunks in list(self._streams):
+            chunks.put(('abort', None))
+
+    def _check_abort(self, stop: Optional[threading.Event] = None):
+        """Raises if the mission was cancelled or ran out of time, or if
+        `stop`, the token of the plan step calling it, has been set."""
+        if self._cancelled:
+            raise MissionCancelled()
+        now = time.monotonic()
+        if self._deadline is not None and now > self._deadline:
+            self._stop.set()
+            raise DeadlineExceeded(f"Mission exceeded its {CONFIG['mission_timeout']}s deadline")
+        if self._node_deadline is not None and now > self._node_deadline:
+            self._stop.set()
+            raise DeadlineExceeded(f"Node '{self._node_name}' exceeded its "
+                                   f"{CONFIG['node_timeouts'][self._node_name]}s deadline")
+        if stop is not None and stop.is_set():
+            raise StepDiscarded()
+
+    def _emit(self, event: str, data: Dict[str, Any]):
+        """Sends an event to the browsers watching this mission only.
+
+        Buffered log lines are flushed first so the UI sees events in order.
+        """
+        self._log_buffer.flush()
+        data['mission_id'] = self.mission.id
+        self.socketio.emit(event, data, to=self.mission.id)
+
+    def _emit_log(self, message: str, **extra):
+        """Records a log line on the mission and queues it for the UI and the
+        database; `extra` carries structured data such as a plan."""
+        with self._log_lock:
+            # Numbering and buffering happen together so batches stay in seq order.
+            entry = self.mission.add_log(message, self._current_node, extra)
+            self._log_buffer.add(entry)
+        self._logger.info("LOG: %s", message)
+
+    def _emit_log_batch(self, entries: List[Dict[str, Any]]):
+        """Persists a batch of log entries, then sends it to the mission's room.
+
+        Writing first means a client that joins and replays from the database
+        can never miss a batch that was already broadcast.
+        """
+        try:
+            with self.app.app_context():
+                db.insert_mission_events(self.mission.id, entries)
+        except Exception as e:
+            self._logger.error("ERROR: could not persist mission events: %s", e)
+        self.socketio.emit('log_batch', {'mission_id': self.mission.id, 'logs': entries},
+                           to=self.mission.id)
+
+    async def _call_llm(self, prompt_text: str, fmt: Optional[str] = 'json',
+                        use_cache: Optional[bool] = None,
+                        on_text: Optional[Callable[[str], None]] = None,
+                        stop: Optional[threading.Event] = None) -> str:
+        """Calls the JSON model, or the plain-text one if `fmt` is None, and
+        returns the response text, consulting the persistent response cache
+        unless it is disabled for this call. Only the clarify and plan
+        responses are meant for the cache; every other caller passes
+        use_cache=False.
+
+        `on_text` is called with each piece of the response as it arrives
+        (once with the whole text for a cached response). A plan step passes
+        its `stop` token, which aborts the request when set. Cache keys are
+        the same in both execution modes.
+        """
+        if use_cache is None:
+            use_cache = self.use_cache
+        if not use_cache:
+            return await self._io.llm(prompt_text, fmt, on_text, stop)
+
+        model = self._io.model(fmt)
+        cache = llm_cache.get_cache(self.app)
+        model_name = getattr(model, 'model', CONFIG['llm_model'])
+        key = cache.make_key(model_name, getattr(model, 'temperature', CONFIG['temperature']),
+                             fmt, prompt_text)
+        cached = cache.get(key)
+        if cached is not None:
+            self._emit_log("♻️ Reusing cached LLM response.")
+            return _read_stream([cached], on_text)
+        text = await self._io.llm(prompt_text, fmt, on_text, stop)
+        cache.put(key, model_name, text)
+        return text
+
+    def _log_llm_call(self, prompt_text: str, usage: Optional[Dict[str, int]], elapsed: float):
+        """Logs a call's prompt size: the estimate, and the counts Ollama
+        reported if the response got that far."""
+        metrics.record_llm_call(CONFIG['llm_model'], elapsed, usage)
+        usage = usage or {}
+        self._logger.info("LLM call in %s: ~%d prompt tokens estimated, %s prompt / %s completion "
+                          "tokens reported, %.2fs", self._node_name or 'mission',
+                          estimate_tokens(prompt_text), usage.get('input_tokens', '?'),
+                          usage.get('output_tokens', '?'), elapsed)
 
     def _set_status(self, status: MissionStatus, node_name: str):
+        changed = self.mission.status != status
         self.mission.set_status(status)
-        self.socketio.emit('status_update', {'status': status.value, 'node': node_name})
+        self._current_node = node_name
+        if changed:
+            # Terminal statuses are written immediately by the persister.
+            self.persister.mark_dirty()
+        self._emit('status_update', {'status': status.value, 'node': node_name})
+        if changed:
+            # Lightweight global summary so mission lists can refresh.
+            self.socketio.emit('mission_status', {'mission_id': self.mission.id, 'status': status.value})
 
     def run(self):
         """Executes the full AI mission pipeline using the graph."""
-        self._emit_log(f"Mission '{self.mission.id}' started for goal: '{self.mission.goal}'")
-
-        if not llm:
-            self._emit_log("🔴 FATAL: LLM (Ollama) is not available. Aborting mission.")
-            self._set_status(MissionStatus.FAILED, 'handle_vague_goal')
+        if self.async_mode:
+            from .async_runtime import get_runtime
+            get_runtime().run(self.arun())
             return
+        try:
+            _run_blocking(self._run())
+        finally:
+            self._cleanup()
 
+    async def arun(self):
+        """Executes the mission on the running event loop (async mode)."""
         try:
-            initial_state = GraphState(mission=self.mission)
-            # The graph execution is synchronous here, but runs in a background thread
-            # started by the controller.
-            final_state = self.graph.invoke(initial_state)
-
-            # Normalize the returned state and ensure mission is a Mission
-            # instance (the graph runtime may return plain dicts). Provide
-            # the current Mission as the default so missing keys are filled.
-            final_state = _ensure_graph_state(final_state, default_mission=self.mission)
-
-            final_report = final_state['mission'].report
-            if final_report:
-                self.socketio.emit('final_report', {'report': final_report})
-
-            if self.mission.status != MissionStatus.FAILED:
-                self._set_status(MissionStatus.COMPLETED, 'synthesize_report')
-            
-            # Final state update to the DB
+            await self._run()
+        finally:
+            self._cleanup()
+
+    def _cleanup(self):
+        self.persister.flush()
+        self._log_buffer.flush()
+        if self.mission.status in TERMINAL_STATUSES:
+            # Finished missions are never resumed; drop the graph state.
             with self.app.app_context():
-                db.update_mission_state(self.mission)
-            
-            self._emit_log("✅ Mission finished.")
+                db.delete_checkpoint(self.mission.id)
+
+    async def _run(self):
+        if not self._start():
+            return
+        if LLM_STATUS['state'] == 'unavailable':
+            # The startup warm-up could not reach Ollama; check again in case
+            # it has come up since.
+            await self._io.offload(warm_up)
+        if not self._llm_available():
+            return
 
+        try:
+            initial_state = GraphState(mission=self.mission, **self._resume_state)
+            final_state = await self._io.run_graph(self.graph, initial_state)
+            self._finish(final_state)
         except Exception as e:
+            self._fail(e)
+
+    def _start(self) -> bool:
+        """Starts the mission clock; returns False if the mission was
+        cancelled before it got to run."""
+        if self._cancelled:
+            # Cancelled while waiting in the queue.
+            self._emit_log("🛑 Mission cancelled before it started.")
+            self._set_status(MissionStatus.CANCELLED, 'cancel')
+            return False
+        timeout = CONFIG['mission_timeout']
+        self._deadline = time.monotonic() + timeout if timeout else None
+
+        if self._completed_nodes:
+            self._emit_log(f"🔁 Mission '{self.mission.id}' resumed after "
+                           f"{', '.join(self._completed_nodes)}.")
+        else:
+            self._emit_log(f"Mission '{self.mission.id}' started for goal: '{self.mission.goal}'")
+        return True
+
+    def _llm_available(self) -> bool:
+        if LLM_STATUS['state'] == 'unavailable':
+            self._emit_log("🔴 FATAL: LLM (Ollama) is not available. Aborting mission.")
+            self._set_status(MissionStatus.FAILED, 'handle_vague_goal')
+            return False
+        return True
+
+    def _finish(self, final_state):
+        # Normalize the returned state and ensure mission is a Mission
+        # instance (the graph runtime may return plain dicts). Provide
+        # the current Mission as the default so missing keys are filled.
+        final_state = _ensure_graph_state(final_state, default_mission=self.mission)
+
+        final_report = final_state['mission'].report
+        if final_report:
+            self._emit('final_report', {'report': final_report})
+
+        if self.mission.status != MissionStatus.FAILED:
+            self._set_status(MissionStatus.COMPLETED, 'synthesize_report')
+            self._remember_plan(final_state)
+
+        self._emit_log("✅ Mission finished.")
+
+    def _fail(self, error: Exception):
+        """Records how a mission that raised out of its graph ended."""
+        if isinstance(error, MissionCancelled):
+            self._emit_log("🛑 Mission cancelled.")
+            self._set_status(MissionStatus.CANCELLED, self._current_node or 'cancel')
+        elif isinstance(error, DeadlineExceeded):
+            self._emit_log(f"⏱️ {error}; aborting mission.")
+            self._set_status(MissionStatus.FAILED, self._current_node or 'handle_vague_goal')
+        else:
             # Include full traceback for easier debugging
             tb = traceback.format_exc()
-            error_message = f"An unexpected error occurred during the mission: {e}\n{tb}"
+            error_message = f"An unexpected error occurred during the mission: {error}\n{tb}"
             self._emit_log(f"🔴 {error_message}")
-            # Update DB with failed status
-            with self.app.app_context():
-                db.update_mission_state(self.mission)
+            # Setting the terminal status also flushes it to the DB
             self._set_status(MissionStatus.FAILED, 'handle_vague_goal')
-            print(f"ERROR: {error_message}")
+            self._logger.error("ERROR: %s", error_message)
+
+    # --- Checkpointing ---
+    def _checkpointed(self, name: str, node):
+        """Wraps a graph node so its result is checkpointed, and so it is
+        skipped when a resumed mission already completed it."""
+        async def run_node(state):
+            if name in self._completed_nodes:
+                return _ensure_graph_state(state, default_mission=self.mission)
+            timeout = CONFIG['node_timeouts'].get(name)
+            self._node_name = name
+            self._node_deadline = time.monotonic() + timeout if timeout else None
+            self._check_abort()
+            started = time.monotonic()
+            try:
+                state = await node(state)
+            finally:
+                metrics.NODE_DURATION.observe(time.monotonic() - started, name)
+            self._completed_nodes.append(name)
+            self._save_checkpoint(name, state)
+            return state
+        return self._io.node(run_node)
+
+    def _save_checkpoint(self, node: str, state: GraphState):
+        """Writes the graph state after `node` completed to the database."""
+        snapshot = {
+            'completed_nodes': self._completed_nodes,
+            'plan_reused': self._plan_reused,
+            'mission': {'clarified_goal': self.mission.clarified_goal,
+                        'plan': self.mission.plan,
+                        'report': self.mission.report},
+            'execution_results': state.get('execution_results', []),
+            'current_step_index': state.get('current_step_index', 0),
+            'step_dependencies': state.get('step_dependencies'),
+        }
+        try:
+            with self.app.app_context():
+                db.save_checkpoint(self.mission.id, node, snapshot)
+        except Exception as e:
+            self._logger.error("ERROR: could not checkpoint mission: %s", e)
 
     # --- Graph Nodes ---
-    def _clarify_goal(self, state: GraphState) -> GraphState:
+    # Nodes are written once, as coroutines. The LLM calls and waits they
+    # make go through self._io, which blocks the mission's thread in sync
+    # mode and awaits on the event loop in async mode.
+    async def _clarify_goal(self, state: GraphState) -> GraphState:
         # Normalize state and ensure mission is a Mission instance
         state = _ensure_graph_state(state, default_mission=self.mission)
+        prompt_text = self._begin_clarify(state)
+        raw = await self._call_llm(prompt_text)
+        return self._apply_clarified_goal(state, raw)
 
+    def _begin_clarify(self, state: GraphState) -> str:
         self._set_status(MissionStatus.CLARIFYING, 'clarify_goal')
         self._emit_log("🧠 Clarifying goal...")
-        
+
         # Build a plain-text prompt and call the llm directly to avoid
         # ChatPromptTemplate variable-binding issues in some runtimes.
         system_msg = "You are a Goal Clarifier AI. Rewrite the user's goal to be more specific and actionable. Respond in JSON with a single key 'clarified_goal'."
         human_msg = f"Goal: {state.mission.goal}"
-        prompt_text = system_msg + "\n\n" + human_msg
+        return system_msg + "\n\n" + human_msg
 
-        raw = llm.invoke(prompt_text)
-        # llm.invoke may return a Python dict (already parsed) or a JSON string.
-        if isinstance(raw, dict):
-            result = raw
-        else:
-            try:
-                result = json.loads(str(raw))
-            except Exception:
-                # Fallback: wrap the raw output so callers get something sensible
-                result = {'clarified_goal': str(raw)}
+    def _apply_clarified_goal(self, state: GraphState, raw: str) -> GraphState:
+        try:
+            result = json.loads(raw)
+        except Exception:
+            # Fallback: wrap the raw output so callers get something sensible
+            result = {'clarified_goal': raw}
+        if not isinstance(result, dict):
+            result = {'clarified_goal': raw}
 
         # Normalize clarified_goal: models sometimes return a dict-like string.
         cg = result.get('clarified_goal', state.mission.goal)
@@ -221,127 +821,421 @@ class AgentService:
             state.mission.clarified_goal = cg
         self._emit_log(f"🎯 Goal clarified: \"{state.mission.clarified_goal}\"")
         # Persist the clarified goal
-        with self.app.app_context():
-            db.update_mission_state(state.mission)
+        self.persister.mark_dirty()
         return state
 
-    def _create_plan(self, state: GraphState) -> GraphState:
+    async def _create_plan(self, state: GraphState) -> GraphState:
+        state = _ensure_graph_state(state, default_mission=self.mission)
+        request = self._begin_plan(state)
+        if request is None:
+            return state
+        started = time.monotonic()
+        raw = await self._stream_plan(request['prompt'])
+        return self._apply_plan(state, raw, request, time.monotonic() - started)
+
+    async def _clarify_and_plan(self, state: GraphState) -> GraphState:
+        """Fused planning: clarifies the goal and plans it in one LLM call."""
         state = _ensure_graph_state(state, default_mission=self.mission)
+        request = self._begin_clarify_and_plan(state)
+        if request is None:
+            return state
+        started = time.monotonic()
+        raw = await self._stream_plan(request['prompt'])
+        if self._apply_clarify_and_plan(state, raw, request, time.monotonic() - started):
+            return state
+        return await self._create_plan(state)
+
+    def _begin_clarify_and_plan(self, state: GraphState) -> Optional[Dict[str, Any]]:
+        self._set_status(MissionStatus.CLARIFYING, 'clarify_goal')
+        self._emit_log("🧠 Clarifying goal and creating a plan...")
+
+        library, matches = self._find_plans(state.mission.goal)
+        best = self._reusable_plan(matches)
+        if best is not None:
+            # Library goals are clarified goals, so the match supplies both.
+            state.mission.clarified_goal = best['goal']
+            self._emit_log(f"🎯 Goal clarified: \"{state.mission.clarified_goal}\"")
+            self._set_status(MissionStatus.PLANNING, 'create_plan')
+            self._reuse_plan(state, library, best)
+            return None
+
+        system_msg = "You are a Goal Clarifier and Strategic Planner. First rewrite the user's goal to be more specific and actionable, then create a concise list of steps to achieve it. Respond in JSON with two keys: 'clarified_goal', the rewritten goal as a string, and 'steps', a list of objects, each with a 'step' string and a 'depends_on' list of the 1-based numbers of earlier steps it needs (empty if it can run independently)."
+        examples = self._plan_examples(matches)
+        for example in examples:
+            response = json.dumps({'clarified_goal': example['goal'], 'steps': example['plan']})
+            system_msg += f"\n\nExample response: {response}"
+        human_msg = f"Goal: {state.mission.goal}"
+        return {'prompt': system_msg + "\n\n" + human_msg, 'library': library, 'examples': examples}
 
+    def _apply_clarify_and_plan(self, state: GraphState, raw: str, request: Dict[str, Any],
+                                elapsed: float) -> bool:
+        """Applies a fused response with the same parsing and fallbacks as
+        the separate nodes. Returns False if the response holds no plan, in
+        which case the plan has to be requested on its own."""
+        self._apply_clarified_goal(state, raw)
+        try:
+            result = json.loads(raw)
+        except Exception:
+            result = None
+        if not isinstance(result, dict) or 'steps' not in result:
+            self._emit_log("⚠️ The response contained no plan; requesting one separately.")
+            return False
+        self._set_status(MissionStatus.PLANNING, 'create_plan')
+        self._apply_plan(state, raw, request, elapsed)
+        return True
+
+    def _begin_plan(self, state: GraphState) -> Optional[Dict[str, Any]]:
+        """Reuses a library plan if one matches closely enough (returns None),
+        otherwise returns the planner prompt and the library lookup used."""
         self._set_status(MissionStatus.PLANNING, 'create_plan')
         self._emit_log("🗺️ Creating a step-by-step plan...")
 
-        system_msg = "You are a Strategic Planner. Create a concise list of steps to achieve the goal. Respond in JSON with a single key 'steps' which is a list of strings."
+        library, matches = self._find_plans(state.mission.clarified_goal or state.mission.goal)
+        best = self._reusable_plan(matches)
+        if best is not None:
+            self._reuse_plan(state, library, best)
+            return None
+
+        system_msg = "You are a Strategic Planner. Create a concise list of steps to achieve the goal. Respond in JSON with a single key 'steps' which is a list of objects, each with a 'step' string and a 'depends_on' list of the 1-based numbers of earlier steps it needs (empty if it can run independently)."
+        # Plans for similar goals are shown as examples of the expected output.
+        examples = self._plan_examples(matches)
+        for example in examples:
+            system_msg += f"\n\nExample goal: {example['goal']}\nExample plan: {json.dumps({'steps': example['plan']})}"
         human_msg = f"Goal: {state.mission.clarified_goal}"
-        prompt_text = system_msg + "\n\n" + human_msg
+        return {'prompt': system_msg + "\n\n" + human_msg, 'library': library, 'examples': examples}
 
-        raw = llm.invoke(prompt_text)
-        if isinstance(raw, dict):
-            result = raw
-        else:
-            try:
-                result = json.loads(str(raw))
-            except Exception:
-                # If parsing fails, treat the raw output as a single-step plan
-                result = {'steps': [str(raw)]}
+    async def _stream_plan(self, prompt_text: str) -> str:
+        """Calls the planner, starting each step as soon as it has been
+        generated, and returns the full response."""
+        on_text = self._start_plan_stream()
+        try:
+            return await self._call_llm(prompt_text, on_text=on_text)
+        except BaseException:
+            self._abandon_plan_stream()
+            raise
 
-        # Defensive: ensure 'steps' is a proper list of strings. Models may
-        # return None, a string, or other unexpected types.
-        raw_steps = result.get('steps', None)
-        steps = []
-        if raw_steps is None:
-            steps = []
-        elif isinstance(raw_steps, list):
-            steps = raw_steps
-        elif isinstance(raw_steps, str):
-            # Try to parse JSON-like list string, then python list literal
-            s = raw_steps.strip()
-            if s.startswith('['):
-                try:
-                    parsed = json.loads(s)
-                    if isinstance(parsed, list):
-                        steps = parsed
-                    else:
-                        steps = [raw_steps]
-                except Exception:
-                    try:
-                        parsed = ast.literal_eval(s)
-                        if isinstance(parsed, list):
-                            steps = parsed
-                        else:
-                            steps = [raw_steps]
-                    except Exception:
-                        steps = [raw_steps]
-            else:
-                steps = [raw_steps]
-        else:
-            # Any other iterable (tuple, set) -> convert to list; otherwise single
-            try:
-                steps = list(raw_steps)
-            except Exception:
-                steps = [str(raw_steps)]
+    def _start_plan_stream(self) -> Callable[[str], None]:
+        """Prepares to execute a plan while it is being generated. Returns a
+        callback for the planner's response text that announces each step as
+        soon as it is complete and hands it to a new step runner."""
+        if self._step_runner is not None:
+            # A fused response without a usable plan; its steps are dropped.
+            self._step_runner.cancel()
+            self._step_runner.close(wait=False)
+        runner = self._step_runner = self._new_step_runner()
+        self._plan_complete = False
+        parser = ArrayItemParser('steps')
+        items = []
 
-        # Normalize elements to strings for display
-        steps = [str(s) for s in steps]
+        def on_text(text: str):
+            new_items = parser.feed(text)
+            goal = parser.values.get('clarified_goal')
+            if isinstance(goal, str) and goal.strip():
+                self._streamed_goal = goal
+            for item in new_items:
+                items.append(item)
+                steps, dependencies = _normalize_steps(items)
+                self._emit_log(f"📝 Step {len(steps)} planned: {steps[-1]}",
+                               plan_step={'index': len(steps) - 1, 'step': steps[-1],
+                                          'depends_on': dependencies[-1]})
+                runner.add(steps[-1], dependencies[-1])
+            runner.collect()
+        return on_text
+
+    def _finish_plan_stream(self, steps: List[str], dependencies: List[List[int]]):
+        """Reconciles the steps started early with the final plan, which went
+        through the full parsing and normalization."""
+        self._plan_complete = True
+        runner = self._step_runner
+        if runner is None:
+            return
+        streamed = len(runner.steps)
+        kept = runner.set_plan(steps, dependencies)
+        if kept < streamed:
+            self._emit_log(f"⚠️ The final plan differs from the streamed steps; "
+                           f"discarding work from step {kept + 1} on.")
+        if not steps:
+            self._step_runner = None
+            runner.close()
+
+    def _abandon_plan_stream(self):
+        runner, self._step_runner = self._step_runner, None
+        self._plan_complete = True
+        if runner is not None:
+            self._stop.set()  # Make running steps return early
+            runner.cancel()
+            runner.close()
+
+    def _new_step_runner(self) -> '_StepRunner':
+        return self._io.step_runner(self._run_step, max(1, int(CONFIG['max_parallel_steps'])))
+
+    def _take_step_runner(self, state: GraphState) -> '_StepRunner':
+        """Returns the runner the plan's steps started on while it was being
+        generated, or a new one, set up with the plan in `state`."""
+        runner, self._step_runner = self._step_runner, None
+        if runner is None:
+            runner = self._new_step_runner()
+        plan = state.mission.plan
+        runner.set_plan(plan, state.get('step_dependencies') or [[] for _ in plan])
+        if runner.running or runner.results:
+            # Steps already started while the plan was streaming.
+            self._set_status(MissionStatus.EXECUTING, 'execute_step')
+        return runner
+
+    def _find_plans(self, goal: str):
+        """Returns the plan library (None if disabled) and its closest matches for `goal`."""
+        library = plan_library.get_library(self.app) if self.app.config['PLAN_LIBRARY_ENABLED'] else None
+        matches = library.search(goal, k=max(1, self.app.config['PLAN_FEW_SHOT_EXAMPLES'])) if library else []
+        return library, matches
+
+    def _reusable_plan(self, matches: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if matches and self.reuse_plans and matches[0]['similarity'] >= self.app.config['PLAN_REUSE_THRESHOLD']:
+            return matches[0]
+        return None
+
+    def _plan_examples(self, matches: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [m for m in matches if m['similarity'] >= self.app.config['PLAN_FEW_SHOT_MIN_SIMILARITY']]
+
+    def _reuse_plan(self, state: GraphState, library, best: Dict[str, Any]):
+        # A near-identical goal was planned before: skip the LLM entirely.
+        steps = list(best['plan'])
+        # Plans loaded from the database carry no dependency data; run those in order.
+        dependencies = best['dependencies'] or [[i - 1] if i else [] for i in range(len(steps))]
+        self._plan_reused = True
+        library.record('reused')
+        self._emit_log(f"📚 Reusing the plan of a similar completed mission "
+                       f"(similarity {best['similarity']:.2f}).")
+        self._set_plan(state, steps, dependencies)
+
+    def _apply_plan(self, state: GraphState, raw: str, request: Dict[str, Any],
+                    elapsed: float) -> GraphState:
+        if request['library'] is not None:
+            request['library'].record('seeded' if request['examples'] else 'miss', elapsed)
+        try:
+            result = json.loads(raw)
+        except Exception:
+            # If parsing fails, treat the raw output as a single-step plan
+            result = {'steps': [raw]}
+        if not isinstance(result, dict):
+            result = {'steps': result if isinstance(result, list) else [raw]}
+
+        steps, dependencies = _normalize_steps(result.get('steps', None))
+        self._set_plan(state, steps, dependencies)
+        self._finish_plan_stream(steps, dependencies)
+        return state
+
+    def _set_plan(self, state: GraphState, steps: List[str], dependencies: List[List[int]]):
         state.mission.plan = steps
+        state['step_dependencies'] = dependencies
         # Emit the plan as structured data so the frontend can format it.
-        self.socketio.emit('log', {
-            'message': f"📋 Plan created ({len(steps)} steps):", 'plan': steps
-        })
+        self._emit_log(f"📋 Plan created ({len(steps)} steps):", plan=steps)
         # Persist the plan
-        with self.app.app_context():
-            db.update_mission_state(state.mission)
-        return state
+        self.persister.mark_dirty()
+
+    def _remember_plan(self, state: GraphState):
+        """Adds a freshly created plan to the plan library once its mission
+        has completed, so later missions with similar goals can reuse it."""
+        if self._plan_reused or not self.mission.plan or not self.app.config['PLAN_LIBRARY_ENABLED']:
+            return
+        try:
+            plan_library.get_library(self.app).add(
+                self.mission.clarified_goal or self.mission.goal, self.mission.plan,
+                dependencies=state.get('step_dependencies'), mission_id=self.mission.id)
+        except Exception as e:
+            self._logger.error("ERROR: could not update the plan library: %s", e)
 
-    def _execute_step(self, state: GraphState) -> GraphState:
+    async def _execute_step(self, state: GraphState) -> GraphState:
+        """Runs every plan step whose dependencies are satisfied, at most
+        max_parallel_steps at a time, starting newly unblocked steps as
+        others finish. Steps that started while the plan was generated are
+        picked up where they are."""
         state = _ensure_graph_state(state, default_mission=self.mission)
 
-        self._set_status(MissionStatus.EXECUTING, 'execute_step')
-        step_index = state.current_step_index
-        step = state.mission.plan[step_index]
-        self._emit_log(f"⚙️ Executing step {step_index + 1}/{len(state.mission.plan)}: {step}")
+        runner = self._take_step_runner(state)
+        try:
+            while not runner.finished():
+                # Wake up regularly to notice cancellation and deadlines.
+                await self._io.wait(runner.running, 0.1)
+                runner.collect()
+                self._check_abort()
+        except BaseException:
+            self._stop.set()  # Make running steps return early
+            runner.cancel()
+            raise
+        finally:
+            runner.close()
+
+        # Merge results back in plan order regardless of completion order.
+        plan = state.mission.plan
+        state['execution_results'] = [runner.results[i] for i in range(len(plan))]
+        state['current_step_index'] = len(plan)
+        return state
+
+    async def _run_step(self, step_index: int, step: str, stop: threading.Event) -> Dict[str, Any]:
+        """Executes a single plan step on the step runner. `stop` is set
+        when the mission ends early or the step is dropped from the plan."""
+        self._check_abort(stop)
+        total = ''
+        # While the plan is still streaming the mission stays in planning
+        # and the number of steps is not known yet.
+        if self._plan_complete:
+            self._set_status(MissionStatus.EXECUTING, 'execute_step')
+            total = f"/{len(self.mission.plan)}"
+        self._emit_log(f"⚙️ Executing step {step_index + 1}{total}: {step}")
 
-        # Simple execution for this example: just log the step.
-        # In a real scenario, this would involve tool use.
-        time.sleep(1.5)
+        tool_results = await self._run_tools(step, stop)
+        # Simulated work for the part of the step that needs no tools.
+        await self._sleep(CONFIG['step_delay'], stop)
+
+        # A step dropped from the plan must not log into the mission any more.
+        self._check_abort(stop)
         result_log = f"Completed step: '{step}'"
-        
-        state.execution_results.append({'step': step, 'log': result_log})
         self._emit_log(f"✔️ Step {step_index + 1} result: {result_log}")
-        state['current_step_index'] = step_index + 1
-        return state
+        return {'step': step, 'log': result_log, 'tool_results': tool_results}
 
-    def _synthesize_report(self, state: GraphState) -> GraphState:
-        state = _ensure_graph_state(state, default_mission=self.mission)
+    async def _sleep(self, delay: float, stop: Optional[threading.Event] = None):
+        """Sleeps for `delay` seconds, waking early if the mission (or the
+        step owning `stop`) has to stop."""
+        deadline = time.monotonic() + delay
+        while not self._stop.is_set() and not (stop is not None and stop.is_set()):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            await self._io.sleep(min(remaining, 0.05))
+        self._check_abort(stop)
 
-        self._set_status(MissionStatus.REPORTING, 'synthesize_report')
-        self._emit_log("📑 Synthesizing final report...")
+    async def _wait_all(self, futures, stop: Optional[threading.Event] = None):
+        """Waits for all of `futures`, checking regularly whether the mission
+        (or the step owning `stop`) has to stop."""
+        pending = set(futures)
+        while pending:
+            pending = await self._io.wait(pending, 0.1)
+            self._check_abort(stop)
 
-        system_msg = "You are a Senior Analyst. Create a detailed, comprehensive, and professional report based on the provided goal and execution log. The report should be well-structured and easy to read. Use Markdown for rich formatting (e.g., # Headings, ## Sub-headings, - Bullet points, **bold** text)."
-        human_msg = f"Goal: {state.mission.clarified_goal}\n\nExecution Log:\n{json.dumps(state.execution_results, indent=2)}"
-        prompt_text = system_msg + "\n\n" + human_msg
-
-        raw = report_llm.invoke(prompt_text)
-        # Prefer a plain string report; if llm returned a dict, try to extract text
-        if isinstance(raw, dict):
-            # If the model returned structured output, try common keys
-            report = raw.get('report') or raw.get('text') or json.dumps(raw)
-        
-        # The LLM returns a message object. We need to extract its string content.
-        # The object might have a `.content` attribute (standard for LangChain messages).
-        if hasattr(raw, 'content'):
-            report = raw.content
-        else:
-            # Fallback for other types
-            report = str(raw)
+    def _candidate_tools(self, step: str) -> List[str]:
+        """Returns the tools the model may pick from for `step` (see TOOL_HINTS)."""
+        if CONFIG['max_tool_calls_per_step'] <= 0:
+            return []
+        names = get_tool_engine().tool_names
+        if not CONFIG['tool_hints']:
+            return names
+        return [name for name in names if name not in TOOL_HINTS or TOOL_HINTS[name].search(step)]
+
+    def _tool_selection_prompt(self, step: str, tool_names: List[str]) -> str:
+        tools = '\n'.join(f"- {TOOL_DESCRIPTIONS.get(name, name)}" for name in tool_names)
+        system_msg = f"You are a Task Executor. Decide which tools, if any, are needed to carry out the step. Available tools:\n{tools}\nRespond in JSON with a single key 'tool_calls' which is a list of objects, each with a 'tool' name and an 'args' object (use an empty list if no tool is needed)."
+        human_msg = f"Goal: {self._step_goal()}\nStep: {step}"
+        return system_msg + "\n\n" + human_msg
+
+    def _step_goal(self) -> str:
+        """The goal steps work towards. Steps of a fused plan may start before
+        the response, and with it mission.clarified_goal, is complete."""
+        return self.mission.clarified_goal or self._streamed_goal or self.mission.goal
+
+    def _parse_tool_calls(self, raw: str) -> List[tuple]:
+        """Turns the model's tool selection into (tool, args) pairs."""
+        engine = get_tool_engine()
+        try:
+            result = json.loads(raw)
+        except Exception:
+            return []
+        calls = result.get('tool_calls') if isinstance(result, dict) else None
+        if not isinstance(calls, list):
+            return []
+        selected = []
+        for call in calls:
+            # Ignore anything that does not name a known tool with keyword arguments.
+            if (isinstance(call, dict) and call.get('tool') in engine.tool_names
+                    and isinstance(call.get('args', {}), dict)):
+                selected.append((call['tool'], call.get('args', {})))
+        return selected[:CONFIG['max_tool_calls_per_step']]
 
-        state.mission.report = report
+    async def _run_tools(self, step: str, stop: Optional[threading.Event] = None) -> List[Dict[str, Any]]:
+        """Runs the tool calls the model picked for a step concurrently and
+        returns their outputs (or errors) in the order they were requested.
+        Steps no tool can help with skip the model's tool selection."""
+        tool_names = self._candidate_tools(step)
+        if not tool_names:
+            return []
+        raw = await self._call_llm(self._tool_selection_prompt(step, tool_names), use_cache=False, stop=stop)
+        calls = self._parse_tool_calls(raw)
+        self._check_abort(stop)
+        engine = get_tool_engine()
+        submitted = []
+        for name, args in calls:
+            self._emit_log(f"🔧 Calling {name}({json.dumps(args)})")
+            submitted.append((name, args, engine.submit(name, args)))
+        await self._wait_all([future for _, _, future in submitted], stop)
+
+        results = []
+        for name, args, future in submitted:
+            try:
+                results.append({'tool': name, 'args': args, 'output': future.result()})
+            except Exception as e:
+                self._emit_log(f"⚠️ Tool {name} failed: {e}")
+                results.append({'tool': name, 'args': args, 'error': str(e)})
+        return results
+
+    async def _synthesize_report(self, state: GraphState) -> GraphState:
+        state = _ensure_graph_state(state, default_mission=self.mission)
+        self._set_status(MissionStatus.REPORTING, 'synthesize_report')
+        self._emit_log("📑 Synthesizing final report...")
+        # Logs too large for one prompt are summarized in parts first (map),
+        # and the report is written from the summaries (reduce).
+        sections, summarized = [_compact_json(r) for r in state.execution_results], False
+        for _ in range(CONFIG['report_max_rounds']):
+            prompts = self._summary_prompts(state, sections, summarized)
+            if not prompts:
+                break
+            sections, summarized = await self._run_summaries(prompts), True
+        prompt_text = self._report_prompt(state, sections, summarized)
+        chunker = _ReportChunker(self._emit)
+        await self._call_llm(prompt_text, fmt=None, use_cache=False, on_text=chunker.add)
+        state.mission.report = chunker.finish()
         self._emit_log("📄 Report generated.")
         # Persist the final report
-        with self.app.app_context():
-            db.update_mission_state(state.mission)
+        self.persister.mark_dirty()
         return state
 
+    def _report_prompt(self, state: GraphState, sections: List[str], summarized: bool) -> str:
+        """Builds the final report prompt from the execution log entries, or
+        from summaries of them."""
+        system_msg = "You are a Senior Analyst. Create a detailed, comprehensive, and professional report based on the provided goal and execution log. The report should be well-structured and easy to read. Use Markdown for rich formatting (e.g., # Headings, ## Sub-headings, - Bullet points, **bold** text)."
+        human_msg = f"Goal: {state.mission.clarified_goal}\n\n" + _execution_log(sections, summarized)
+        return system_msg + "\n\n" + human_msg
+
+    def _summary_prompts(self, state: GraphState, sections: List[str], summarized: bool) -> List[str]:
+        """Splits `sections` into parts that each fit the report token budget
+        and returns a prompt summarizing each part, or nothing if the report
+        prompt fits the budget as it is."""
+        budget = CONFIG['report_token_budget']
+        tokens = estimate_tokens(self._report_prompt(state, sections, summarized))
+        if tokens <= budget or len(sections) < 2:
+            return []
+
+        system_msg = "You are an Analyst preparing material for a report. Summarize the following part of a mission's execution log as concise notes on the actions taken, findings, figures and open issues, so the final report can be written from them. Respond in plain text."
+        header = system_msg + f"\n\nGoal: {state.mission.clarified_goal}\n\n"
+        room = max(1, budget - estimate_tokens(header) - 10)
+        parts, part, used = [], [], 0
+        for section in sections:
+            size = estimate_tokens(section)
+            if part and used + size > room:
+                parts.append(part)
+                part, used = [], 0
+            part.append(section)
+            used += size
+        parts.append(part)
+        self._emit_log(f"🧩 Report input is ~{tokens} tokens, over the {budget}-token budget; "
+                       f"summarizing it in {len(parts)} parts...")
+        return [header + _execution_log(part, summarized) for part in parts]
+
+    async def _run_summaries(self, prompts: List[str]) -> List[str]:
+        """Generates the partial summaries concurrently, in prompt order."""
+        calls = [functools.partial(self._call_llm, prompt, fmt=None, use_cache=False) for prompt in prompts]
+        with self._io.concurrently(calls, max(1, CONFIG['report_max_parallel'])) as futures:
+            await self._wait_all(futures)
+            return [future.result() for future in futures]
+
     # --- Graph Edges ---
     def _check_plan_execution(self, state: GraphState) -> str:
         """Conditional edge: Check if all steps are executed."""
@@ -354,20 +1248,29 @@ class AgentService:
     # --- Graph Builder ---
     def _build_graph(self) -> Any:
         """Builds the LangGraph state machine."""
+        from langgraph.graph import StateGraph, END
+
         workflow = StateGraph(GraphState)
 
-        # Add nodes
-        workflow.add_node("clarify_goal", self._clarify_goal)
-        workflow.add_node("create_plan", self._create_plan)
-        workflow.add_node("execute_step", self._execute_step)
-        workflow.add_node("synthesize_report", self._synthesize_report)
+        # Add nodes. Fused planning replaces clarify_goal and create_plan
+        # with a single clarify_and_plan node.
+        planning = {"clarify_and_plan": self._clarify_and_plan} if self.fused_planning else \
+            {"clarify_goal": self._clarify_goal, "create_plan": self._create_plan}
+        nodes = dict(planning, execute_step=self._execute_step, synthesize_report=self._synthesize_report)
+        for name, node in nodes.items():
+            workflow.add_node(name, self._checkpointed(name, node))
 
         # Define edges
-        workflow.set_entry_point("clarify_goal")
-        workflow.add_edge("clarify_goal", "create_plan")
-        
+        if self.fused_planning:
+            workflow.set_entry_point("clarify_and_plan")
+            planned = "clarify_and_plan"
+        else:
+            workflow.set_entry_point("clarify_goal")
+            workflow.add_edge("clarify_goal", "create_plan")
+            planned = "create_plan"
+
         workflow.add_conditional_edges(
-            "create_plan",
+            planned,
             self._check_plan_execution,
             {
                 "execute_step": "execute_step",
@@ -384,4 +1287,354 @@ class AgentService:
         )
         workflow.add_edge("synthesize_report", END)
 
-        return workflow.compile()
\ No newline at end of file
+        return workflow.compile()
+
+
+def _execution_log(sections: List[str], summarized: bool) -> str:
+    """Formats execution log entries (compact JSON), or summaries of them, for a prompt."""
+    if summarized:
+        return "Execution Log Summaries:\n" + "\n\n".join(
+            f"Part {i}: {summary}" for i, summary in enumerate(sections, 1))
+    return f"Execution Log:\n[{','.join(sections)}]"
+
+
+class _ReportChunker:
+    """Forwards streamed report text to the UI as `report_chunk` events.
+
+    Tokens are coalesced into small chunks so the browser is not sent one
+    frame per token; the first chunk goes out as soon as it arrives.
+    """
+    def __init__(self, emit):
+        self.emit = emit
+        self.parts = []
+        self.buffer = []
+        self.buffered = 0
+        self.last_emit = None
+
+    def add(self, text: str):
+        if not text:
+            return
+        self.parts.append(text)
+        self.buffer.append(text)
+        self.buffered += len(text)
+        now = time.monotonic()
+        if (self.last_emit is None or self.buffered >= CONFIG['report_chunk_chars']
+                or now - self.last_emit >= CONFIG['report_chunk_interval']):
+            self._send()
+            self.last_emit = now
+
+    def finish(self) -> str:
+        """Sends any remaining text and returns the full report."""
+        if self.buffer:
+            self._send()
+        return ''.join(self.parts)
+
+    def _send(self):
+        self.emit('report_chunk', {'chunk': ''.join(self.buffer)})
+        self.buffer = []
+        self.buffered = 0
+
+
+def _read_stream(pieces, on_text: Optional[Callable[[str], None]]) -> str:
+    """Joins streamed response text, passing each piece to `on_text` first."""
+    text = []
+    for piece in pieces:
+        text.append(piece)
+        if on_text is not None:
+            on_text(piece)
+    return ''.join(text)
+
+
+async def _aread_stream(pieces, on_text: Optional[Callable[[str], None]]) -> str:
+    text = []
+    async for piece in pieces:
+        text.append(piece)
+        if on_text is not None:
+            on_text(piece)
+    return ''.join(text)
+
+
+
+def _run_blocking(coro):
+    """Runs a coroutine that never suspends to completion on the calling
+    thread. Mission nodes awaiting only _BlockingIO are such coroutines."""
+    try:
+        coro.send(None)
+    except StopIteration as done:
+        return done.value
+    coro.close()
+    raise RuntimeError("A sync-mode mission coroutine tried to suspend")
+
+
+class _BlockingIO:
+    """
+    The I/O of a mission in sync mode, which runs on a thread of its own.
+
+    Every call blocks that thread until it is done, so none of these
+    coroutines ever suspends and the nodes run through _run_blocking.
+    """
+    def __init__(self, service: 'AgentService'):
+        self.service = service
+
+    def model(self, fmt: Optional[str]):
+        return get_llm() if fmt else get_report_llm()
+
+    async def llm(self, prompt_text: str, fmt: Optional[str], on_text: Optional[Callable[[str], None]],
+                  stop: Optional[threading.Event]) -> str:
+        return _read_stream(self._stream(self.model(fmt), prompt_text, stop), on_text)
+
+    def _stream(self, model, prompt_text: str, stop: Optional[threading.Event]):
+        """Yields the model's response text as it arrives.
+
+        The request is read on a helper thread while this one waits for its
+        chunks, checking for abort, so a cancelled or timed-out mission stops
+        at once even while the model is still thinking about the first token
+        (cancel() wakes the wait up). The helper then closes the stream as
+        soon as its read returns; that closes the HTTP response, which makes
+        Ollama stop generating.
+        """
+        service = self.service
+        service._check_abort(stop)
+        chunks: queue.Queue = queue.Queue()
+        done = threading.Event()
+
+        def read():
+            stream = model.stream(prompt_text)
+            try:
+                for chunk in stream:
+                    if done.is_set():
+                        return
+                    chunks.put(('chunk', chunk))
+                chunks.put(('done', None))
+            except BaseException as e:
+                chunks.put(('error', e))
+            finally:
+                stream.close()
+
+        started, usage = time.monotonic(), None
+        service._streams.add(chunks)
+        threading.Thread(target=read, name='llm-stream', daemon=True).start()
+        try:
+            while True:
+                try:
+                    kind, value = chunks.get(timeout=0.1)
+                except queue.Empty:
+                    service._check_abort(stop)
+                    continue
+                service._check_abort(stop)
+                if kind == 'done':
+                    return
+                if kind == 'error':
+                    raise value
+                if kind == 'chunk':
+                    # Ollama reports token counts on the last chunk.
+                    usage = getattr(value, 'usage_metadata', None) or usage
+                    yield _message_text(value)
+        finally:
+            done.set()
+            service._streams.discard(chunks)
+            service._log_llm_call(prompt_text, usage, time.monotonic() - started)
+
+    async def wait(self, futures, timeout: float) -> Set:
+        """Waits until one of `futures` is done or `timeout` has passed, and
+        returns the ones still pending."""
+        return wait(futures, timeout=timeout, return_when=FIRST_COMPLETED).not_done
+
+    async def sleep(self, delay: float):
+        time.sleep(delay)
+
+    async def offload(self, fn: Callable[[], Any]) -> Any:
+        return fn()
+
+    async def run_graph(self, graph, state):
+        return graph.invoke(state)
+
+    def node(self, run_node):
+        """Turns a node coroutine function into a graph node."""
+        def node(state):
+            return _run_blocking(run_node(state))
+        return node
+
+    def step_runner(self, run_step, limit: int) -> '_StepRunner':
+        pool = ThreadPoolExecutor(max_workers=limit)
+        return _StepRunner(lambda i, step, stop: pool.submit(lambda: _run_blocking(run_step(i, step, stop))),
+                           limit, pool=pool)
+
+    @contextlib.contextmanager
+    def concurrently(self, calls: List[Callable[[], Any]], limit: int):
+        """Starts the coroutine functions `calls`, at most `limit` at a time,
+        and yields Futures for their results; the ones still unfinished on
+        exit are cancelled."""
+        with ThreadPoolExecutor(max_workers=min(len(calls), limit)) as pool:
+            futures = [pool.submit(lambda call=call: _run_blocking(call())) for call in calls]
+            try:
+                yield futures
+            finally:
+                for future in futures:
+                    future.cancel()
+
+
+class _AsyncIO:
+    """The I/O of a mission in async mode, which runs on the shared event
+    loop (see AsyncRuntime) and must never block it."""
+    def __init__(self, service: 'AgentService'):
+        self.service = service
+
+    def model(self, fmt: Optional[str]):
+        return get_async_llm()
+
+    async def llm(self, prompt_text: str, fmt: Optional[str], on_text: Optional[Callable[[str], None]],
+                  stop: Optional[threading.Event]) -> str:
+        return await _aread_stream(self._stream(prompt_text, fmt, stop), on_text)
+
+    async def _stream(self, prompt_text: str, fmt: Optional[str], stop: Optional[threading.Event]):
+        """Yields the model's response text as it arrives.
+
+        Waiting for the next chunk is raced against regular abort checks, so
+        a cancelled mission drops its request even while the model is still
+        thinking about the first token.
+        """
+        service = self.service
+        service._check_abort(stop)
+        kwargs = {'format': fmt} if fmt else {}
+        stream = get_async_llm().astream(prompt_text, **kwargs)
+        started, usage = time.monotonic(), None
+        try:
+            while True:
+                next_chunk = asyncio.ensure_future(stream.__anext__())
+                try:
+                    while not next_chunk.done():
+                        await asyncio.wait([next_chunk], timeout=0.1)
+                        service._check_abort(stop)
+                except BaseException:
+                    # The generator can only be closed once the pending read has ended.
+                    next_chunk.cancel()
+                    await asyncio.wait([next_chunk])
+                    raise
+                try:
+                    chunk = next_chunk.result()
+                except StopAsyncIteration:
+                    return
+                usage = getattr(chunk, 'usage_metadata', None) or usage
+                yield _message_text(chunk)
+        finally:
+            await stream.aclose()
+            service._log_llm_call(prompt_text, usage, time.monotonic() - started)
+
+    async def wait(self, futures, timeout: float) -> Set:
+        """Waits until one of `futures` (asyncio or concurrent ones) is done
+        or `timeout` has passed, and returns the ones still pending."""
+        if not futures:
+            return set()
+        _, pending = await asyncio.wait({asyncio.wrap_future(f) for f in futures}, timeout=timeout,
+                                        return_when=asyncio.FIRST_COMPLETED)
+        return pending
+
+    async def sleep(self, delay: float):
+        await asyncio.sleep(delay)
+
+    async def offload(self, fn: Callable[[], Any]) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(None, fn)
+
+    async def run_graph(self, graph, state):
+        return await graph.ainvoke(state)
+
+    def node(self, run_node):
+        return run_node
+
+    def step_runner(self, run_step, limit: int) -> '_StepRunner':
+        return _StepRunner(lambda i, step, stop: asyncio.ensure_future(run_step(i, step, stop)), limit)
+
+    @contextlib.contextmanager
+    def concurrently(self, calls: List[Callable[[], Any]], limit: int):
+        """Async counterpart of _BlockingIO.concurrently, yielding Tasks."""
+        semaphore = asyncio.Semaphore(limit)
+
+        async def run(call):
+            async with semaphore:
+                return await call()
+        tasks = [asyncio.ensure_future(run(call)) for call in calls]
+        try:
+            yield tasks
+        finally:
+            for task in tasks:
+                task.cancel()
+
+class _StepRunner:
+    """Starts plan steps as soon as their dependencies have finished, at
+    most `limit` at a time.
+
+    Steps can be added while the planner is still generating the plan, and
+    the plan replaced by its final version once it is complete (set_plan).
+    `start(index, step, stop)` returns a concurrent Future or an asyncio Task;
+    the caller waits on `running` and then calls collect(). `stop` is an
+    Event set when the step is dropped from the plan or the runner is
+    cancelled; the step is expected to check it and return early, since a
+    step already running on a thread cannot be cancelled from outside.
+    """
+    def __init__(self, start, limit: int, pool: Optional[ThreadPoolExecutor] = None):
+        self._start = start
+        self.limit = limit
+        self.pool = pool
+        self.steps: List[str] = []
+        self.dependencies: List[List[int]] = []
+        self.results: Dict[int, Dict] = {}
+        self.running: Dict[Any, int] = {}
+        self._stops: Dict[Any, threading.Event] = {}
+        self._started = set()
+
+    def add(self, step: str, dependencies: List[int]):
+        self.steps.append(step)
+        self.dependencies.append(list(dependencies))
+        self.dispatch()
+
+    def set_plan(self, steps: List[str], dependencies: List[List[int]]) -> int:
+        """Replaces the plan. Work on the leading steps that did not change
+        is kept; the rest is dropped. Returns the number of steps kept."""
+        kept = 0
+        for old, new in zip(zip(self.steps, self.dependencies), zip(steps, dependencies)):
+            if old[0] != new[0] or list(old[1]) != list(new[1]):
+                break
+            kept += 1
+        for future, index in list(self.running.items()):
+            if index >= kept:
+                self._stops.pop(future).set()
+                future.cancel()
+                del self.running[future]
+        self.results = {i: r for i, r in self.results.items() if i < kept}
+        self._started = {i for i in self._started if i < kept}
+        self.steps = list(steps)
+        self.dependencies = [list(d) for d in dependencies]
+        self.dispatch()
+        return kept
+
+    def dispatch(self):
+        for i, dependencies in enumerate(self.dependencies):
+            if len(self.running) >= self.limit:
+                return
+            if i not in self._started and all(d in self.results for d in dependencies):
+                self._started.add(i)
+                stop = threading.Event()
+                future = self._start(i, self.steps[i], stop)
+                self.running[future] = i
+                self._stops[future] = stop
+
+    def collect(self):
+        """Records the steps that have finished and starts the ones they unblocked."""
+        for future in [f for f in self.running if f.done()]:
+            del self._stops[future]
+            index = self.running.pop(future)
+            self.results[index] = future.result()
+        self.dispatch()
+
+    def finished(self) -> bool:
+        return len(self.results) == len(self.steps)
+
+    def cancel(self):
+        for future in self.running:
+            self._stops[future].set()
+            future.cancel()
+
+    def close(self, wait: bool = True):
+        if self.pool is not None:
+            self.pool.shutdown(wait=wait, cancel_futures=True)
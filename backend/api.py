@@ -1,13 +1,18 @@
 # c:/Users/dbmar/Downloads/ai_planner/backend/api.py
-from flask import Blueprint, jsonify, request
+import json
+from html import escape
+from flask import Blueprint, Response, current_app, jsonify, request
 from . import db
+from . import llm_cache
+from . import metrics
 
 bp = Blueprint('api', __name__, url_prefix='/api')
 
 @bp.route('/health', methods=['GET'])
 def health_check():
     """Health Check
-    Confirms that the backend server is running.
+    Confirms that the backend server is running and reports whether the
+    Ollama model has been warmed up.
     ---
     tags:
       - General
@@ -23,16 +28,182 @@ def health_check():
             version:
               type: string
               example: 4.0.0-final
+            db_pool:
+              type: object
+              description: SQLite connection pool counters (opened, reused, closed, idle, in_use).
+            llm:
+              type: object
+              description: Readiness of the Ollama model (cold, warming, ready or unavailable).
+              properties:
+                state:
+                  type: string
+                  example: ready
+                model:
+                  type: string
+                error:
+                  type: string
+            executor_pool:
+              type: object
+              description: Executor processes (workers, alive, running, pending, restarts), if missions run out of process.
     """
-    return jsonify({"status": "healthy", "version": "4.0.0-final"})
+    from .agent_service import LLM_STATUS
+    body = {"status": "healthy", "version": "4.0.0-final", "llm": dict(LLM_STATUS),
+            "db_pool": db.get_pool_stats()}
+    pool = current_app.extensions.get('executor_pool')
+    if pool is not None:
+        body['executor_pool'] = pool.stats()
+    return jsonify(body)
+
+@bp.route('/llm-cache', methods=['GET'])
+def get_llm_cache_stats():
+    """LLM Cache Statistics
+    Reports hit/miss counters and the size of the LLM response cache.
+    ---
+    tags:
+      - General
+    responses:
+      200:
+        description: Cache statistics.
+        schema:
+          type: object
+          properties:
+            hits:
+              type: integer
+            misses:
+              type: integer
+            entries:
+              type: integer
+            max_entries:
+              type: integer
+    """
+    return jsonify(llm_cache.get_cache(current_app).stats())
+
+@bp.route('/llm-cache', methods=['DELETE'])
+def clear_llm_cache():
+    """Clear the LLM Cache
+    Removes every cached LLM response and resets the counters.
+    ---
+    tags:
+      - General
+    responses:
+      200:
+        description: The cache was cleared.
+    """
+    llm_cache.get_cache(current_app).clear()
+    return jsonify({"status": "cleared"}), 200
+
+@bp.route('/tools', methods=['GET'])
+def get_tool_stats():
+    """Tool Statistics
+    Reports, per tool, how many calls were made, how many were served from
+    the result cache or joined an identical call in flight, failures,
+    timeouts and execution latency in milliseconds.
+    ---
+    tags:
+      - General
+    responses:
+      200:
+        description: Statistics keyed by tool name.
+    """
+    from .agent_service import get_tool_engine
+    return jsonify(get_tool_engine().stats())
+
+@bp.route('/llm-endpoints', methods=['GET'])
+def get_llm_endpoints():
+    """LLM Endpoints
+    Reports each Ollama endpoint's circuit-breaker state ('closed' when in
+    use, 'open' when ejected, 'half_open' when due a trial request), the
+    requests in flight, its average time to first token, and how many
+    requests, errors and hedged requests it has served.
+    ---
+    tags:
+      - General
+    responses:
+      200:
+        description: One entry per configured endpoint.
+    """
+    from .agent_service import get_router
+    return jsonify(get_router().stats())
+
+@bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Metrics
+    Exposes the server's metrics in the Prometheus text format: graph node
+    durations, LLM call latency and token counts, SQLite statement latency,
+    Socket.IO emit counts and bytes, and running/queued mission gauges.
+    ---
+    tags:
+      - General
+    produces:
+      - text/plain
+    responses:
+      200:
+        description: Metrics in the Prometheus text exposition format (version 0.0.4).
+    """
+    scheduler = current_app.extensions.get('mission_scheduler')
+    if scheduler is not None:
+        stats = scheduler.stats()
+        metrics.MISSIONS_ACTIVE.set(stats['running'])
+        metrics.MISSIONS_QUEUED.set(stats['queued'])
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@bp.route('/plan-library', methods=['GET'])
+def get_plan_library_stats():
+    """Plan Library Statistics
+    Reports how many plans the library holds, how often a stored plan was
+    reused instead of calling the planner, and the planning time saved.
+    ---
+    tags:
+      - General
+    responses:
+      200:
+        description: Plan library statistics.
+        schema:
+          type: object
+          properties:
+            entries:
+              type: integer
+            lookups:
+              type: integer
+            reused:
+              type: integer
+            seeded:
+              type: integer
+            hit_rate:
+              type: number
+            average_plan_seconds:
+              type: number
+            time_saved_seconds:
+              type: number
+    """
+    from . import plan_library
+    return jsonify(plan_library.get_library(current_app).stats())
 
 @bp.route('/missions', methods=['GET'])
 def get_missions():
-    """Get All Missions
-    Retrieves a list of all missions from the database.
+    """Get Missions
+    Retrieves a page of missions, newest first. Only the list columns are
+    returned; use GET /api/missions/{mission_id} for the plan and report.
+    When more missions exist, the X-Next-Before header holds the value to
+    pass as `before` for the next page. Responses carry an ETag, and a
+    request with a matching If-None-Match gets 304 Not Modified.
     ---
     tags:
       - Missions
+    parameters:
+      - name: limit
+        in: query
+        type: integer
+        default: 50
+        description: Maximum number of missions to return (at most 200).
+      - name: before
+        in: query
+        type: string
+        description: Return missions created before the mission with this ID.
+      - name: status
+        in: query
+        type: string
+        description: Only return missions with this status.
     responses:
       200:
         description: A list of mission objects.
@@ -47,9 +218,107 @@ def get_missions():
                 type: string
               status:
                 type: string
+              created_at:
+                type: string
+              updated_at:
+                type: string
+      304:
+        description: The list has not changed since the given ETag.
     """
-    missions = db.get_all_missions()
-    return jsonify([dict(m) for m in missions])
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+    missions = db.get_missions_page(limit=limit,
+                                    before=request.args.get('before'),
+                                    status=request.args.get('status'))
+    response = jsonify([dict(m) for m in missions])
+    if len(missions) == limit:
+        response.headers['X-Next-Before'] = missions[-1]['id']
+    response.add_etag()
+    return response.make_conditional(request)
+
+@bp.route('/missions/<mission_id>', methods=['GET'])
+def get_mission(mission_id):
+    """Get a Mission
+    Retrieves one mission including its clarified goal, plan and report.
+    ---
+    tags:
+      - Missions
+    parameters:
+      - name: mission_id
+        in: path
+        type: string
+        required: true
+    responses:
+      200:
+        description: The mission object.
+      404:
+        description: Mission not found.
+    """
+    mission = db.get_mission(mission_id)
+    if not mission:
+        return jsonify({"error": "Mission not found"}), 404
+    data = dict(mission)
+    data['plan'] = json.loads(data['plan']) if data['plan'] else []
+    return jsonify(data)
+
+@bp.route('/missions/<mission_id>/events', methods=['GET'])
+def get_mission_events(mission_id):
+    """Get Mission Events
+    Returns a page of a mission's log events in sequence order. Pass the
+    `next_after` value of one page as `after` to fetch the next.
+    ---
+    tags:
+      - Missions
+    parameters:
+      - name: mission_id
+        in: path
+        type: string
+        required: true
+      - name: after
+        in: query
+        type: integer
+        default: 0
+        description: Only return events with a sequence number greater than this.
+      - name: limit
+        in: query
+        type: integer
+        default: 100
+        description: Maximum number of events to return (at most 500).
+    responses:
+      200:
+        description: A page of events.
+        schema:
+          type: object
+          properties:
+            events:
+              type: array
+              items:
+                type: object
+                properties:
+                  seq:
+                    type: integer
+                  node:
+                    type: string
+                  message:
+                    type: string
+                  data:
+                    type: object
+                  created_at:
+                    type: string
+            next_after:
+              type: integer
+            has_more:
+              type: boolean
+    """
+    after = request.args.get('after', 0, type=int)
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 500)
+    # Fetch one extra row to learn whether another page exists.
+    rows = db.get_mission_events(mission_id, after=after, limit=limit + 1)
+    events = [db.mission_event_to_dict(r) for r in rows[:limit]]
+    return jsonify({
+        "events": events,
+        "next_after": events[-1]['seq'] if events else after,
+        "has_more": len(rows) > limit,
+    })
 
 @bp.route('/missions/<mission_id>', methods=['DELETE'])
 def delete_mission(mission_id):
@@ -71,6 +340,75 @@ def delete_mission(mission_id):
     db.delete_mission(mission_id)
     return jsonify({"status": "deleted", "id": mission_id}), 200
 
+@bp.route('/search', methods=['GET'])
+def search():
+    """Search
+    Full-text search across ideas and mission goals, clarified goals and
+    reports. Missions and ideas are each ranked by relevance and the two
+    lists are interleaved; every result includes an HTML snippet with
+    matches wrapped in <mark> tags.
+    ---
+    tags:
+      - General
+    parameters:
+      - name: q
+        in: query
+        type: string
+        required: true
+        description: Words to search for; the last word also matches as a prefix.
+      - name: limit
+        in: query
+        type: integer
+        default: 20
+        description: Maximum number of results (at most 100).
+      - name: offset
+        in: query
+        type: integer
+        default: 0
+    responses:
+      200:
+        description: A page of search results.
+        schema:
+          type: object
+          properties:
+            results:
+              type: array
+              items:
+                type: object
+                properties:
+                  type:
+                    type: string
+                    example: mission
+                  id:
+                    type: string
+                  goal:
+                    type: string
+                  status:
+                    type: string
+                  snippet:
+                    type: string
+            has_more:
+              type: boolean
+      400:
+        description: No search text given.
+    """
+    q = request.args.get('q', '').strip()
+    if not q:
+        return jsonify({"error": "Search text not provided"}), 400
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    # Fetch one extra row to learn whether another page exists.
+    rows = db.search(q, limit=limit + 1, offset=offset)
+    results = []
+    for row in rows[:limit]:
+        result = dict(row)
+        del result['rank']
+        # Escape the stored text, then turn the match markers into <mark> tags.
+        result['snippet'] = (escape(result['snippet'] or '')
+                             .replace('\x02', '<mark>').replace('\x03', '</mark>'))
+        results.append(result)
+    return jsonify({"results": results, "has_more": len(rows) > limit})
+
 @bp.route('/ideas', methods=['GET'])
 def get_ideas():
     """Get All Ideas
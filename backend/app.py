@@ -1,13 +1,35 @@
 # c:/Users/dbmar/Downloads/ai_planner/backend/app.py
 import os
+import socket
 import webbrowser
-import threading
 from flask import Flask
-from flask_socketio import SocketIO, send
+from flask_socketio import SocketIO, send, emit, join_room, leave_room
 from flask_cors import CORS
-from flasgger import Swagger
+from socketio import packet
+
+from . import metrics, socket_queue
+
+
+class MeteredSocketIO(SocketIO):
+    """Counts emitted events for /api/metrics."""
+    def emit(self, event, *args, **kwargs):
+        metrics.record_emit(event)
+        return super().emit(event, *args, **kwargs)
+
+
+class MeteredPacket(packet.Packet):
+    """Counts the size of the event packets the server encodes for its
+    clients, so the metric costs no serialization of its own."""
+    def encode(self):
+        encoded = super().encode()
+        if self.packet_type in (packet.EVENT, packet.BINARY_EVENT) and self.data:
+            size = len(encoded) if isinstance(encoded, str) else sum(len(p) for p in encoded)
+            metrics.record_emit_bytes(str(self.data[0]), size)
+        return encoded
+
+
+socketio = MeteredSocketIO(cors_allowed_origins="*", serializer=MeteredPacket)
 
-socketio = SocketIO(cors_allowed_origins="*")
 
 def create_app(test_config=None):
     """Create and configure an instance of the Flask application."""
@@ -19,21 +41,67 @@ def create_app(test_config=None):
     app.config.from_mapping(
         SECRET_KEY='dev',
         DATABASE=os.path.join(app.instance_path, 'planner.sqlite'),
+        # Persistent LLM response cache shared by all missions
+        LLM_CACHE_PATH=os.path.join(app.instance_path, 'llm_cache.sqlite'),
+        LLM_CACHE_MAX_ENTRIES=1000,
+        LLM_CACHE_TTL=7 * 24 * 3600,
+        # Serve the Swagger UI at /apidocs; the spec is built on the first request for it
+        SWAGGER_ENABLED=True,
+        # Load the Ollama model in the background as soon as the app starts
+        LLM_WARMUP=True,
+        # Admission control: missions running at once and missions allowed to wait
+        MAX_CONCURRENT_MISSIONS=2,
+        MISSION_QUEUE_SIZE=20,
+        # Restart missions left unfinished by a crash or restart from their checkpoints
+        RESUME_INTERRUPTED_MISSIONS=True,
+        # Plan library: reuse plans of completed missions with near-identical
+        # goals, and show plans for similar goals to the planner as examples
+        PLAN_LIBRARY_ENABLED=True,
+        PLAN_REUSE_THRESHOLD=0.9,
+        PLAN_FEW_SHOT_EXAMPLES=2,
+        PLAN_FEW_SHOT_MIN_SIMILARITY=0.3,
+        # 'sync' runs each mission's graph in a thread of its own; 'async' runs
+        # all missions as coroutines on one event loop (see async_runtime)
+        MISSION_EXECUTION=os.environ.get('MISSION_EXECUTION', 'sync'),
+        # Clarify the goal and create the plan in one LLM call instead of two
+        # (missions can override this with 'fused_planning')
+        FUSED_PLANNING=False,
+        # Running several server processes (see wsgi.py): a message queue all
+        # of them share (redis://, amqp:// or another Kombu URL; local:// for
+        # processes-in-one tests) relays events emitted by one worker to the
+        # clients connected to the others
+        SOCKETIO_MESSAGE_QUEUE=os.environ.get('SOCKETIO_MESSAGE_QUEUE'),
+        SOCKETIO_CHANNEL='ai-planner',
+        # Long-polling needs sticky sessions at the load balancer; allowing
+        # only 'websocket' does not
+        SOCKETIO_TRANSPORTS=os.environ.get('SOCKETIO_TRANSPORTS', 'polling,websocket'),
+        # Identifies this process as the owner of the missions it runs
+        WORKER_ID=os.environ.get('WORKER_ID') or f"{socket.gethostname()}:{os.getpid()}",
+        # Missions of a worker that stops renewing its leases for this many
+        # seconds are resumed by another worker
+        MISSION_LEASE_TIMEOUT=30,
+        MISSION_HEARTBEAT_INTERVAL=2,
+        # Run missions in this many executor processes instead of the web
+        # process (0 keeps them here; see executor_pool)
+        EXECUTOR_POOL_WORKERS=int(os.environ.get('EXECUTOR_POOL_WORKERS', 0)),
     )
-    CORS(app, resources={r"/api/*": {"origins": "*"}})
-
-    # Configure Flasgger for API documentation
-    app.config['SWAGGER'] = {
-        'title': 'AI Planner API',
-        'uiversion': 3
-    }
-    Swagger(app)
+    CORS(app, resources={r"/api/*": {"origins": "*"}},
+         expose_headers=['ETag', 'Retry-After', 'X-Next-Before'])
 
     if test_config is None:
         app.config.from_pyfile('config.py', silent=True)
     else:
         app.config.from_mapping(test_config)
 
+    if app.config['SWAGGER_ENABLED']:
+        # Configure Flasgger for API documentation
+        app.config['SWAGGER'] = {
+            'title': 'AI Planner API',
+            'uiversion': 3
+        }
+        from flasgger import Swagger
+        Swagger(app)
+
     try:
         os.makedirs(app.instance_path)
     except OSError:
@@ -41,6 +109,7 @@ def create_app(test_config=None):
 
     # Initialize extensions and register blueprints
     from . import db
+    from .mission import MissionStatus, STATUS_NODES
     db.init_app(app)
 
     from . import api
@@ -65,7 +134,80 @@ def create_app(test_config=None):
         """Handles a client disconnecting."""
         print('Client disconnected')
 
-    socketio.init_app(app)
+    @socketio.on('join_mission')
+    def handle_join_mission(data):
+        """Subscribes the client to a mission's events (room keyed by mission id).
+
+        If `after` is given, persisted log entries with a higher sequence
+        number are replayed to this client only, so a reconnecting browser
+        resumes where it left off. Status updates are not replayed; the ack
+        carries the mission's current status and node instead.
+        """
+        data = data or {}
+        mission_id = data.get('mission_id')
+        if not mission_id:
+            return {'ok': False, 'error': 'mission_id is required'}
+        after = data.get('after')
+        if after is not None:
+            try:
+                after = int(after)
+            except (TypeError, ValueError):
+                return {'ok': False, 'error': 'after must be an integer'}
+        join_room(mission_id)
+        if after is not None:
+            while True:
+                rows = db.get_mission_events(mission_id, after=after, limit=500)
+                if not rows:
+                    break
+                events = [db.mission_event_to_dict(r) for r in rows]
+                emit('log_batch', {'mission_id': mission_id, 'logs': events, 'replay': True})
+                after = events[-1]['seq']
+        ack = {'ok': True}
+        row = db.get_mission(mission_id)
+        if row is not None:
+            status = MissionStatus(row['status'])
+            ack.update(status=status.value, node=STATUS_NODES.get(status))
+        return ack
+
+    @socketio.on('leave_mission')
+    def handle_leave_mission(data):
+        """Unsubscribes the client from a mission's events."""
+        mission_id = (data or {}).get('mission_id')
+        if mission_id:
+            leave_room(mission_id)
+        return {'ok': True}
+
+    transports = app.config['SOCKETIO_TRANSPORTS']
+    if isinstance(transports, str):
+        transports = [t.strip() for t in transports.split(',') if t.strip()]
+    # The client manager is always passed so that one app's message queue
+    # does not carry over to the next app that reuses this SocketIO.
+    client_manager = socket_queue.create_client_manager(app.config['SOCKETIO_MESSAGE_QUEUE'],
+                                                        app.config['SOCKETIO_CHANNEL'])
+    socketio.init_app(app, client_manager=client_manager, transports=transports)
+    if 'executor_pool' in app.extensions:
+        app.extensions['executor_pool'].start()
+
+    if app.config['LLM_WARMUP'] and not app.testing:
+        # Preload the model off the request path; /api/health reports progress.
+        from . import agent_service
+        socketio.start_background_task(agent_service.warm_up)
+    if not app.testing:
+        # Eject Ollama endpoints that stop answering, and bring them back.
+        from . import agent_service
+        interval = agent_service.CONFIG['llm_health_interval']
+        if interval:
+            socketio.start_background_task(agent_service.get_router().run_health_checks, interval)
+    if app.config['PLAN_LIBRARY_ENABLED'] and not app.testing:
+        # Index the plans of completed missions before the first mission needs them.
+        from . import plan_library
+        socketio.start_background_task(plan_library.get_library, app)
+    if app.config['RESUME_INTERRUPTED_MISSIONS'] and not app.testing:
+        # Continue missions a crash or restart left unfinished.
+        socketio.start_background_task(mission_controller.resume_interrupted_missions, app, socketio)
+    if not app.testing:
+        # Keep this worker's missions owned and pick up those of dead workers.
+        socketio.start_background_task(mission_controller.run_mission_heartbeats, app, socketio)
     return app
 
 if __name__ == '__main__':
@@ -0,0 +1,78 @@
+import asyncio
+import sys
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Optional
+
+
+def _eventlet_hub():
+    """Returns eventlet's hub if eventlet has monkey-patched this process,
+    otherwise None."""
+    eventlet = sys.modules.get('eventlet')
+    if eventlet is None:
+        return None
+    from eventlet import patcher
+    if not patcher.is_monkey_patched('thread'):
+        return None
+    from eventlet.hubs import get_hub
+    return get_hub()
+
+
+class AsyncRuntime:
+    """
+    Runs coroutines for missions executed in async mode.
+
+    Under eventlet with its asyncio hub (EVENTLET_HUB=asyncio), coroutines
+    run on the hub's own event loop, so Socket.IO traffic and every mission
+    share one loop. Without eventlet (or before it is patched in), a
+    private event loop runs in a daemon thread. A monkey-patched eventlet
+    with any other hub cannot drive asyncio and is rejected.
+    """
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._eventlet = False
+        hub = _eventlet_hub()
+        if hub is not None:
+            from eventlet.hubs.asyncio import Hub as AsyncioHub
+            if not isinstance(hub, AsyncioHub):
+                raise RuntimeError("Async mission execution under eventlet needs the asyncio hub; "
+                                   "set EVENTLET_HUB=asyncio before eventlet is imported.")
+            self._eventlet = True
+        else:
+            self._loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=self._loop.run_forever, name='mission-loop', daemon=True)
+            thread.start()
+
+    def spawn(self, coro: Awaitable[Any]) -> Future:
+        """Schedules `coro` on the runtime's loop and returns a Future for
+        its result that can be waited on from any thread."""
+        if not self._eventlet:
+            return asyncio.run_coroutine_threadsafe(coro, self._loop)
+        from eventlet.asyncio import spawn_for_awaitable
+        future = Future()
+
+        def settle(greenthread):
+            try:
+                future.set_result(greenthread.wait())
+            except BaseException as e:
+                future.set_exception(e)
+        spawn_for_awaitable(coro).link(settle)
+        return future
+
+    def run(self, coro: Awaitable[Any]) -> Any:
+        """Runs `coro` on the runtime's loop and waits for its result."""
+        return self.spawn(coro).result()
+
+
+_runtime: Optional[AsyncRuntime] = None
+_runtime_lock = threading.Lock()
+
+
+def get_runtime() -> AsyncRuntime:
+    """Returns the process-wide async runtime, starting it on first use."""
+    global _runtime
+    if _runtime is None:
+        with _runtime_lock:
+            if _runtime is None:
+                _runtime = AsyncRuntime()
+    return _runtime
@@ -2,31 +2,244 @@ import sqlite3
 import click
 import os
 import json
+import re
+import threading
+import time
 from flask import current_app, g
 
+from . import metrics
+
+# Applied to every new connection. WAL lets readers proceed while a mission
+# writes, and busy_timeout makes writers wait instead of failing with
+# "database is locked".
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,        # milliseconds
+    'mmap_size': 64 * 1024 * 1024,
+    'cache_size': -16000,        # negative = KiB, i.e. ~16 MB of page cache
+}
+
+
+class TimedConnection(sqlite3.Connection):
+    """
+    A connection that records how long each statement takes, by kind of
+    statement, in the metrics registry.
+
+    Only the execute call is timed: for a SELECT that covers running the
+    query up to its first row, not fetching the remaining rows.
+    """
+    _operations = {}  # SQL text -> operation label; the set of statements is small
+
+    def execute(self, sql, *args):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, *args)
+        finally:
+            metrics.SQLITE_QUERY_DURATION.observe(time.perf_counter() - started, self._operation(sql))
+
+    def executemany(self, sql, *args):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, *args)
+        finally:
+            metrics.SQLITE_QUERY_DURATION.observe(time.perf_counter() - started, self._operation(sql))
+
+    def executescript(self, script):
+        started = time.perf_counter()
+        try:
+            return super().executescript(script)
+        finally:
+            metrics.SQLITE_QUERY_DURATION.observe(time.perf_counter() - started, 'script')
+
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            metrics.SQLITE_QUERY_DURATION.observe(time.perf_counter() - started, 'commit')
+
+    @classmethod
+    def _operation(cls, sql):
+        operation = cls._operations.get(sql)
+        if operation is None:
+            words = sql.split(None, 1)
+            operation = cls._operations[sql] = words[0].lower() if words else 'empty'
+        return operation
+
+
+class ConnectionPool:
+    """
+    Keeps idle SQLite connections (per database file) for reuse.
+
+    Each request or app context checks out one connection for its lifetime
+    (see get_db/close_db) and returns it afterwards, so requests and the
+    agent's background threads reuse connections instead of reconnecting.
+    At most `max_idle` connections per file are kept; extras are closed.
+    """
+    def __init__(self, max_idle=8):
+        self.max_idle = max_idle
+        self._idle = {}
+        self._lock = threading.Lock()
+        self.stats = {'opened': 0, 'reused': 0, 'closed': 0, 'in_use': 0}
+
+    def acquire(self, path):
+        """Checks out a connection to `path`, opening a new one if none is idle."""
+        with self._lock:
+            idle = self._idle.get(path)
+            if idle:
+                self.stats['reused'] += 1
+                self.stats['in_use'] += 1
+                return idle.pop()
+        conn = self._connect(path)
+        with self._lock:
+            self.stats['opened'] += 1
+            self.stats['in_use'] += 1
+        return conn
+
+    def release(self, conn, path):
+        """Returns a connection to the pool, discarding any uncommitted work."""
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            self.stats['in_use'] -= 1
+            idle = self._idle.setdefault(path, [])
+            if len(idle) < self.max_idle:
+                idle.append(conn)
+                return
+            self.stats['closed'] += 1
+        conn.close()
+
+    def close_idle(self):
+        """Closes every idle connection (e.g. before a database file is removed)."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+            count = sum(len(conns) for conns in idle.values())
+            self.stats['closed'] += count
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+    def get_stats(self):
+        """Returns counters of connections opened, reused, closed, idle and in use."""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['idle'] = sum(len(conns) for conns in self._idle.values())
+        return stats
+
+    @staticmethod
+    def _connect(path):
+        # Connections move between threads as they are checked in and out,
+        # but are only ever used by one thread at a time.
+        conn = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES,
+                               check_same_thread=False, factory=TimedConnection)
+        conn.row_factory = sqlite3.Row
+        for name, value in PRAGMAS.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+
+pool = ConnectionPool()
+
+
 def get_db():
-    """Connect to the application's configured database. The connection is unique for each request and will be reused if this is called again."""
+    """Connect to the application's configured database. The connection is unique for each request and will be reused if this is called again.
+
+    The connection is checked out of the pool and returned to it by close_db."""
     if 'db' not in g:
-        g.db = sqlite3.connect(
-            current_app.config['DATABASE'],
-            detect_types=sqlite3.PARSE_DECLTYPES
-        )
-        g.db.row_factory = sqlite3.Row
+        g.db_path = current_app.config['DATABASE']
+        g.db = pool.acquire(g.db_path)
     return g.db
 
 def close_db(e=None):
-    """If this request connected to the database, close the connection."""
+    """If this request used a database connection, hand it back to the pool."""
     db = g.pop('db', None)
     if db is not None:
-        db.close()
+        pool.release(db, g.pop('db_path'))
+
+def get_pool_stats():
+    """Returns connection pool statistics."""
+    return pool.get_stats()
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), 'schema.sql')
+# Stored in PRAGMA user_version. Bump it whenever schema.sql changes, so
+# that migrate() runs once more against existing databases.
+SCHEMA_VERSION = 1
+SCHEMA_TABLES = ['ideas_fts', 'missions_fts', 'ideas', 'missions', 'mission_events',
+                 'mission_checkpoints', 'mission_owners']
+
+def _schema_statements():
+    """Splits schema.sql into statements (triggers contain semicolons)."""
+    statements, current = [], ''
+    with open(SCHEMA_PATH, 'r') as f:
+        for line in f:
+            if not current and (not line.strip() or line.lstrip().startswith('--')):
+                continue  # Comments between statements
+            current += line
+            if sqlite3.complete_statement(current):
+                statements.append(current.strip())
+                current = ''
+    return statements
+
+def _create_schema(db):
+    for statement in _schema_statements():
+        db.execute(statement)
+    db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
 
 def init_db():
     """Clear existing data and create new tables."""
     db = get_db()
-    # schema.sql is in the same directory as this db.py file
-    schema_path = os.path.join(os.path.dirname(__file__), 'schema.sql')
-    with open(schema_path, 'r') as f:
-        db.executescript(f.read())
+    db.executescript(''.join(f"DROP TABLE IF EXISTS {table};\n" for table in SCHEMA_TABLES))
+    db.execute("BEGIN IMMEDIATE")
+    _create_schema(db)
+    db.commit()
+
+def migrate():
+    """Brings an existing database up to schema.sql without losing data.
+
+    Creates the tables, indexes and triggers it lacks, moves an older
+    missions table to the current layout and rebuilds the search indexes
+    from the rows already stored. Runs in one transaction, once per
+    SCHEMA_VERSION; afterwards it only reads user_version.
+    """
+    db = get_db()
+    if db.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        return
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        # Another process may have migrated while this one waited for the lock.
+        if db.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            old_columns = _set_aside_old_missions(db)
+            _create_schema(db)
+            if old_columns:
+                columns = ', '.join(c for c in ('id', 'goal', 'clarified_goal', 'status', 'plan', 'report',
+                                                'created_at', 'updated_at') if c in old_columns)
+                db.execute(f"INSERT INTO missions ({columns}) SELECT {columns} FROM missions_old ORDER BY rowid")
+                db.execute("DROP TABLE missions_old")
+            for index in ('ideas_fts', 'missions_fts'):
+                db.execute(f"INSERT INTO {index} ({index}) VALUES ('rebuild')")
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+
+def _set_aside_old_missions(db):
+    """Renames a missions table without the pk column to missions_old and
+    returns its columns; ALTER TABLE cannot add a primary key, so migrate()
+    copies the rows into a new table. Columns the old table lacks (e.g.
+    created_at) take their defaults. Returns None if there is nothing to do."""
+    columns = [row['name'] for row in db.execute("PRAGMA table_info(missions)")]
+    if not columns or 'pk' in columns:
+        return None
+    # The old search index points at the old rowids; its triggers and the
+    # listing indexes would keep their names and block the new ones.
+    for trigger in ('missions_fts_insert', 'missions_fts_delete', 'missions_fts_update'):
+        db.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    for index in ('idx_missions_status_created_at', 'idx_missions_created_at'):
+        db.execute(f"DROP INDEX IF EXISTS {index}")
+    db.execute("DROP TABLE IF EXISTS missions_fts")
+    db.execute("ALTER TABLE missions RENAME TO missions_old")
+    return columns
 
 @click.command('init-db')
 def init_db_command():
@@ -35,9 +248,12 @@ def init_db_command():
     click.echo('Initialized the database.')
 
 def init_app(app):
-    """Register database functions with the Flask app. This is called by the application factory."""
+    """Register database functions with the Flask app and bring its database
+    up to the current schema. This is called by the application factory."""
     app.teardown_appcontext(close_db)
     app.cli.add_command(init_db_command)
+    with app.app_context():
+        migrate()
 
 # --- Ideas CRUD ---
 
@@ -72,20 +288,262 @@ def create_mission(mission):
         (mission.id, mission.goal, mission.status.value)
     )
     db.commit()
+    # The row now reflects the mission; only later changes need writing.
+    mission.take_dirty()
+
+# Columns of a mission as the API returns it (pk is internal).
+MISSION_COLUMNS = "id, goal, clarified_goal, status, plan, report, created_at, updated_at"
 
 def get_all_missions():
-    return get_db().execute("SELECT * FROM missions ORDER BY id DESC").fetchall()
+    return get_db().execute(f"SELECT {MISSION_COLUMNS} FROM missions ORDER BY created_at DESC, pk DESC").fetchall()
+
+# Columns returned by mission listings; plan and report are fetched on demand.
+MISSION_LIST_COLUMNS = "id, goal, status, created_at, updated_at"
+
+def get_missions_page(limit=50, before=None, status=None):
+    """Returns up to `limit` missions, newest first, without the heavy fields.
+
+    `before` is the id of the last mission of the previous page (keyset
+    pagination), so each page is an index range scan however long the
+    history grows. Ties on created_at are broken by insertion order (pk).
+    """
+    clauses, params = [], []
+    if status:
+        clauses.append("status = ?")
+        params.append(status)
+    if before:
+        clauses.append("(created_at, pk) < (SELECT created_at, pk FROM missions WHERE id = ?)")
+        params.append(before)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return get_db().execute(
+        f"SELECT {MISSION_LIST_COLUMNS} FROM missions {where} ORDER BY created_at DESC, pk DESC LIMIT ?",
+        params + [limit]
+    ).fetchall()
+
+def get_mission(id):
+    return get_db().execute(f"SELECT {MISSION_COLUMNS} FROM missions WHERE id = ?", (id,)).fetchone()
+
+def get_completed_plans(after_pk=0, limit=500):
+    """Returns completed missions that have a plan, in insertion order.
+
+    Callers page through the table by passing the last pk they saw.
+    """
+    return get_db().execute(
+        """SELECT pk, id, goal, clarified_goal, plan FROM missions
+           WHERE status = 'COMPLETED' AND plan IS NOT NULL AND plan != '[]' AND pk > ?
+           ORDER BY pk LIMIT ?""",
+        (after_pk, limit)
+    ).fetchall()
 
 def update_mission_state(mission):
     """Updates a mission's status, plan, report, etc."""
     db = get_db()
     db.execute(
-        """UPDATE missions SET status = ?, plan = ?, report = ?, clarified_goal = ?
+        """UPDATE missions SET status = ?, plan = ?, report = ?, clarified_goal = ?,
+           updated_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now')
            WHERE id = ?""",
         (mission.status.value, json.dumps(mission.plan), mission.report, mission.clarified_goal, mission.id)
     )
     db.commit()
 
+# Columns update_mission_fields may write, with their serializers.
+_MISSION_COLUMNS = {
+    'goal': lambda v: v,
+    'status': lambda v: v.value,
+    'plan': json.dumps,
+    'report': lambda v: v,
+    'clarified_goal': lambda v: v,
+}
+
+def update_mission_fields(mission_id, fields):
+    """Updates only the given mission columns (e.g. from Mission.take_dirty())."""
+    columns = [name for name in fields if name in _MISSION_COLUMNS]
+    if not columns:
+        return
+    db = get_db()
+    assignments = ', '.join(f'{c} = ?' for c in columns)
+    db.execute(
+        f"UPDATE missions SET {assignments}, updated_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now') WHERE id = ?",
+        [_MISSION_COLUMNS[c](fields[c]) for c in columns] + [mission_id]
+    )
+    db.commit()
+
+def get_interrupted_missions():
+    """Returns missions that never reached a final status, oldest first."""
+    return get_db().execute(
+        """SELECT * FROM missions WHERE status NOT IN ('COMPLETED', 'FAILED', 'CANCELLED')
+           ORDER BY created_at, pk"""
+    ).fetchall()
+
 def delete_mission(id):
+    get_db().execute("DELETE FROM mission_events WHERE mission_id = ?", (id,))
+    get_db().execute("DELETE FROM mission_checkpoints WHERE mission_id = ?", (id,))
+    get_db().execute("DELETE FROM mission_owners WHERE mission_id = ?", (id,))
     get_db().execute("DELETE FROM missions WHERE id = ?", (id,))
-    get_db().commit()
\ No newline at end of file
+    get_db().commit()
+
+# --- Mission Checkpoints ---
+
+def save_checkpoint(mission_id, node, state):
+    """Stores the graph state after `node` completed, replacing the previous checkpoint."""
+    db = get_db()
+    db.execute(
+        """INSERT OR REPLACE INTO mission_checkpoints (mission_id, node, state, updated_at)
+           VALUES (?, ?, ?, strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))""",
+        (mission_id, node, json.dumps(state))
+    )
+    db.commit()
+
+def get_checkpoint(mission_id):
+    """Returns the mission's last saved graph state, or None."""
+    row = get_db().execute(
+        "SELECT state FROM mission_checkpoints WHERE mission_id = ?", (mission_id,)
+    ).fetchone()
+    return json.loads(row['state']) if row else None
+
+def delete_checkpoint(mission_id):
+    db = get_db()
+    db.execute("DELETE FROM mission_checkpoints WHERE mission_id = ?", (mission_id,))
+    db.commit()
+
+# --- Mission Ownership ---
+
+def claim_mission(mission_id, worker_id, lease_expires, now):
+    """Makes `worker_id` the owner of a mission unless another worker holds a
+    lease on it that has not expired by `now`. Returns True on success."""
+    db = get_db()
+    cursor = db.execute(
+        """INSERT INTO mission_owners (mission_id, worker_id, lease_expires) VALUES (?, ?, ?)
+           ON CONFLICT (mission_id) DO UPDATE SET worker_id = excluded.worker_id,
+               lease_expires = excluded.lease_expires, cancel_requested = 0
+           WHERE mission_owners.worker_id = excluded.worker_id OR mission_owners.lease_expires < ?""",
+        (mission_id, worker_id, lease_expires, now)
+    )
+    db.commit()
+    return cursor.rowcount == 1
+
+def renew_mission_leases(worker_id, mission_ids, lease_expires):
+    """Extends the worker's leases on the given missions and returns the ids
+    of its missions that another worker asked to cancel."""
+    db = get_db()
+    mission_ids = list(mission_ids)
+    if mission_ids:
+        placeholders = ', '.join('?' * len(mission_ids))
+        db.execute(
+            f"UPDATE mission_owners SET lease_expires = ? WHERE worker_id = ? AND mission_id IN ({placeholders})",
+            [lease_expires, worker_id] + mission_ids
+        )
+        db.commit()
+    rows = db.execute(
+        "SELECT mission_id FROM mission_owners WHERE worker_id = ? AND cancel_requested = 1", (worker_id,)
+    ).fetchall()
+    return [row['mission_id'] for row in rows]
+
+def release_mission(mission_id, worker_id=None):
+    """Drops the mission's owner, or only `worker_id`'s claim if given."""
+    db = get_db()
+    if worker_id is None:
+        db.execute("DELETE FROM mission_owners WHERE mission_id = ?", (mission_id,))
+    else:
+        db.execute("DELETE FROM mission_owners WHERE mission_id = ? AND worker_id = ?", (mission_id, worker_id))
+    db.commit()
+
+def request_mission_cancel(mission_id, now):
+    """Flags a mission for cancellation by its owner. Returns False if no
+    worker holds a live lease on it."""
+    db = get_db()
+    cursor = db.execute(
+        "UPDATE mission_owners SET cancel_requested = 1 WHERE mission_id = ? AND lease_expires >= ?",
+        (mission_id, now)
+    )
+    db.commit()
+    return cursor.rowcount == 1
+
+def get_orphaned_missions(now):
+    """Returns unfinished missions that no worker holds a live lease on, oldest first."""
+    return get_db().execute(
+        """SELECT m.* FROM missions m LEFT JOIN mission_owners o ON o.mission_id = m.id
+           WHERE m.status NOT IN ('COMPLETED', 'FAILED', 'CANCELLED')
+             AND (o.mission_id IS NULL OR o.lease_expires < ?)
+           ORDER BY m.created_at, m.pk""",
+        (now,)
+    ).fetchall()
+
+# --- Search ---
+
+def _fts_query(text):
+    """Turns free text into a safe FTS5 query: every word must match, and
+    the last word also matches as a prefix (search-as-you-type).
+
+    Words are quoted, so FTS5 operators typed by the user are treated as text.
+    """
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    terms = [f'"{w}"' for w in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+def search(text, limit=20, offset=0):
+    """Full-text search over ideas and missions, best matches first.
+
+    bm25 scores of different FTS indexes are not comparable, so each index
+    ranks its own hits and the two lists are interleaved: a mission, then
+    an idea, then the second mission, and so on, while both have hits left.
+
+    Snippets mark matches with \\x02 ... \\x03 so callers can escape the text
+    before adding highlighting.
+    """
+    query = _fts_query(text)
+    if query is None:
+        return []
+    # Scores stay inside each subquery; only the positions they give are
+    # compared. Neither list can contribute more than offset + limit rows.
+    depth = offset + limit
+    return get_db().execute(
+        """SELECT 'mission' AS type, m.id AS id, m.goal AS goal, m.status AS status, h.snippet,
+                  row_number() OVER (ORDER BY h.score) AS rank
+           FROM (SELECT rowid, snippet(missions_fts, -1, char(2), char(3), '…', 12) AS snippet,
+                        bm25(missions_fts, 10.0, 5.0, 1.0) AS score
+                 FROM missions_fts WHERE missions_fts MATCH ? ORDER BY score LIMIT ?) h
+           JOIN missions m ON m.pk = h.rowid
+           UNION ALL
+           SELECT 'idea', CAST(i.id AS TEXT), i.goal, NULL, h.snippet,
+                  row_number() OVER (ORDER BY h.score)
+           FROM (SELECT rowid, snippet(ideas_fts, 0, char(2), char(3), '…', 12) AS snippet,
+                        bm25(ideas_fts) AS score
+                 FROM ideas_fts WHERE ideas_fts MATCH ? ORDER BY score LIMIT ?) h
+           JOIN ideas i ON i.id = h.rowid
+           ORDER BY rank, type DESC LIMIT ? OFFSET ?""",
+        (query, depth, query, depth, limit, offset)
+    ).fetchall()
+
+# --- Mission Events ---
+
+def insert_mission_events(mission_id, events):
+    """Stores a batch of log events with a single executemany and one commit."""
+    db = get_db()
+    db.executemany(
+        "INSERT INTO mission_events (mission_id, seq, node, message, data) VALUES (?, ?, ?, ?, ?)",
+        [(mission_id, e['seq'], e.get('node'), e['message'],
+          json.dumps(e['data']) if e.get('data') else None) for e in events]
+    )
+    db.commit()
+
+def mission_event_to_dict(row):
+    """Converts a mission_events row to the shape used by the API and sockets."""
+    return {
+        "seq": row['seq'],
+        "node": row['node'],
+        "message": row['message'],
+        "data": json.loads(row['data']) if row['data'] else {},
+        "created_at": str(row['created_at']),
+    }
+
+def get_mission_events(mission_id, after=0, limit=100):
+    """Returns up to `limit` events with a sequence number greater than `after`."""
+    return get_db().execute(
+        """SELECT seq, node, message, data, created_at FROM mission_events
+           WHERE mission_id = ? AND seq > ? ORDER BY seq LIMIT ?""",
+        (mission_id, after, limit)
+    ).fetchall()
\ No newline at end of file
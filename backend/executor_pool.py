@@ -0,0 +1,249 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+from typing import Any, Dict, List, Optional, Set
+
+from . import db
+from .mission import Mission, MissionStatus
+from .mission_persister import MissionPersister
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class RemoteMission:
+    """
+    Stands in for an AgentService in the MissionScheduler when missions run
+    in the executor pool: run() hands the mission to a worker process and
+    returns once it has finished there.
+    """
+    async_mode = False
+
+    def __init__(self, pool: 'ExecutorPool', mission: Mission, use_cache: Optional[bool] = None,
+                 fused_planning: Optional[bool] = None, reuse_plans: Optional[bool] = None):
+        self.pool = pool
+        self.mission = mission
+        self.use_cache = use_cache
+        self.fused_planning = fused_planning
+        self.reuse_plans = reuse_plans
+        self.persister = MissionPersister(pool.app, mission, delay=0)
+        self.cancelled = False
+        self.attempts = 0  # Workers that died while running it
+        self.done = threading.Event()
+
+    @classmethod
+    def from_row(cls, pool: 'ExecutorPool', row) -> 'RemoteMission':
+        """For a mission left unfinished in the database; the worker resumes
+        it from its checkpoint."""
+        mission = Mission(goal=row['goal'])
+        mission.id = row['id']
+        mission.status = MissionStatus(row['status'])
+        mission.take_dirty()
+        return cls(pool, mission)
+
+    def cancel(self):
+        self.cancelled = True
+        self.pool.cancel(self.mission.id)
+
+    def run(self):
+        self.pool.run(self)
+
+
+class _Worker:
+    def __init__(self, slot: int):
+        self.slot = slot
+        self.process: Optional[subprocess.Popen] = None
+        self.missions: Set[str] = set()
+
+
+class ExecutorPool:
+    """
+    Runs missions in executor processes, so that their graph, prompt
+    building and parsing work does not compete with HTTP and Socket.IO
+    serving in the web process.
+
+    Each worker is a `python -m backend.executor_worker` process (see there
+    for the protocol) that runs any number of missions, and a mission goes
+    to the worker running the fewest. The events a mission emits come back
+    over its worker's stdout and are emitted to the mission's room from
+    here. A worker that exits is restarted after `restart_delay` seconds;
+    the missions it was running are resumed from their checkpoints on
+    another worker, each at most `max_retries` times before it is marked
+    FAILED.
+
+    The MissionScheduler still decides when missions run; it is given
+    RemoteMissions instead of AgentServices.
+    """
+    def __init__(self, app, socketio, workers: int = 2, restart_delay: float = 1.0, max_retries: int = 1):
+        self.app = app
+        self.socketio = socketio
+        self.restart_delay = restart_delay
+        self.max_retries = max_retries
+        self.restarts = 0
+        self._workers = [_Worker(slot) for slot in range(max(1, workers))]
+        self._missions: Dict[str, RemoteMission] = {}
+        self._pending: List[RemoteMission] = []  # Waiting for a live worker
+        self._lock = threading.Lock()
+        self._stopping = False
+
+    def start(self):
+        """Starts the worker processes."""
+        with self._lock:
+            for worker in self._workers:
+                self._spawn(worker)
+
+    def stop(self, timeout: float = 5.0):
+        """Stops the workers. Missions still running on them stay unfinished
+        in the database, to be resumed by the next server."""
+        with self._lock:
+            self._stopping = True
+            processes = [w.process for w in self._workers if w.process is not None]
+            remotes = list(self._missions.values())
+            self._missions.clear()
+            self._pending.clear()
+        for process in processes:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+        for process in processes:
+            try:
+                process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        for remote in remotes:
+            remote.done.set()
+
+    def run(self, remote: RemoteMission):
+        """Runs the mission on a worker and waits until it has finished."""
+        with self._lock:
+            if self._stopping:
+                return
+            self._missions[remote.mission.id] = remote
+            self._pending.append(remote)
+            self._dispatch()
+        remote.done.wait()
+
+    def cancel(self, mission_id: str):
+        """Asks the worker running the mission to cancel it."""
+        with self._lock:
+            for worker in self._workers:
+                if mission_id in worker.missions:
+                    self._send(worker, {'op': 'cancel', 'mission_id': mission_id})
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": len(self._workers),
+                "alive": sum(1 for w in self._workers if w.process is not None),
+                "running": sum(len(w.missions) for w in self._workers),
+                "pending": len(self._pending),
+                "restarts": self.restarts,
+            }
+
+    def worker_pids(self) -> List[Optional[int]]:
+        with self._lock:
+            return [w.process.pid if w.process is not None else None for w in self._workers]
+
+    # --- Internals ---
+    def _spawn(self, worker: _Worker):
+        # Caller must hold self._lock (as must _dispatch and _send).
+        from . import agent_service
+        process = subprocess.Popen([sys.executable, '-m', 'backend.executor_worker'], cwd=ROOT_DIR,
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                   text=True, encoding='utf-8', bufsize=1)
+        worker.process = process
+        self._send(worker, {'op': 'configure', 'app': self._app_config(), 'agent': agent_service.CONFIG})
+        self.socketio.start_background_task(self._relay, worker, process)
+
+    def _app_config(self) -> Dict[str, Any]:
+        config = {}
+        for key, value in self.app.config.items():
+            try:
+                json.dumps(value)
+            except (TypeError, ValueError):
+                continue
+            config[key] = value
+        return config
+
+    def _send(self, worker: _Worker, command: Dict[str, Any]):
+        try:
+            worker.process.stdin.write(json.dumps(command) + '\n')
+            worker.process.stdin.flush()
+        except (OSError, ValueError):
+            pass  # The worker is gone; _relay notices and recovers its missions.
+
+    def _dispatch(self):
+        while self._pending:
+            live = [w for w in self._workers if w.process is not None]
+            if not live:
+                return
+            worker = min(live, key=lambda w: len(w.missions))
+            remote = self._pending.pop(0)
+            worker.missions.add(remote.mission.id)
+            self._send(worker, {'op': 'run', 'mission_id': remote.mission.id,
+                                'use_cache': remote.use_cache, 'fused_planning': remote.fused_planning,
+                                'reuse_plans': remote.reuse_plans, 'cancelled': remote.cancelled})
+
+    def _relay(self, worker: _Worker, process: subprocess.Popen):
+        """Emits a worker's events until it exits, then restarts it."""
+        for line in process.stdout:
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            if message.get('op') == 'emit':
+                self.socketio.emit(message['event'], message['data'], to=message['room'])
+            elif message.get('op') == 'finished':
+                self._finished(worker, message['mission_id'])
+        process.wait()
+        self._worker_exited(worker, process)
+
+    def _finished(self, worker: _Worker, mission_id: str):
+        with self._lock:
+            worker.missions.discard(mission_id)
+            remote = self._missions.pop(mission_id, None)
+        if remote is not None:
+            remote.done.set()
+
+    def _worker_exited(self, worker: _Worker, process: subprocess.Popen):
+        with self._lock:
+            if self._stopping or worker.process is not process:
+                return
+            worker.process = None
+            lost = [self._missions[m] for m in worker.missions if m in self._missions]
+            worker.missions.clear()
+            abandoned = []
+            for remote in lost:
+                remote.attempts += 1
+                if remote.cancelled or remote.attempts > self.max_retries:
+                    del self._missions[remote.mission.id]
+                    abandoned.append(remote)
+                else:
+                    self._pending.append(remote)
+            self._dispatch()
+        print(f"✗ Executor worker {worker.slot} (pid {process.pid}) exited with code "
+              f"{process.returncode}; restarting it")
+        for remote in abandoned:
+            self._abandon(remote)
+
+        self.socketio.sleep(self.restart_delay)
+        with self._lock:
+            if self._stopping:
+                return
+            self.restarts += 1
+            self._spawn(worker)
+            self._dispatch()
+
+    def _abandon(self, remote: RemoteMission):
+        """Ends a mission that cannot be run again."""
+        status = MissionStatus.CANCELLED if remote.cancelled else MissionStatus.FAILED
+        print(f"✗ Mission {remote.mission.id} lost with its executor worker; marking it {status.value}")
+        try:
+            with self.app.app_context():
+                db.update_mission_fields(remote.mission.id, {'status': status})
+                db.delete_checkpoint(remote.mission.id)
+        finally:
+            self.socketio.emit('mission_status', {'mission_id': remote.mission.id, 'status': status.value})
+            remote.done.set()
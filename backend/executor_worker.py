@@ -0,0 +1,173 @@
+"""
+An executor process: runs the missions that the web process's ExecutorPool
+hands to it (see executor_pool). Started as `python -m backend.executor_worker`
+by the pool, not by hand.
+
+The pool and the worker exchange one JSON object per line. Commands arrive
+on stdin:
+
+    {"op": "configure", "app": {...}, "agent": {...}}  (first) app config and agent_service.CONFIG
+    {"op": "run", "mission_id": "...", "use_cache": null, "fused_planning": null, "reuse_plans": null,
+     "cancelled": false}
+    {"op": "cancel", "mission_id": "..."}
+
+and events go out on stdout:
+
+    {"op": "emit", "event": "...", "data": {...}, "room": "..."}
+    {"op": "finished", "mission_id": "..."}
+
+Anything mission code prints goes to stderr instead. When stdin closes the
+web process is gone, and the worker exits at once; the missions it leaves
+unfinished are resumed from their checkpoints like after any other crash.
+"""
+import json
+import os
+import queue
+import sys
+import threading
+from typing import Any, Dict, Set
+
+from flask import Flask
+
+from . import agent_service, db
+from .mission import MissionStatus
+from .mission_persister import TERMINAL_STATUSES
+
+
+class EventChannel:
+    """Writes the events of all mission threads to the output stream, in
+    order, from a single writer thread."""
+    def __init__(self, stream):
+        self._stream = stream
+        self._queue: queue.Queue = queue.Queue()
+        threading.Thread(target=self._write, name='executor-events', daemon=True).start()
+
+    def send(self, message: Dict[str, Any]):
+        self._queue.put(message)
+
+    def _write(self):
+        while True:
+            message = self._queue.get()
+            while True:
+                self._stream.write(json.dumps(message, default=str) + '\n')
+                try:
+                    message = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._stream.flush()
+
+
+class SocketIOProxy:
+    """Takes the place of the SocketIO object in AgentService; the web
+    process emits the events to the rooms."""
+    def __init__(self, channel: EventChannel):
+        self.channel = channel
+
+    def emit(self, event, data=None, to=None, room=None, **kwargs):
+        self.channel.send({'op': 'emit', 'event': event, 'data': data, 'room': to or room})
+
+
+class Worker:
+    """Runs each mission it is given in a thread of its own."""
+    def __init__(self, app, channel: EventChannel):
+        self.app = app
+        self.channel = channel
+        self.socketio = SocketIOProxy(channel)
+        self._services: Dict[str, agent_service.AgentService] = {}
+        self._cancelled: Set[str] = set()  # Cancelled before their service existed
+        self._lock = threading.Lock()
+
+    def run(self, job: Dict[str, Any]):
+        threading.Thread(target=self._run, args=(job,), daemon=True).start()
+
+    def cancel(self, mission_id: str):
+        with self._lock:
+            service = self._services.get(mission_id)
+            if service is None:
+                self._cancelled.add(mission_id)
+        if service is not None:
+            service.cancel()
+
+    def _run(self, job: Dict[str, Any]):
+        mission_id = job['mission_id']
+        try:
+            with self.app.app_context():
+                row = db.get_mission(mission_id)
+                if row is None:
+                    return
+                service = agent_service.AgentService.resume(row, self.socketio, self.app,
+                                                            use_cache=job.get('use_cache'),
+                                                            fused_planning=job.get('fused_planning'),
+                                                            reuse_plans=job.get('reuse_plans'))
+            with self._lock:
+                self._services[mission_id] = service
+                cancelled = job.get('cancelled') or mission_id in self._cancelled
+            if cancelled:
+                service.cancel()
+            service.run()
+        except Exception as e:
+            print(f"✗ Mission {mission_id} failed in executor {os.getpid()}: {e}", file=sys.stderr)
+            self._fail(mission_id, e)
+        finally:
+            with self._lock:
+                self._services.pop(mission_id, None)
+                self._cancelled.discard(mission_id)
+            self.channel.send({'op': 'finished', 'mission_id': mission_id})
+
+    def _fail(self, mission_id: str, error: Exception):
+        """Ends a mission whose service raised, so that it is not resumed (and
+        does not crash again) once the pool releases it."""
+        try:
+            with self.app.app_context():
+                row = db.get_mission(mission_id)
+                if row is None or MissionStatus(row['status']) in TERMINAL_STATUSES:
+                    return
+                db.update_mission_fields(mission_id, {'status': MissionStatus.FAILED})
+                db.delete_checkpoint(mission_id)
+        except Exception as e:
+            print(f"✗ Could not mark mission {mission_id} failed: {e}", file=sys.stderr)
+            return
+        self.socketio.emit('log', {'mission_id': mission_id, 'message': f"🔴 Mission failed: {error}"},
+                           to=mission_id)
+        self.socketio.emit('status_update', {'mission_id': mission_id, 'status': MissionStatus.FAILED.value,
+                                             'node': 'handle_vague_goal'}, to=mission_id)
+        self.socketio.emit('mission_status', {'mission_id': mission_id, 'status': MissionStatus.FAILED.value})
+
+
+def create_worker_app(config: Dict[str, Any]) -> Flask:
+    """A bare app with the web process's config, for the database and the
+    caches; it serves no requests."""
+    app = Flask('backend')
+    app.config.update(config)
+    db.init_app(app)
+    return app
+
+
+def main():
+    # Keep stdout for events and send everything printed to stderr.
+    events = os.fdopen(os.dup(1), 'w', encoding='utf-8')
+    os.dup2(2, 1)
+    channel = EventChannel(events)
+    worker = None
+    for line in sys.stdin:
+        command = json.loads(line)
+        op = command.get('op')
+        if op == 'configure':
+            agent_service.CONFIG.update(command['agent'])
+            worker = Worker(create_worker_app(command['app']), channel)
+            # Pre-import LangGraph and create the LLM clients for every
+            # endpoint (neither contacts Ollama) so the first mission does
+            # not pay for them.
+            import langgraph.graph  # noqa: F401
+            for model in (agent_service.get_llm(), agent_service.get_report_llm()):
+                for endpoint in agent_service.get_router().endpoints:
+                    model.model_for(endpoint)
+        elif op == 'run':
+            worker.run(command)
+        elif op == 'cancel':
+            worker.cancel(command['mission_id'])
+    os._exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+import json
+from typing import Any, Dict, List
+
+
+class ArrayItemParser:
+    """
+    Incrementally parses streamed JSON and returns the elements of one array
+    as soon as each of them is complete.
+
+    The array is the value of `key` in the top-level object, e.g. the
+    "steps" of {"clarified_goal": "...", "steps": [{...}, {...}]}. feed()
+    takes the text in arbitrary pieces and returns the elements completed
+    by that piece. Elements that are not valid JSON on their own are
+    skipped; the caller is expected to parse the full text once the stream
+    has ended and treat the streamed elements as a preview of it.
+
+    Complete string values of the top-level object are collected in
+    `values` as they arrive, e.g. the "clarified_goal" that precedes the
+    steps.
+    """
+    def __init__(self, key: str = 'steps'):
+        self.key = key
+        self.text = ''
+        self._pos = 0
+        self._stack: List[str] = []  # Open '{' and '[' containers
+        self._in_string = False
+        self._escaped = False
+        self._string_start = 0
+        self._last_string = None  # Last complete string at the top level of the object
+        self.values: Dict[str, str] = {}
+        self._key = None  # Key whose value is being read at the top level
+        self._in_array = False
+        self._item_start = None
+
+    def feed(self, text: str) -> List[Any]:
+        self.text += text
+        items = []
+        buffer = self.text
+        for pos in range(self._pos, len(buffer)):
+            char = buffer[pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._stack == ['{']:
+                        self._last_string = buffer[self._string_start + 1:pos]
+                        if self._key is not None:  # A value, not a key
+                            try:
+                                self.values[self._key] = json.loads(buffer[self._string_start:pos + 1])
+                            except ValueError:
+                                pass
+                    elif self._in_array and len(self._stack) == 2:
+                        self._emit(items, pos + 1)  # A string element
+                continue
+
+            if self._in_array and len(self._stack) == 2 and self._item_start is None \
+                    and not char.isspace() and char not in ',]':
+                self._item_start = pos
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = pos
+            elif char in '{[':
+                self._stack.append(char)
+                if char == '[' and self._stack == ['{', '['] and self._key == self.key:
+                    self._in_array = True
+                    self._item_start = None
+            elif char in '}]':
+                if self._in_array and len(self._stack) == 2 and self._item_start is not None:
+                    self._emit(items, pos)  # A number/literal element ends at the ']'
+                if self._stack:
+                    self._stack.pop()
+                if self._in_array and len(self._stack) == 2 and char == '}':
+                    self._emit(items, pos + 1)  # An object element
+                elif self._in_array and len(self._stack) == 1:
+                    self._in_array = False
+            elif char == ':' and self._stack == ['{']:
+                self._key = self._last_string
+            elif char == ',':
+                if self._stack == ['{']:
+                    self._key = None
+                elif self._in_array and len(self._stack) == 2 and self._item_start is not None:
+                    self._emit(items, pos)  # A number/literal element
+        self._pos = len(buffer)
+        return items
+
+    def _emit(self, items: List[Any], end: int):
+        start, self._item_start = self._item_start, None
+        if start is None:
+            return
+        try:
+            items.append(json.loads(self.text[start:end]))
+        except ValueError:
+            pass
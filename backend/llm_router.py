@@ -0,0 +1,446 @@
+import asyncio
+import itertools
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+
+class NoEndpointAvailable(Exception):
+    """Raised when every model endpoint is ejected by its circuit breaker."""
+
+
+class Endpoint:
+    """An Ollama server with its load, latency and circuit-breaker state.
+
+    The breaker is 'closed' while the endpoint is in use, 'open' once it has
+    been ejected, and 'half_open' when it is due a single trial request.
+    """
+    def __init__(self, url: str):
+        self.url = url.rstrip('/')
+        self.in_flight = 0
+        self.latency: Optional[float] = None  # Moving average of time to first token
+        self.failures = 0  # Consecutive failures
+        self.state = 'closed'
+        self.opened_at = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.hedges = 0
+        self.last_used = 0
+
+
+class LLMRouter:
+    """
+    Spreads model requests over a pool of Ollama endpoints.
+
+    Each request goes to the available endpoint with the least expected
+    wait, i.e. the fewest requests in flight weighted by its observed
+    latency; ties go to the endpoint used least recently. An endpoint
+    without a latency sample yet (e.g. one just added, or whose first
+    request is still running) is assumed to be as fast as the pool's
+    average, so its requests in flight still count. An endpoint that
+    fails `failure_threshold` requests in a row, or a health check, is
+    ejected for `reset_timeout` seconds and then gets one trial request
+    before it is trusted again.
+    """
+    def __init__(self, urls: Sequence[str], failure_threshold: int = 3,
+                 reset_timeout: float = 30.0, latency_alpha: float = 0.3):
+        if not urls:
+            raise ValueError("At least one endpoint is required")
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.latency_alpha = latency_alpha
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def acquire(self, exclude: Sequence[Endpoint] = ()) -> Endpoint:
+        """Picks the endpoint for a request and counts it as in flight.
+        Every acquire must be paired with a release."""
+        with self._lock:
+            now = time.monotonic()
+            candidates = []
+            for endpoint in self.endpoints:
+                if endpoint in exclude:
+                    continue
+                if endpoint.state == 'open':
+                    if now - endpoint.opened_at < self.reset_timeout:
+                        continue
+                    endpoint.state = 'half_open'
+                if endpoint.state == 'half_open' and endpoint.in_flight:
+                    continue  # Its trial request is still running
+                candidates.append(endpoint)
+            if not candidates:
+                raise NoEndpointAvailable("No Ollama endpoint is available")
+            known = [e.latency for e in self.endpoints if e.latency is not None]
+            prior = sum(known) / len(known) if known else 1.0
+            endpoint = min(candidates, key=lambda e: ((e.in_flight + 1) * (prior if e.latency is None else e.latency),
+                                                      e.in_flight, e.last_used))
+            endpoint.in_flight += 1
+            endpoint.requests += 1
+            endpoint.last_used = next(self._seq)
+            return endpoint
+
+    def pin(self, endpoint: Endpoint):
+        """Counts a request sent to a specific endpoint, whatever its state
+        (e.g. a warm-up); pair it with a release like acquire."""
+        with self._lock:
+            endpoint.in_flight += 1
+            endpoint.requests += 1
+
+    def release(self, endpoint: Endpoint, ok: Optional[bool], latency: Optional[float] = None):
+        """Ends a request. `ok` is None for requests abandoned by the caller
+        (cancelled, or a hedge that lost), which say nothing about the
+        endpoint's health."""
+        with self._lock:
+            endpoint.in_flight -= 1
+            if ok is None:
+                return
+            if ok:
+                endpoint.failures = 0
+                endpoint.state = 'closed'
+                if latency is not None:
+                    if endpoint.latency is None:
+                        endpoint.latency = latency
+                    else:
+                        endpoint.latency += self.latency_alpha * (latency - endpoint.latency)
+                return
+            endpoint.errors += 1
+            endpoint.failures += 1
+            if endpoint.state == 'half_open' or endpoint.failures >= self.failure_threshold:
+                self._eject(endpoint)
+
+    def _eject(self, endpoint: Endpoint):
+        # Caller must hold self._lock.
+        endpoint.state = 'open'
+        endpoint.opened_at = time.monotonic()
+
+    def check_health(self, timeout: float = 5.0):
+        """Probes every endpoint, ejecting those that do not answer and
+        restoring ejected ones that do."""
+        import httpx
+        for endpoint in self.endpoints:
+            try:
+                httpx.get(f"{endpoint.url}/api/tags", timeout=timeout).raise_for_status()
+                healthy = True
+            except Exception:
+                healthy = False
+            with self._lock:
+                if healthy:
+                    endpoint.failures = 0
+                    endpoint.state = 'closed'
+                elif endpoint.state != 'open':
+                    self._eject(endpoint)
+
+    def run_health_checks(self, interval: float):
+        """Checks endpoint health every `interval` seconds; meant to run as
+        a background task for the life of the process."""
+        while True:
+            time.sleep(interval)
+            self.check_health()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{
+                "url": e.url,
+                "state": e.state,
+                "in_flight": e.in_flight,
+                "latency_ms": round(e.latency * 1000, 2) if e.latency is not None else None,
+                "requests": e.requests,
+                "errors": e.errors,
+                "hedges": e.hedges,
+            } for e in self.endpoints]
+
+
+class RoutedLLM:
+    """
+    A chat model that sends each request through an LLMRouter.
+
+    It offers the stream/astream/invoke calls the agent uses, backed by one
+    model per endpoint built by `factory(url)`. A request that fails before
+    its first token is retried on another endpoint. JSON requests can be
+    hedged: if no token has arrived after `hedge_delay` seconds, the request
+    is also sent to a second endpoint and whichever answers first is used.
+    """
+    def __init__(self, router: LLMRouter, factory: Callable[[str], Any], model: str,
+                 temperature: float, format: Optional[str] = None,
+                 hedge_delay: Optional[float] = None):
+        self.router = router
+        self.factory = factory
+        self.model = model
+        self.temperature = temperature
+        self.format = format
+        self.hedge_delay = hedge_delay
+        self._models: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def model_for(self, endpoint: Endpoint):
+        with self._lock:
+            model = self._models.get(endpoint.url)
+            if model is None:
+                model = self._models[endpoint.url] = self.factory(endpoint.url)
+            return model
+
+    def _hedged(self, kwargs) -> bool:
+        return (self.hedge_delay is not None and len(self.router.endpoints) > 1
+                and kwargs.get('format', self.format) == 'json')
+
+    def _next_endpoint(self, tried: List[Endpoint], error: Optional[Exception]) -> Endpoint:
+        """Acquires an endpoint not tried yet; once none is left, raises the
+        last request error if there was one."""
+        try:
+            endpoint = self.router.acquire(exclude=tried)
+        except NoEndpointAvailable:
+            if error is not None:
+                raise error
+            raise
+        tried.append(endpoint)
+        return endpoint
+
+    def warm_up(self, prompt) -> Dict[str, Optional[str]]:
+        """Sends `prompt` to every endpoint so each loads the model. Returns
+        each endpoint's error, or None where the call succeeded."""
+        outcome = {}
+        for endpoint in self.router.endpoints:
+            self.router.pin(endpoint)
+            started = time.monotonic()
+            try:
+                self.model_for(endpoint).invoke(prompt)
+            except Exception as e:
+                self.router.release(endpoint, False)
+                outcome[endpoint.url] = str(e)
+            else:
+                self.router.release(endpoint, True, time.monotonic() - started)
+                outcome[endpoint.url] = None
+        return outcome
+
+    def invoke(self, prompt, **kwargs):
+        from langchain_core.messages import AIMessage
+        return AIMessage(content=''.join(_text(chunk) for chunk in self.stream(prompt, **kwargs)))
+
+    # --- Sync streaming ---
+    def stream(self, prompt, **kwargs):
+        if self._hedged(kwargs):
+            yield from self._hedged_stream(prompt, kwargs)
+            return
+        tried, error = [], None
+        while True:
+            endpoint = self._next_endpoint(tried, error)
+            started = time.monotonic()
+            latency = ok = stream = None
+            try:
+                stream = self.model_for(endpoint).stream(prompt, **kwargs)
+                for chunk in stream:
+                    if latency is None:
+                        latency = time.monotonic() - started
+                    yield chunk
+                ok = True
+                return
+            except Exception as e:
+                ok = False
+                if latency is not None:
+                    raise  # Part of the answer was already passed on
+                error = e
+            finally:
+                if stream is not None:
+                    stream.close()
+                self.router.release(endpoint, ok, latency)
+
+    def _hedged_stream(self, prompt, kwargs):
+        """Runs each attempt in a thread; the first to produce a token wins
+        and the others are abandoned."""
+        events = queue.Queue()
+        stops = []
+        tried, error = [], None
+
+        def attempt(index, endpoint, stop):
+            started = time.monotonic()
+            latency = ok = stream = None
+            try:
+                stream = self.model_for(endpoint).stream(prompt, **kwargs)
+                for chunk in stream:
+                    if latency is None:
+                        latency = time.monotonic() - started
+                    if stop.is_set():
+                        return
+                    events.put((index, 'chunk', chunk))
+                ok = True
+                events.put((index, 'done', None))
+            except Exception as e:
+                ok = False
+                events.put((index, 'error', e))
+            finally:
+                if stream is not None:
+                    stream.close()
+                self.router.release(endpoint, ok, latency)
+
+        def launch(hedge=False):
+            endpoint = self._next_endpoint(tried, error)
+            if hedge:
+                endpoint.hedges += 1
+            stop = threading.Event()
+            stops.append(stop)
+            threading.Thread(target=attempt, args=(len(stops) - 1, endpoint, stop),
+                             name='llm-hedge', daemon=True).start()
+
+        winner = None
+        running = 1
+        hedge_at = time.monotonic() + self.hedge_delay
+        launch()
+        try:
+            while True:
+                wait = None
+                if winner is None and hedge_at is not None:
+                    wait = max(0.0, hedge_at - time.monotonic())
+                try:
+                    index, kind, value = events.get(timeout=wait)
+                except queue.Empty:
+                    hedge_at = None
+                    try:
+                        launch(hedge=True)
+                        running += 1
+                    except NoEndpointAvailable:
+                        pass
+                    continue
+                if winner is None:
+                    if kind == 'error':
+                        running -= 1
+                        error = value
+                        if not running:
+                            launch()  # Fail over, or raise once all were tried
+                            running = 1
+                        continue
+                    winner = index
+                    for i, stop in enumerate(stops):
+                        if i != winner:
+                            stop.set()
+                if index != winner:
+                    continue
+                if kind == 'chunk':
+                    yield value
+                elif kind == 'done':
+                    return
+                else:
+                    raise value
+        finally:
+            for stop in stops:
+                stop.set()
+
+    # --- Async streaming ---
+    async def astream(self, prompt, **kwargs):
+        if self._hedged(kwargs):
+            async for chunk in self._ahedged_stream(prompt, kwargs):
+                yield chunk
+            return
+        tried, error = [], None
+        while True:
+            endpoint = self._next_endpoint(tried, error)
+            started = time.monotonic()
+            latency = ok = stream = None
+            try:
+                stream = self.model_for(endpoint).astream(prompt, **kwargs)
+                async for chunk in stream:
+                    if latency is None:
+                        latency = time.monotonic() - started
+                    yield chunk
+                ok = True
+                return
+            except Exception as e:
+                ok = False
+                if latency is not None:
+                    raise
+                error = e
+            finally:
+                if stream is not None:
+                    await stream.aclose()
+                self.router.release(endpoint, ok, latency)
+
+    async def _ahedged_stream(self, prompt, kwargs):
+        """Async counterpart of _hedged_stream, racing the first read of
+        each attempt's stream."""
+        attempts = []
+        tried, error = [], None
+
+        def launch(hedge=False):
+            endpoint = self._next_endpoint(tried, error)
+            if hedge:
+                endpoint.hedges += 1
+            try:
+                stream = self.model_for(endpoint).astream(prompt, **kwargs)
+            except Exception:
+                self.router.release(endpoint, False)
+                raise
+            attempts.append({'endpoint': endpoint, 'stream': stream, 'started': time.monotonic(),
+                             'read': asyncio.ensure_future(stream.__anext__()), 'settled': False})
+
+        async def settle(attempt, ok, latency=None):
+            if attempt['settled']:
+                return
+            attempt['settled'] = True
+            read = attempt['read']
+            if not read.done():
+                read.cancel()
+                await asyncio.wait([read])
+            try:
+                await attempt['stream'].aclose()
+            except Exception:
+                pass
+            self.router.release(attempt['endpoint'], ok, latency)
+
+        launch()
+        winner = first = None
+        hedge_at = time.monotonic() + self.hedge_delay
+        try:
+            while winner is None:
+                pending = [a['read'] for a in attempts if not a['settled']]
+                wait = max(0.0, hedge_at - time.monotonic()) if hedge_at is not None else None
+                done, _ = await asyncio.wait(pending, timeout=wait,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedge_at = None
+                    try:
+                        launch(hedge=True)
+                    except NoEndpointAvailable:
+                        pass
+                    continue
+                for attempt in attempts:
+                    if attempt['settled'] or attempt['read'] not in done:
+                        continue
+                    latency = time.monotonic() - attempt['started']
+                    try:
+                        first = attempt['read'].result()
+                    except StopAsyncIteration:
+                        first = None
+                    except Exception as e:
+                        error = e
+                        await settle(attempt, False)
+                        continue
+                    winner = attempt
+                    winner['latency'] = latency
+                    break
+                if winner is None and all(a['settled'] for a in attempts):
+                    launch()  # Fail over, or raise once all were tried
+            for attempt in attempts:
+                if attempt is not winner:
+                    await settle(attempt, None)
+            if first is None:
+                await settle(winner, True, winner['latency'])
+                return
+            yield first
+            ok = None
+            try:
+                async for chunk in winner['stream']:
+                    yield chunk
+                ok = True
+            except Exception:
+                ok = False
+                raise
+            finally:
+                await settle(winner, ok, winner['latency'])
+        finally:
+            for attempt in attempts:
+                await settle(attempt, None)
+
+
+def _text(chunk) -> str:
+    return chunk.content if hasattr(chunk, 'content') else str(chunk)
@@ -0,0 +1,73 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_listener_lock = threading.Lock()
+
+
+def get_console_logger() -> logging.Logger:
+    """Returns the logger used for mission console output.
+
+    Records are handed to a queue and written to stderr by a listener
+    thread, so logging never blocks the mission that produced the line.
+    """
+    global _listener
+    logger = logging.getLogger('ai_planner.missions')
+    with _listener_lock:
+        if _listener is None:
+            log_queue = queue.SimpleQueue()
+            console = logging.StreamHandler()
+            console.setFormatter(logging.Formatter('%(message)s'))
+            _listener = logging.handlers.QueueListener(log_queue, console)
+            _listener.start()
+            atexit.register(_listener.stop)
+            logger.addHandler(logging.handlers.QueueHandler(log_queue))
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+    return logger
+
+
+class MissionLogBuffer:
+    """
+    Collects a mission's log entries and delivers them in batches.
+
+    `flush_fn` receives the list of buffered entries. A flush happens when
+    `max_batch` entries are waiting, `flush_interval` seconds after the first
+    entry of a batch was added, or whenever flush() is called explicitly
+    (e.g. before a status change, so ordering is preserved in the UI).
+    """
+    def __init__(self, flush_fn: Callable[[List[Dict[str, Any]]], None],
+                 flush_interval: float = 0.1, max_batch: int = 50):
+        self.flush_fn = flush_fn
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._entries: List[Dict[str, Any]] = []
+        self._timer: Optional[threading.Timer] = None
+        # Serializes flushes so batches are delivered in the order they were built.
+        self._lock = threading.RLock()
+
+    def add(self, entry: Dict[str, Any]):
+        """Buffers a log entry, flushing if the batch is full."""
+        with self._lock:
+            self._entries.append(entry)
+            if len(self._entries) >= self.max_batch:
+                self.flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """Delivers any buffered entries now."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._entries:
+                return
+            entries, self._entries = self._entries, []
+            self.flush_fn(entries)
@@ -0,0 +1,155 @@
+import bisect
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Default histogram buckets, in seconds.
+DURATION_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+QUERY_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+
+class Registry:
+    """Holds the process's metrics and renders them in the Prometheus text
+    exposition format (served at /api/metrics)."""
+    def __init__(self):
+        self._metrics: List['_Metric'] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: '_Metric') -> '_Metric':
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+class _Metric:
+    """
+    Base class of the metric types. Samples are kept per tuple of label
+    values, given positionally in the order of `labelnames`.
+
+    Updating a metric takes one uncontended lock and a dict lookup, so
+    metrics can be recorded on hot paths such as every SQLite statement.
+    """
+    type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: Optional[Registry] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        (REGISTRY if registry is None else registry).register(self)
+
+    def _labels(self, values: Tuple[str, ...], extra: str = '') -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{self._labels(labels)} {_format(value)}" for labels, value in values]
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def set(self, value: float, *labels: str):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DURATION_BUCKETS, registry: Optional[Registry] = None):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # Per-bucket counts (the last one is +Inf), sum, count.
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((labels, (list(counts), total, count))
+                            for labels, (counts, total, count) in self._values.items())
+        lines = []
+        for labels, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = 'le="' + ('+Inf' if bound == float('inf') else _format(bound)) + '"'
+                lines.append(f"{self.name}_bucket{self._labels(labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(labels)} {_format(total)}")
+            lines.append(f"{self.name}_count{self._labels(labels)} {count}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+REGISTRY = Registry()
+
+NODE_DURATION = Histogram('ai_planner_node_duration_seconds',
+                          'Time spent in each mission graph node.', ['node'])
+LLM_REQUEST_DURATION = Histogram('ai_planner_llm_request_duration_seconds',
+                                 'Duration of LLM calls, from request to last token.', ['model'])
+LLM_PROMPT_TOKENS = Counter('ai_planner_llm_prompt_tokens_total',
+                            'Prompt tokens reported by the LLM.', ['model'])
+LLM_COMPLETION_TOKENS = Counter('ai_planner_llm_completion_tokens_total',
+                                'Completion tokens reported by the LLM.', ['model'])
+SQLITE_QUERY_DURATION = Histogram('ai_planner_sqlite_query_duration_seconds',
+                                  'Duration of SQLite statements by kind (select, insert, commit...).',
+                                  ['operation'], buckets=QUERY_BUCKETS)
+SOCKETIO_EMITS = Counter('ai_planner_socketio_emits_total', 'Socket.IO events emitted.', ['event'])
+SOCKETIO_EMIT_BYTES = Counter('ai_planner_socketio_emit_bytes_total',
+                              'Encoded size of the Socket.IO event packets sent to clients.', ['event'])
+MISSIONS_ACTIVE = Gauge('ai_planner_missions_active', 'Missions currently running.')
+MISSIONS_QUEUED = Gauge('ai_planner_missions_queued', 'Missions waiting for a free slot.')
+
+
+def record_llm_call(model: str, elapsed: float, usage: Optional[Dict[str, int]]):
+    LLM_REQUEST_DURATION.observe(elapsed, model)
+    if usage:
+        LLM_PROMPT_TOKENS.inc(model, amount=usage.get('input_tokens') or 0)
+        LLM_COMPLETION_TOKENS.inc(model, amount=usage.get('output_tokens') or 0)
+
+
+def record_emit(event: str):
+    SOCKETIO_EMITS.inc(event)
+
+
+def record_emit_bytes(event: str, size: int):
+    SOCKETIO_EMIT_BYTES.inc(event, amount=size)
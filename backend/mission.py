@@ -1,24 +1,43 @@
 # c:/Users/dbmar/Downloads/ai_planner/backend/models/mission.py
 import uuid
+import threading
 from enum import Enum
 from typing import List, Dict, Any
 
 class MissionStatus(Enum):
     """Defines the possible states of a mission."""
     PENDING = "PENDING"
+    QUEUED = "QUEUED"
     CLARIFYING = "CLARIFYING"
     PLANNING = "PLANNING"
     EXECUTING = "EXECUTING"
     REPORTING = "REPORTING"
     COMPLETED = "COMPLETED"
     FAILED = "FAILED"
+    CANCELLED = "CANCELLED"
+
+# The graph node a mission is at while it has a given status.
+STATUS_NODES = {
+    MissionStatus.CLARIFYING: 'clarify_goal',
+    MissionStatus.PLANNING: 'create_plan',
+    MissionStatus.EXECUTING: 'execute_step',
+    MissionStatus.REPORTING: 'synthesize_report',
+    MissionStatus.COMPLETED: 'synthesize_report',
+}
 
 class Mission:
     """
     Represents the state and data of a single AI mission.
     This is the 'Model' in our MVC architecture.
+
+    Assignments to the persisted fields are tracked so that only changed
+    columns need to be written back to the database (see take_dirty).
     """
+    PERSISTED_FIELDS = ('goal', 'status', 'plan', 'report', 'clarified_goal')
+
     def __init__(self, goal: str):
+        object.__setattr__(self, '_dirty', set())
+        object.__setattr__(self, '_dirty_lock', threading.Lock())
         self.id: str = str(uuid.uuid4())
         self.goal: str = goal
         self.status: MissionStatus = MissionStatus.PENDING
@@ -27,9 +46,24 @@ class Mission:
         self.report: str = ""
         self.clarified_goal: str = ""
 
-    def add_log(self, message: str, node: str, data: Dict[str, Any] = None):
-        """Adds a structured log entry."""
-        self.logs.append({"message": message, "node": node, "data": data or {}})
+    def __setattr__(self, name: str, value: Any):
+        object.__setattr__(self, name, value)
+        if name in self.PERSISTED_FIELDS:
+            with self._dirty_lock:
+                self._dirty.add(name)
+
+    def take_dirty(self) -> Dict[str, Any]:
+        """Returns the persisted fields changed since the last call and marks
+        them clean."""
+        with self._dirty_lock:
+            names, self._dirty = self._dirty, set()
+            return {name: getattr(self, name) for name in names}
+
+    def add_log(self, message: str, node: str, data: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Adds a structured log entry, numbered from 1 in order of arrival."""
+        entry = {"seq": len(self.logs) + 1, "message": message, "node": node, "data": data or {}}
+        self.logs.append(entry)
+        return entry
 
     def set_status(self, status: MissionStatus):
         """Updates the mission status."""
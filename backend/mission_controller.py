@@ -1,23 +1,56 @@
 # c:/Users/dbmar/Downloads/ai_planner/backend/controllers/mission_controller.py
+import time
+
 from flask import request, jsonify
 
+from .executor_pool import ExecutorPool, RemoteMission
+from .mission import Mission
+from .mission_ownership import MissionOwnership
+from .mission_scheduler import MissionScheduler, QueueFullError
+
 def register_mission_routes(app, socketio):
     """
     Registers routes and socket events for missions.
     This is the 'Controller' in our MVC architecture.
     """
+    # Missions are owned by the worker (process) that runs them, so that
+    # workers sharing the database never run the same mission twice.
+    ownership = MissionOwnership(app, app.config['WORKER_ID'], app.config['MISSION_LEASE_TIMEOUT'])
+    app.extensions['mission_ownership'] = ownership
+    # One scheduler per app bounds how many missions hit Ollama at once.
+    scheduler = MissionScheduler(socketio,
+                                 max_concurrent=app.config['MAX_CONCURRENT_MISSIONS'],
+                                 max_queue=app.config['MISSION_QUEUE_SIZE'],
+                                 on_finished=ownership.release)
+    app.extensions['mission_scheduler'] = scheduler
+    # Missions run in separate executor processes if EXECUTOR_POOL_WORKERS
+    # is set; the pool is started by create_app once Socket.IO is ready.
+    pool = None
+    if app.config['EXECUTOR_POOL_WORKERS']:
+        pool = ExecutorPool(app, socketio, workers=app.config['EXECUTOR_POOL_WORKERS'])
+        app.extensions['executor_pool'] = pool
 
     @app.route('/api/missions', methods=['POST'])
     def start_mission():
         """
         API endpoint to start a new AI mission.
-        Expects a JSON body with a 'goal'.
+        Expects a JSON body with a 'goal' and an optional integer 'priority'
+        (higher runs first when missions are queued). 'use_cache',
+        'reuse_plans' and 'fused_planning' override the app defaults for
+        this mission. If
+        'socket_id' names the caller's Socket.IO connection, it is subscribed
+        to the mission's events before the mission starts.
+        Responds 429 with a Retry-After header when the queue is full.
         """
         data = request.get_json()
         if not data or not data.get('goal'):
             return jsonify({"error": "Goal not provided"}), 400
 
         goal = data['goal']
+        try:
+            priority = int(data.get('priority', 0))
+        except (TypeError, ValueError):
+            return jsonify({"error": "Priority must be an integer"}), 400
 
         # 1. Create the Agent Service (which contains the business logic)
         # Import AgentService here to avoid heavy/optional imports at module
@@ -26,14 +59,187 @@ def register_mission_routes(app, socketio):
         from .agent_service import AgentService
         from . import db
 
-        agent_service = AgentService(goal, socketio, app)
-        
-        # Save the initial mission state to the database
+        # Missions may opt out of the LLM response cache, e.g. to get a
+        # fresh, non-deterministic plan for a goal that was run before.
+        use_cache = data.get('use_cache')
+        # Independently, they may opt out of reusing a similar mission's plan.
+        reuse_plans = data.get('reuse_plans')
+        # Missions may also ask for the goal to be clarified and planned in one LLM call.
+        fused_planning = data.get('fused_planning')
+        use_cache = None if use_cache is None else bool(use_cache)
+        reuse_plans = None if reuse_plans is None else bool(reuse_plans)
+        fused_planning = None if fused_planning is None else bool(fused_planning)
+        if pool is not None:
+            # Only a stand-in here; a worker process builds the AgentService.
+            agent_service = RemoteMission(pool, Mission(goal=goal), use_cache=use_cache,
+                                          fused_planning=fused_planning, reuse_plans=reuse_plans)
+        else:
+            agent_service = AgentService(goal, socketio, app, use_cache=use_cache,
+                                         fused_planning=fused_planning, reuse_plans=reuse_plans)
+
+        # Save the initial mission state to the database, owned by this worker
+        ownership.claim(agent_service.mission.id)
         with app.app_context():
             db.create_mission(agent_service.mission)
-        
-        # 2. Run the mission in a background thread to not block the request
-        socketio.start_background_task(agent_service.run)
+
+        # Subscribe the browser that started the mission before it can run;
+        # it would otherwise miss the events sent before its join_mission.
+        socket_id = data.get('socket_id')
+        if isinstance(socket_id, str) and socket_id:
+            try:
+                socketio.server.enter_room(socket_id, agent_service.mission.id, namespace='/')
+            except (KeyError, ValueError):
+                pass  # Not connected here; it joins once it has the id.
+
+        # 2. Hand the mission to the scheduler, which runs it in a background
+        #    task as soon as a slot is free.
+        try:
+            admission = scheduler.submit(agent_service, priority=priority)
+        except QueueFullError as e:
+            with app.app_context():
+                db.delete_mission(agent_service.mission.id)
+            response = jsonify({"error": "Too many missions in progress. Please retry later.",
+                                "retry_after": e.retry_after})
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response, 429
+
+        if admission['position']:
+            agent_service.persister.flush()  # Record the QUEUED status
 
         # 3. Return an immediate response to the client
-        return jsonify(agent_service.mission.to_dict()), 202  # 202 Accepted
\ No newline at end of file
+        body = agent_service.mission.to_dict()
+        body.update(queue_position=admission['position'], estimated_wait=admission['estimated_wait'])
+        return jsonify(body), 202  # 202 Accepted
+
+    @app.route('/api/missions/<mission_id>/cancel', methods=['POST'])
+    def cancel_mission(mission_id):
+        """Cancel a Mission
+        Stops a queued or running mission and frees its slot for the next
+        one. A running mission ends with status CANCELLED once its current
+        LLM request has been aborted. A mission running on another worker
+        is cancelled by that worker when it next renews its lease.
+        ---
+        tags:
+          - Missions
+        parameters:
+          - name: mission_id
+            in: path
+            type: string
+            required: true
+        responses:
+          202:
+            description: The mission is being cancelled.
+          404:
+            description: Mission not found.
+          409:
+            description: The mission has already finished.
+        """
+        from . import db
+        from .mission import MissionStatus
+
+        if scheduler.cancel(mission_id):
+            return jsonify({"id": mission_id, "status": "cancelling"}), 202
+        if ownership.request_cancel(mission_id):
+            return jsonify({"id": mission_id, "status": "cancelling"}), 202
+
+        # Not owned by any live worker: it has finished, or it was orphaned
+        # by a crash or restart before it could be resumed.
+        with app.app_context():
+            row = db.get_mission(mission_id)
+            if row is None:
+                return jsonify({"error": "Mission not found"}), 404
+            if row['status'] in ('COMPLETED', 'FAILED', 'CANCELLED'):
+                return jsonify({"error": f"Mission already {row['status'].lower()}"}), 409
+            db.update_mission_fields(mission_id, {'status': MissionStatus.CANCELLED})
+            db.delete_checkpoint(mission_id)
+            db.release_mission(mission_id)
+        socketio.emit('mission_status', {'mission_id': mission_id, 'status': 'CANCELLED'})
+        return jsonify({"id": mission_id, "status": "cancelling"}), 202
+
+    @app.route('/api/missions/queue', methods=['GET'])
+    def get_mission_queue():
+        """Mission Queue
+        Reports how many missions are running and queued, and the estimated
+        wait in seconds for a newly submitted mission.
+        ---
+        tags:
+          - Missions
+        responses:
+          200:
+            description: Scheduler statistics.
+            schema:
+              type: object
+              properties:
+                running:
+                  type: integer
+                queued:
+                  type: integer
+                max_concurrent:
+                  type: integer
+                max_queue:
+                  type: integer
+                average_duration:
+                  type: number
+                estimated_wait:
+                  type: integer
+        """
+        return jsonify(scheduler.stats())
+
+
+def resume_interrupted_missions(app, socketio):
+    """
+    Restarts missions that a previous run of the server, or a worker that
+    has died, left unfinished, continuing each one from its last
+    checkpoint. Runs at startup, after register_mission_routes, and then
+    periodically from run_mission_heartbeats. Missions another live worker
+    owns are left alone.
+    """
+    from .agent_service import AgentService
+    from . import db
+
+    scheduler = app.extensions['mission_scheduler']
+    ownership = app.extensions['mission_ownership']
+    pool = app.extensions.get('executor_pool')
+    try:
+        with app.app_context():
+            rows = db.get_orphaned_missions(time.time())
+            services = [RemoteMission.from_row(pool, row) if pool else AgentService.resume(row, socketio, app)
+                        for row in rows if ownership.claim(row['id'])]
+    except Exception as e:
+        print(f"✗ Could not look for interrupted missions: {e}")
+        return
+    for agent_service in services:
+        try:
+            scheduler.submit(agent_service)
+        except QueueFullError:
+            # Still unfinished in the database, so a later sweep picks it up.
+            print(f"✗ Mission queue is full; not resuming mission {agent_service.mission.id}")
+            ownership.release(agent_service.mission.id)
+            continue
+        agent_service.persister.flush()
+        print(f"↻ Resuming interrupted mission {agent_service.mission.id}")
+
+
+
+def run_mission_heartbeats(app, socketio):
+    """
+    Keeps this worker's missions owned: renews the leases on the missions
+    its scheduler runs or queues every MISSION_HEARTBEAT_INTERVAL seconds
+    and cancels those that another worker was asked to cancel. Once per
+    lease timeout it also resumes missions whose owner has died. Runs
+    forever in a background task.
+    """
+    scheduler = app.extensions['mission_scheduler']
+    ownership = app.extensions['mission_ownership']
+    interval = app.config['MISSION_HEARTBEAT_INTERVAL']
+    last_sweep = time.monotonic()
+    while True:
+        socketio.sleep(interval)
+        try:
+            for mission_id in ownership.renew(scheduler.mission_ids()):
+                scheduler.cancel(mission_id)
+        except Exception as e:
+            print(f"✗ Could not renew mission leases: {e}")
+        if time.monotonic() - last_sweep >= ownership.lease_timeout:
+            last_sweep = time.monotonic()
+            resume_interrupted_missions(app, socketio)
@@ -0,0 +1,46 @@
+import time
+from typing import Iterable, List
+
+from . import db
+
+
+class MissionOwnership:
+    """
+    Records in the database which worker runs each unfinished mission, so
+    that several server processes sharing one database run every mission
+    exactly once.
+
+    A worker claims a mission before running it and then holds a lease on
+    it, which it renews while the mission is queued or running (see
+    mission_controller.run_mission_heartbeats). If the worker dies, the
+    lease expires and another worker claims the mission and resumes it from
+    its checkpoint. Leases are compared against wall-clock time, so workers
+    on different hosts need synchronized clocks.
+    """
+    def __init__(self, app, worker_id: str, lease_timeout: float = 30.0):
+        self.app = app
+        self.worker_id = worker_id
+        self.lease_timeout = lease_timeout
+
+    def claim(self, mission_id: str) -> bool:
+        """Takes ownership of a mission; False if another worker holds it."""
+        now = time.time()
+        with self.app.app_context():
+            return db.claim_mission(mission_id, self.worker_id, now + self.lease_timeout, now)
+
+    def renew(self, mission_ids: Iterable[str]) -> List[str]:
+        """Renews the leases on the given missions and returns those that
+        another worker asked to cancel."""
+        with self.app.app_context():
+            return db.renew_mission_leases(self.worker_id, mission_ids, time.time() + self.lease_timeout)
+
+    def release(self, mission_id: str):
+        """Gives up a mission once it has finished here."""
+        with self.app.app_context():
+            db.release_mission(mission_id, self.worker_id)
+
+    def request_cancel(self, mission_id: str) -> bool:
+        """Asks the mission's owner to cancel it. Returns False if no live
+        worker owns it."""
+        with self.app.app_context():
+            return db.request_mission_cancel(mission_id, time.time())
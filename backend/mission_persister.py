@@ -0,0 +1,55 @@
+import threading
+from typing import Optional
+
+from . import db
+
+try:
+    from .mission import MissionStatus
+except Exception:
+    from mission import MissionStatus
+
+# Statuses after which a mission never changes again.
+TERMINAL_STATUSES = (MissionStatus.COMPLETED, MissionStatus.FAILED, MissionStatus.CANCELLED)
+
+
+class MissionPersister:
+    """
+    Write-behind persistence for a single mission.
+
+    Graph nodes call mark_dirty() after changing the mission. Writes are
+    delayed by `delay` seconds so that changes made in quick succession
+    (e.g. a status change followed by a new plan) are coalesced into one
+    UPDATE of just the changed columns and a single commit. Terminal statuses
+    are flushed immediately so the final state is always durable.
+    """
+    def __init__(self, app, mission, delay: float = 0.5):
+        self.app = app
+        self.mission = mission
+        self.delay = delay
+        self.writes = 0
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.RLock()
+
+    def mark_dirty(self):
+        """Schedules a write of the mission's changed fields."""
+        if self.mission.status in TERMINAL_STATUSES:
+            self.flush()
+            return
+        with self._lock:
+            if self._timer is None:
+                self._timer = threading.Timer(self.delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """Writes any changed fields now."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            fields = self.mission.take_dirty()
+            if not fields:
+                return
+            with self.app.app_context():
+                db.update_mission_fields(self.mission.id, fields)
+            self.writes += 1
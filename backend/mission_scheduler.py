@@ -0,0 +1,169 @@
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    from .mission import MissionStatus
+except Exception:
+    from mission import MissionStatus
+
+
+class QueueFullError(Exception):
+    """Raised when a mission cannot be admitted because the queue is full."""
+    def __init__(self, retry_after: int):
+        super().__init__(f"Mission queue is full; retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class MissionScheduler:
+    """
+    Runs missions with a bounded level of concurrency.
+
+    At most `max_concurrent` missions run at once; further missions wait in a
+    priority queue (higher priority first, FIFO within a priority) that holds
+    up to `max_queue` entries. Submitting to a full queue raises
+    QueueFullError so the API can shed load instead of overloading Ollama.
+
+    `on_finished`, if given, is called with the mission id once a mission
+    has finished running (or was cancelled while queued).
+    """
+    # Assumed mission duration until real durations have been observed.
+    DEFAULT_DURATION = 60.0
+
+    def __init__(self, socketio, max_concurrent: int = 2, max_queue: int = 20,
+                 on_finished: Optional[Callable[[str], None]] = None):
+        self.socketio = socketio
+        self.on_finished = on_finished
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self._queue = []  # heap of (-priority, seq, agent_service)
+        self._running: Dict[str, Any] = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._durations = deque(maxlen=20)
+
+    def submit(self, agent_service, priority: int = 0) -> Dict[str, Any]:
+        """Admits a mission, starting it now if a slot is free or queueing it.
+
+        Returns the mission's queue position (0 when it started right away)
+        and the estimated wait in seconds.
+        """
+        with self._lock:
+            if len(self._running) < self.max_concurrent and not self._queue:
+                self._start(agent_service)
+                return {"position": 0, "estimated_wait": 0}
+            if len(self._queue) >= self.max_queue:
+                raise QueueFullError(self._retry_after())
+            agent_service.mission.set_status(MissionStatus.QUEUED)
+            entry = (-priority, next(self._seq), agent_service)
+            heapq.heappush(self._queue, entry)
+            position = 1 + sum(1 for e in self._queue if e[:2] < entry[:2])
+            return {"position": position, "estimated_wait": self._estimated_wait(position)}
+
+    def cancel(self, mission_id: str) -> bool:
+        """Cancels a queued or running mission and frees its place at once.
+
+        A running mission's slot goes to the next queued mission right away,
+        while the cancelled one winds down in the background. Returns False
+        if this scheduler is not running or queueing the mission.
+        """
+        with self._lock:
+            agent_service = self._running.pop(mission_id, None)
+            queued = False
+            if agent_service is None:
+                for index, entry in enumerate(self._queue):
+                    if entry[2].mission.id == mission_id:
+                        agent_service = entry[2]
+                        self._queue.pop(index)
+                        heapq.heapify(self._queue)
+                        queued = True
+                        break
+            if agent_service is None:
+                return False
+            agent_service.cancel()
+            self._dispatch()
+        if queued:
+            # Never started, so run() only records the cancellation.
+            agent_service.run()
+            self._notify_finished(agent_service)
+        return True
+
+    def mission_ids(self) -> List[str]:
+        """Ids of the missions running or queued here."""
+        with self._lock:
+            return list(self._running) + [entry[2].mission.id for entry in self._queue]
+
+    def stats(self) -> Dict[str, Any]:
+        """Reports queue depth, running missions and the estimated wait for a new mission."""
+        with self._lock:
+            return {
+                "running": len(self._running),
+                "queued": len(self._queue),
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "average_duration": round(self._average_duration(), 2),
+                "estimated_wait": self._estimated_wait(len(self._queue) + 1),
+            }
+
+    # --- Internals ---
+    def _start(self, agent_service):
+        # Caller must hold self._lock (as must _dispatch).
+        self._running[agent_service.mission.id] = agent_service
+        if getattr(agent_service, 'async_mode', False):
+            # Async missions share the runtime's event loop instead of
+            # holding a background task each.
+            from .async_runtime import get_runtime
+            started = time.monotonic()
+            future = get_runtime().spawn(agent_service.arun())
+            future.add_done_callback(lambda _: self._finished(agent_service, started))
+        else:
+            self.socketio.start_background_task(self._run, agent_service)
+
+    def _run(self, agent_service):
+        started = time.monotonic()
+        try:
+            agent_service.run()
+        finally:
+            self._finished(agent_service, started)
+
+    def _finished(self, agent_service, started: float):
+        with self._lock:
+            if not getattr(agent_service, 'cancelled', False):
+                self._durations.append(time.monotonic() - started)
+                # A cancelled mission already gave up its slot.
+                self._running.pop(agent_service.mission.id, None)
+            self._dispatch()
+        self._notify_finished(agent_service)
+
+    def _notify_finished(self, agent_service):
+        if self.on_finished is None:
+            return
+        try:
+            self.on_finished(agent_service.mission.id)
+        except Exception as e:
+            print(f"✗ on_finished failed for mission {agent_service.mission.id}: {e}")
+
+    def _dispatch(self):
+        while self._queue and len(self._running) < self.max_concurrent:
+            _, _, agent_service = heapq.heappop(self._queue)
+            self._start(agent_service)
+
+    def _average_duration(self) -> float:
+        if not self._durations:
+            return self.DEFAULT_DURATION
+        return sum(self._durations) / len(self._durations)
+
+    def _estimated_wait(self, position: int) -> int:
+        """Seconds until the mission at `position` in the queue gets a slot."""
+        if position <= 0:
+            return 0
+        waves = math.ceil(position / self.max_concurrent)
+        return int(math.ceil(waves * self._average_duration()))
+
+    def _retry_after(self) -> int:
+        # A queue slot opens roughly every average_duration / max_concurrent seconds.
+        return max(1, int(math.ceil(self._average_duration() / self.max_concurrent)))
@@ -0,0 +1,139 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+
+class StubOllama:
+    """
+    A local HTTP server that speaks enough of the Ollama API for the app to
+    run against it offline: GET /api/tags and streaming POST /api/chat.
+
+    `respond(prompt, format)` returns the text of a reply; it is streamed
+    word by word, the first word after `latency` seconds and each further
+    word after `token_delay` seconds. Setting `status` to an HTTP error code
+    makes every request fail, which is how tests take an endpoint down.
+    """
+    def __init__(self, respond: Optional[Callable[[str, Optional[str]], str]] = None,
+                 latency: float = 0.0, token_delay: float = 0.0, model: str = 'llama3.2:1b'):
+        self.respond = respond or _default_response
+        self.latency = latency
+        self.token_delay = token_delay
+        self.model = model
+        self.status = 200
+        self.requests = 0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self, port: int = 0) -> 'StubOllama':
+        stub = self
+
+        class Handler(_Handler):
+            server_stub = stub
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='stub-ollama', daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def _enter(self):
+        with self._lock:
+            self.requests += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+
+    def _leave(self):
+        with self._lock:
+            self.active -= 1
+
+
+def _default_response(prompt: str, format: Optional[str]) -> str:
+    return json.dumps({'response': 'ok'}) if format == 'json' else 'Stub response.'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_stub: StubOllama = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status: int, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        stub = self.server_stub
+        if self.path != '/api/tags':
+            self._send_json(404, {'error': 'not found'})
+        elif stub.status != 200:
+            self._send_json(stub.status, {'error': 'unavailable'})
+        else:
+            self._send_json(200, {'models': [{'name': stub.model, 'model': stub.model}]})
+
+    def do_POST(self):
+        stub = self.server_stub
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        if self.path != '/api/chat':
+            self._send_json(404, {'error': 'not found'})
+            return
+        if stub.status != 200:
+            self._send_json(stub.status, {'error': 'unavailable'})
+            return
+        prompt = '\n'.join(m.get('content', '') for m in body.get('messages', []))
+        stub._enter()
+        try:
+            text = stub.respond(prompt, body.get('format'))
+            if not body.get('stream', True):
+                time.sleep(stub.latency)
+                self._send_json(200, self._message(text, done=True, prompt_eval_count=len(prompt.split()),
+                                                   eval_count=len(text.split())))
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            time.sleep(stub.latency)
+            words = text.split(' ')
+            for i, word in enumerate(words):
+                if i:
+                    time.sleep(stub.token_delay)
+                self._write_chunk(self._message(word if i == 0 else ' ' + word, done=False))
+            # Words stand in for tokens in the usage counts.
+            self._write_chunk(self._message('', done=True, prompt_eval_count=len(prompt.split()),
+                                            eval_count=len(words)))
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client closed the stream early
+        finally:
+            stub._leave()
+
+    def _message(self, content: str, done: bool, **counts):
+        message = {'model': self.server_stub.model, 'created_at': '2024-01-01T00:00:00Z',
+                   'message': {'role': 'assistant', 'content': content}, 'done': done}
+        if done:
+            message.update(done_reason='stop', **counts)
+        return message
+
+    def _write_chunk(self, message):
+        data = json.dumps(message).encode('utf-8') + b'\n'
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
@@ -0,0 +1,185 @@
+import json
+import re
+import threading
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from . import db
+
+
+class PlanLibrary:
+    """
+    An in-memory library of plans from completed missions, searchable by goal.
+
+    Goals are turned into hashed character n-gram counts (sublinear TF). A
+    goal has only a few dozen distinct n-grams, so each is stored sparsely
+    as its bucket indices and weights, and the rows are packed into
+    CSR-style NumPy arrays on the first query after a change. Queries are
+    scored by TF-IDF cosine similarity: the IDF weights follow the document
+    frequencies as plans are added and are applied per query, so no
+    weighted copy of the rows is kept; only the row norms are cached.
+    """
+    def __init__(self, dim: int = 4096, ngram: int = 3):
+        self.dim = dim
+        self.ngram = ngram
+        self.entries: List[Dict[str, Any]] = []
+        self._rows: List[Tuple[np.ndarray, np.ndarray]] = []  # (bucket indices, TF) per entry
+        self._df = np.zeros(dim, dtype=np.float32)
+        self._by_key: Dict[str, int] = {}
+        # Packed rows (indptr, indices, data), IDF and row norms; None when stale.
+        self._packed: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+        self._idf: Optional[np.ndarray] = None
+        self._norms: Optional[np.ndarray] = None
+        self._last_pk = 0
+        self._lock = threading.Lock()
+        # Outcome counters reported by stats()
+        self.lookups = 0
+        self.reused = 0
+        self.seeded = 0
+        self._plan_seconds = 0.0
+        self._planned = 0
+        self.time_saved = 0.0
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        return ' '.join(re.findall(r"\w+", (text or '').lower()))
+
+    def vectorize(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the sublinear term frequencies of `text`'s hashed n-grams
+        as sorted bucket indices and their weights."""
+        words = self._normalize(text)
+        if not words:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        padded = f" {words} "
+        n = self.ngram
+        grams = [padded[i:i + n] for i in range(max(1, len(padded) - n + 1))]
+        buckets = np.array([zlib.crc32(g.encode('utf-8')) % self.dim for g in grams], dtype=np.int32)
+        indices, counts = np.unique(buckets, return_counts=True)
+        return indices, np.log1p(counts).astype(np.float32)
+
+    def add(self, goal: str, plan: List[str], dependencies: Optional[List[List[int]]] = None,
+            mission_id: Optional[str] = None):
+        """Adds a goal's plan. A plan for an identical goal replaces the older one."""
+        key = self._normalize(goal)
+        if not key or not plan:
+            return
+        vector = self.vectorize(goal)
+        entry = {'goal': goal, 'plan': list(plan), 'dependencies': dependencies,
+                 'mission_id': mission_id}
+        with self._lock:
+            row = self._by_key.get(key)
+            if row is None:
+                self.entries.append(entry)
+                self._rows.append(vector)
+                self._by_key[key] = len(self.entries) - 1
+            else:
+                self._df[self._rows[row][0]] -= 1
+                self.entries[row] = entry
+                self._rows[row] = vector
+            self._df[vector[0]] += 1
+            self._packed = None
+
+    def load(self, batch_size: int = 500) -> int:
+        """Adds plans of missions completed since the last load, one page
+        at a time. Must be called inside an application context."""
+        loaded = 0
+        while True:
+            rows = db.get_completed_plans(self._last_pk, batch_size)
+            for row in rows:
+                try:
+                    plan = json.loads(row['plan'])
+                except (TypeError, ValueError):
+                    plan = None
+                if isinstance(plan, list):
+                    self.add(row['clarified_goal'] or row['goal'], [str(s) for s in plan],
+                             mission_id=row['id'])
+                    loaded += 1
+                self._last_pk = row['pk']
+            if len(rows) < batch_size:
+                return loaded
+
+    def search(self, goal: str, k: int = 3) -> List[Dict[str, Any]]:
+        """Returns up to `k` entries most similar to `goal`, best first, each
+        with a 'similarity' between 0 and 1."""
+        with self._lock:
+            n = len(self.entries)
+            if n == 0 or k <= 0:
+                return []
+            if self._packed is None:
+                lengths = [len(indices) for indices, _ in self._rows]
+                indptr = np.zeros(n + 1, dtype=np.int64)
+                np.cumsum(lengths, out=indptr[1:])
+                indices = np.concatenate([indices for indices, _ in self._rows])
+                data = np.concatenate([tf for _, tf in self._rows])
+                self._idf = (np.log((1.0 + n) / (1.0 + self._df)) + 1.0).astype(np.float32)
+                weighted = data * self._idf[indices]
+                self._norms = np.sqrt(np.add.reduceat(weighted * weighted, indptr[:-1]))
+                self._packed = (indptr, indices, data)
+            indptr, indices, data = self._packed
+            query_indices, query_tf = self.vectorize(goal)
+            query = query_tf * self._idf[query_indices]
+            norm = np.linalg.norm(query)
+            if norm == 0:
+                return []
+            # Each row's dot product with the query, with both sides' IDF
+            # applied to the query vector: sum(tf * idf * q * idf).
+            dense = np.zeros(self.dim, dtype=np.float32)
+            dense[query_indices] = query * self._idf[query_indices] / norm
+            scores = np.add.reduceat(data * dense[indices], indptr[:-1]) / np.maximum(self._norms, 1e-12)
+            k = min(k, n)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [dict(self.entries[i], similarity=float(scores[i])) for i in top]
+
+    def record(self, outcome: str, plan_seconds: Optional[float] = None):
+        """Counts a planning outcome: 'reused', 'seeded' or 'miss'.
+
+        `plan_seconds` is how long an LLM planning call took; their average
+        is credited as time saved for every reused plan.
+        """
+        with self._lock:
+            self.lookups += 1
+            if plan_seconds is not None:
+                self._plan_seconds += plan_seconds
+                self._planned += 1
+            if outcome == 'reused':
+                self.reused += 1
+                self.time_saved += self._average_plan_seconds()
+            elif outcome == 'seeded':
+                self.seeded += 1
+
+    def _average_plan_seconds(self) -> float:
+        return self._plan_seconds / self._planned if self._planned else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """Reports the library size, hit rate and estimated planning time saved."""
+        with self._lock:
+            return {
+                "entries": len(self.entries),
+                "lookups": self.lookups,
+                "reused": self.reused,
+                "seeded": self.seeded,
+                "hit_rate": round(self.reused / self.lookups, 4) if self.lookups else 0.0,
+                "average_plan_seconds": round(self._average_plan_seconds(), 3),
+                "time_saved_seconds": round(self.time_saved, 3),
+            }
+
+
+_libraries: Dict[str, PlanLibrary] = {}
+_libraries_lock = threading.Lock()
+
+
+def get_library(app) -> PlanLibrary:
+    """Returns the process-wide plan library for the app's database, loading
+    previously completed missions on first use."""
+    path = app.config['DATABASE']
+    with _libraries_lock:
+        library = _libraries.get(path)
+        if library is None:
+            library = PlanLibrary()
+            with app.app_context():
+                library.load()
+            _libraries[path] = library
+        return library
@@ -1,19 +1,100 @@
--- Initialize the database.
--- Drop any existing data and create empty tables.
+-- The database schema. Every statement only creates what is missing, so
+-- db.migrate() can run it against an existing database; db.init_db() drops
+-- the tables first. Bump db.SCHEMA_VERSION when changing it.
 
-DROP TABLE IF EXISTS ideas;
-DROP TABLE IF EXISTS missions;
-
-CREATE TABLE ideas (
+CREATE TABLE IF NOT EXISTS ideas (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   goal TEXT NOT NULL
 );
 
-CREATE TABLE missions (
-    id TEXT PRIMARY KEY,
+CREATE TABLE IF NOT EXISTS missions (
+    -- Stable row number for the search index (see missions_fts); never reused
+    pk INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
     goal TEXT NOT NULL,
     clarified_goal TEXT,
     status TEXT NOT NULL,
     plan TEXT, -- Stored as a JSON string
-    report TEXT
-);
\ No newline at end of file
+    report TEXT,
+    -- ISO-8601 UTC timestamps with millisecond precision
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')),
+    updated_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+);
+
+-- Newest-first listing, optionally filtered by status, walks these indexes.
+CREATE INDEX IF NOT EXISTS idx_missions_status_created_at ON missions (status, created_at);
+CREATE INDEX IF NOT EXISTS idx_missions_created_at ON missions (created_at);
+
+-- Log lines emitted by a mission, numbered per mission so clients can
+-- resume from the last sequence number they saw.
+CREATE TABLE IF NOT EXISTS mission_events (
+    mission_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    node TEXT,
+    message TEXT NOT NULL,
+    data TEXT, -- Extra structured data (e.g. a plan) as a JSON string
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (mission_id, seq)
+);
+
+-- The graph state of a running mission, saved after each node so an
+-- interrupted mission can resume without repeating finished nodes.
+CREATE TABLE IF NOT EXISTS mission_checkpoints (
+    mission_id TEXT PRIMARY KEY,
+    node TEXT NOT NULL, -- The last node that completed
+    state TEXT NOT NULL, -- JSON snapshot of the graph state
+    updated_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+);
+
+-- The worker (server process) that runs each unfinished mission. A worker
+-- holds a lease on its missions that it keeps renewing; once a lease has
+-- expired, e.g. because its worker died, another worker may claim the
+-- mission and resume it. Cancel requests for missions running on another
+-- worker are recorded here and picked up by the owner.
+CREATE TABLE IF NOT EXISTS mission_owners (
+    mission_id TEXT PRIMARY KEY,
+    worker_id TEXT NOT NULL,
+    lease_expires REAL NOT NULL, -- Unix time
+    cancel_requested INTEGER NOT NULL DEFAULT 0
+);
+
+-- Full-text search indexes. They are external-content FTS5 tables that
+-- reference the source rows by their INTEGER PRIMARY KEY (which VACUUM
+-- keeps) and are kept in sync by the triggers below, so the text is not
+-- stored twice.
+CREATE VIRTUAL TABLE IF NOT EXISTS ideas_fts USING fts5(
+    goal,
+    content='ideas', content_rowid='id', tokenize='porter unicode61'
+);
+
+CREATE TRIGGER IF NOT EXISTS ideas_fts_insert AFTER INSERT ON ideas BEGIN
+    INSERT INTO ideas_fts (rowid, goal) VALUES (new.id, new.goal);
+END;
+CREATE TRIGGER IF NOT EXISTS ideas_fts_delete AFTER DELETE ON ideas BEGIN
+    INSERT INTO ideas_fts (ideas_fts, rowid, goal) VALUES ('delete', old.id, old.goal);
+END;
+CREATE TRIGGER IF NOT EXISTS ideas_fts_update AFTER UPDATE OF goal ON ideas BEGIN
+    INSERT INTO ideas_fts (ideas_fts, rowid, goal) VALUES ('delete', old.id, old.goal);
+    INSERT INTO ideas_fts (rowid, goal) VALUES (new.id, new.goal);
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS missions_fts USING fts5(
+    goal, clarified_goal, report,
+    content='missions', content_rowid='pk', tokenize='porter unicode61'
+);
+
+CREATE TRIGGER IF NOT EXISTS missions_fts_insert AFTER INSERT ON missions BEGIN
+    INSERT INTO missions_fts (rowid, goal, clarified_goal, report)
+    VALUES (new.pk, new.goal, new.clarified_goal, new.report);
+END;
+CREATE TRIGGER IF NOT EXISTS missions_fts_delete AFTER DELETE ON missions BEGIN
+    INSERT INTO missions_fts (missions_fts, rowid, goal, clarified_goal, report)
+    VALUES ('delete', old.pk, old.goal, old.clarified_goal, old.report);
+END;
+-- Only text changes touch the index; status updates do not.
+CREATE TRIGGER IF NOT EXISTS missions_fts_update AFTER UPDATE OF goal, clarified_goal, report ON missions BEGIN
+    INSERT INTO missions_fts (missions_fts, rowid, goal, clarified_goal, report)
+    VALUES ('delete', old.pk, old.goal, old.clarified_goal, old.report);
+    INSERT INTO missions_fts (rowid, goal, clarified_goal, report)
+    VALUES (new.pk, new.goal, new.clarified_goal, new.report);
+END;
\ No newline at end of file
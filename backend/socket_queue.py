@@ -0,0 +1,75 @@
+import queue
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import socketio
+
+
+class LocalPubSubManager(socketio.PubSubManager):
+    """
+    A Socket.IO message queue for servers in the same process.
+
+    It behaves like the Redis or Kombu managers, relaying emits and room
+    changes to every server subscribed to the same URL and channel, but the
+    bus is an in-memory list of queues. It stands in for a real message
+    queue in tests and when trying out a multi-worker setup on one machine.
+    """
+    name = 'local'
+
+    _buses: Dict[Tuple[str, str], List[queue.Queue]] = {}
+    _buses_lock = threading.Lock()
+
+    def __init__(self, url: str = 'local://', channel: str = 'socketio',
+                 write_only: bool = False, logger=None, json=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self.bus = (url, channel)
+        self._inbox: Optional[queue.Queue] = None
+        if not write_only:
+            self._inbox = queue.Queue()
+            with self._buses_lock:
+                self._buses.setdefault(self.bus, []).append(self._inbox)
+
+    def _publish(self, data):
+        message = self.json.dumps(data)
+        with self._buses_lock:
+            subscribers = list(self._buses.get(self.bus, ()))
+        for inbox in subscribers:
+            inbox.put(message)
+
+    def _listen(self):
+        while True:
+            message = self._inbox.get()
+            if message is None:
+                return
+            yield message
+
+    def close(self):
+        """Unsubscribes from the bus and stops the listener."""
+        if self._inbox is None:
+            return
+        with self._buses_lock:
+            subscribers = self._buses.get(self.bus, [])
+            if self._inbox in subscribers:
+                subscribers.remove(self._inbox)
+        self._inbox.put(None)
+
+
+def create_client_manager(url: Optional[str], channel: str):
+    """
+    Returns the Socket.IO client manager for a message queue URL, picked by
+    scheme like Flask-SocketIO does (redis://, kafka://, zmq+tcp://, any
+    other Kombu URL such as amqp://, plus local:// for LocalPubSubManager).
+    Returns None when there is no URL, so clients are only known to this
+    process.
+    """
+    if not url:
+        return None
+    if url.startswith('local://'):
+        return LocalPubSubManager(url, channel=channel)
+    if url.startswith(('redis://', 'rediss://')):
+        return socketio.RedisManager(url, channel=channel)
+    if url.startswith('kafka://'):
+        return socketio.KafkaManager(url, channel=channel)
+    if url.startswith('zmq'):
+        return socketio.ZmqManager(url, channel=channel)
+    return socketio.KombuManager(url, channel=channel)
@@ -0,0 +1,990 @@
+import asyncio
+import os
+import unittest
+import json
+import tempfile
+import threading
+import time
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from backend import create_app, agent_service, db
+from backend.app import socketio
+from backend.log_buffer import MissionLogBuffer
+from backend.mission import Mission, MissionStatus
+from backend.mission_scheduler import MissionScheduler
+
+
+class FakeLLM:
+    """Stands in for ChatOllama; `respond` maps a prompt to response text."""
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.prompts = []
+        self.formats = []
+
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        return AIMessage(content=self.respond(prompt))
+
+    def stream(self, prompt):
+        self.prompts.append(prompt)
+        text = self.respond(prompt)
+        for i in range(0, len(text), 4):
+            yield AIMessageChunk(content=text[i:i + 4])
+
+    async def astream(self, prompt, **kwargs):
+        self.formats.append(kwargs.get('format'))
+        for chunk in self.stream(prompt):
+            await asyncio.sleep(0)
+            yield chunk
+
+
+class SlowPlannerLLM(FakeLLM):
+    """Streams the planner's response slowly; other prompts are answered at once."""
+    delay = 0.02
+
+    def stream(self, prompt):
+        for chunk in super().stream(prompt):
+            if 'Strategic Planner' in prompt:
+                time.sleep(self.delay)
+            yield chunk
+
+    async def astream(self, prompt, **kwargs):
+        self.formats.append(kwargs.get('format'))
+        for chunk in FakeLLM.stream(self, prompt):
+            await asyncio.sleep(self.delay if 'Strategic Planner' in prompt else 0)
+            yield chunk
+
+
+class FakeSocketIO:
+    """Records emitted events instead of sending them."""
+
+    def __init__(self):
+        self.events = []
+
+    def emit(self, event, data=None, **kwargs):
+        self.events.append((event, data, kwargs))
+
+
+def fake_planner(steps):
+    """Returns a responder that clarifies the goal and answers with `steps`."""
+    def respond(prompt):
+        if 'Goal Clarifier' in prompt:
+            return json.dumps({'clarified_goal': 'A clarified goal'})
+        return json.dumps({'steps': steps})
+    return respond
+
+
+class AgentServiceTestCase(unittest.TestCase):
+    """Test suite for the mission pipeline, run against a fake LLM."""
+
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.app = create_app({
+            'TESTING': True,
+            'DATABASE': self.db_path,
+            'LLM_CACHE_PATH': os.path.join(self.cache_dir.name, 'llm_cache.sqlite'),
+        })
+        with self.app.app_context():
+            db.init_db()
+
+        self._saved = (agent_service.llm, agent_service.report_llm, agent_service.async_llm,
+                       dict(agent_service.CONFIG), dict(agent_service.LLM_STATUS))
+        agent_service.report_llm = FakeLLM(lambda prompt: '# Report')
+        agent_service.CONFIG['step_delay'] = 0.2
+        self.socketio = FakeSocketIO()
+
+    def tearDown(self):
+        agent_service.llm, agent_service.report_llm, agent_service.async_llm, config, status = self._saved
+        agent_service.CONFIG.clear()
+        agent_service.CONFIG.update(config)
+        agent_service.LLM_STATUS.update(status)
+        db.pool.close_idle()
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+        self.cache_dir.cleanup()
+
+    def run_mission(self, steps, goal="Test goal", use_cache=None, reuse_plans=None):
+        if not isinstance(agent_service.llm, FakeLLM):
+            agent_service.llm = FakeLLM(fake_planner(steps))
+        service = agent_service.AgentService(goal, self.socketio, self.app, use_cache=use_cache,
+                                             reuse_plans=reuse_plans)
+        with self.app.app_context():
+            db.create_mission(service.mission)
+        service.run()
+        return service
+
+    def logs(self):
+        messages = []
+        for event, data, _ in self.socketio.events:
+            if event == 'log':
+                messages.append(data['message'])
+            elif event == 'log_batch':
+                messages.extend(entry['message'] for entry in data['logs'])
+        return messages
+
+    def test_normalize_steps_keeps_only_backward_dependencies(self):
+        """Dependencies are 1-based in the plan and must point at earlier steps."""
+        steps, deps = agent_service._normalize_steps([
+            'first',
+            {'step': 'second', 'depends_on': [1]},
+            {'step': 'third', 'depends_on': [1, 2, 3, 7, 'x']},
+        ])
+        self.assertEqual(steps, ['first', 'second', 'third'])
+        self.assertEqual(deps, [[], [0], [0, 1]])
+
+    def test_independent_steps_run_concurrently(self):
+        """Four independent steps should take about one step of wall time."""
+        agent_service.CONFIG['max_parallel_steps'] = 4
+        start = time.monotonic()
+        service = self.run_mission(['a', 'b', 'c', 'd'])
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(service.mission.status.value, 'COMPLETED')
+        self.assertLess(elapsed, 4 * agent_service.CONFIG['step_delay'])
+
+    def test_worker_pool_is_bounded(self):
+        """With one worker the steps run back to back."""
+        agent_service.CONFIG['max_parallel_steps'] = 1
+        start = time.monotonic()
+        self.run_mission(['a', 'b', 'c'])
+        self.assertGreaterEqual(time.monotonic() - start, 3 * agent_service.CONFIG['step_delay'])
+
+    def test_dependencies_respected_and_results_in_plan_order(self):
+        """A dependent step starts only after its prerequisites complete."""
+        self.run_mission([
+            'a',
+            'b',
+            {'step': 'c', 'depends_on': [1, 2]},
+            'd',
+        ])
+        logs = self.logs()
+        started_c = logs.index("⚙️ Executing step 3/4: c")
+        self.assertGreater(started_c, logs.index("✔️ Step 1 result: Completed step: 'a'"))
+        self.assertGreater(started_c, logs.index("✔️ Step 2 result: Completed step: 'b'"))
+
+        report_prompt = agent_service.report_llm.prompts[-1]
+        # The execution log is sent as compact JSON.
+        positions = [report_prompt.index(f'"step":"{s}"') for s in 'abcd']
+        self.assertEqual(positions, sorted(positions))
+
+        with self.app.app_context():
+            row = db.get_all_missions()[0]
+        self.assertEqual(json.loads(row['plan']), ['a', 'b', 'c', 'd'])
+        self.assertEqual(row['clarified_goal'], 'A clarified goal')
+
+    def test_repeated_goal_is_served_from_cache(self):
+        """Clarify and plan responses are reused by a later mission."""
+        agent_service.CONFIG['step_delay'] = 0
+        self.app.config['PLAN_LIBRARY_ENABLED'] = False  # Otherwise the plan itself is reused
+        self.run_mission(['a'])
+        self.run_mission(['a'])
+        self.assertEqual(len(agent_service.llm.prompts), 2)  # Clarify and plan; step 'a' needs no tools
+
+        response = self.app.test_client().get('/api/llm-cache')
+        stats = json.loads(response.data)
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (2, 2, 2))
+
+    def test_tool_selection_is_not_cached(self):
+        """A repeated step asks the model for its tools again."""
+        agent_service.CONFIG['step_delay'] = 0
+        self.app.config['PLAN_LIBRARY_ENABLED'] = False
+        self.run_mission(['Research solar prices'])
+        self.run_mission(['Research solar prices'])
+        selections = [p for p in agent_service.llm.prompts if 'Task Executor' in p]
+        self.assertEqual(len(selections), 2)
+        stats = self.app.test_client().get('/api/llm-cache').get_json()
+        self.assertEqual((stats['hits'], stats['entries']), (2, 2))
+
+    def test_cache_opt_out_always_calls_model(self):
+        """A mission created with use_cache=False bypasses the cache."""
+        agent_service.CONFIG['step_delay'] = 0
+        self.app.config['PLAN_LIBRARY_ENABLED'] = False  # Otherwise the plan itself is reused
+        self.run_mission(['a'])
+        self.run_mission(['a'], use_cache=False)
+        self.assertEqual(len(agent_service.llm.prompts), 4)
+
+    def test_report_is_streamed_in_chunks(self):
+        """The report arrives as several report_chunk events and is persisted whole."""
+        report = '# Report\n\n' + 'Findings. ' * 40
+        agent_service.report_llm = FakeLLM(lambda prompt: report)
+        agent_service.CONFIG['step_delay'] = 0
+        agent_service.CONFIG['report_chunk_chars'] = 50
+        self.run_mission(['a'])
+
+        chunks = [data['chunk'] for event, data, _ in self.socketio.events if event == 'report_chunk']
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(''.join(chunks), report)
+        finals = [data['report'] for event, data, _ in self.socketio.events if event == 'final_report']
+        self.assertEqual(finals, [report])
+        with self.app.app_context():
+            self.assertEqual(db.get_all_missions()[0]['report'], report)
+
+    def test_warm_up_reports_readiness_in_health_check(self):
+        """/api/health reflects the outcome of the background warm-up."""
+        client = self.app.test_client()
+        agent_service.llm = FakeLLM(lambda prompt: 'test')
+        agent_service.warm_up()
+        self.assertEqual(json.loads(client.get('/api/health').data)['llm']['state'], 'ready')
+
+        def unreachable(prompt):
+            raise ConnectionError('connection refused')
+        agent_service.llm = FakeLLM(unreachable)
+        agent_service.warm_up()
+        health = json.loads(client.get('/api/health').data)['llm']
+        self.assertEqual(health['state'], 'unavailable')
+        self.assertIn('connection refused', health['error'])
+
+    def test_events_are_scoped_to_the_mission_room(self):
+        """Mission events go to the mission's room; only status changes are global."""
+        agent_service.CONFIG['step_delay'] = 0
+        service = self.run_mission(['a', 'b'])
+        mission_id = service.mission.id
+
+        for event, data, kwargs in self.socketio.events:
+            self.assertEqual(data['mission_id'], mission_id)
+            if event == 'mission_status':
+                self.assertNotIn('to', kwargs)
+            else:
+                self.assertEqual(kwargs.get('to'), mission_id)
+
+        summary = [data['status'] for event, data, _ in self.socketio.events if event == 'mission_status']
+        self.assertEqual(summary, ['CLARIFYING', 'PLANNING', 'EXECUTING', 'REPORTING', 'COMPLETED'])
+
+    def test_only_joined_clients_receive_mission_events(self):
+        """Clients receive a mission's events after join_mission and not before."""
+        watcher = socketio.test_client(self.app)
+        bystander = socketio.test_client(self.app)
+        self.assertEqual(watcher.emit('join_mission', {'mission_id': 'm-1'}, callback=True), {'ok': True})
+
+        socketio.emit('log', {'message': 'hello', 'mission_id': 'm-1'}, to='m-1')
+        self.assertEqual([e['name'] for e in watcher.get_received()], ['log'])
+        self.assertEqual(bystander.get_received(), [])
+
+        watcher.emit('leave_mission', {'mission_id': 'm-1'})
+        socketio.emit('log', {'message': 'again', 'mission_id': 'm-1'}, to='m-1')
+        self.assertEqual(watcher.get_received(), [])
+
+    def test_logs_are_batched_and_flushed_before_status_changes(self):
+        """Log lines arrive in log_batch events, never after a later status update."""
+        agent_service.CONFIG['step_delay'] = 0
+        agent_service.CONFIG['log_flush_interval'] = 10
+        self.run_mission(['a', 'b', 'c', 'd', 'e', 'f'])
+
+        events = [event for event, _, _ in self.socketio.events]
+        self.assertNotIn('log', events)
+        self.assertLess(events.count('log_batch'), len(self.logs()))
+        self.assertEqual(self.logs()[-1], "✅ Mission finished.")
+
+        # Everything logged before a node started is delivered before its status_update.
+        position = {}
+        for index, (event, data, _) in enumerate(self.socketio.events):
+            if event == 'log_batch':
+                for entry in data['logs']:
+                    position[entry['message']] = index
+            elif event == 'status_update' and data['status'] == 'PLANNING':
+                planning = index
+        self.assertLess(position['🎯 Goal clarified: "A clarified goal"'], planning)
+
+    def test_log_buffer_flushes_on_size_and_interval(self):
+        """A batch is sent when it is full or when the interval elapses."""
+        batches = []
+        buffer = MissionLogBuffer(batches.append, flush_interval=0.05, max_batch=3)
+        for i in range(4):
+            buffer.add({'message': str(i)})
+        self.assertEqual(batches, [[{'message': '0'}, {'message': '1'}, {'message': '2'}]])
+        time.sleep(0.2)
+        self.assertEqual(batches[-1], [{'message': '3'}])
+
+    def test_events_are_persisted_and_paginated(self):
+        """Every log line is stored and can be paged through with a cursor."""
+        agent_service.CONFIG['step_delay'] = 0
+        service = self.run_mission(['a', 'b', 'c'])
+        client = self.app.test_client()
+
+        seen = []
+        after = 0
+        while True:
+            page = json.loads(client.get(f'/api/missions/{service.mission.id}/events?after={after}&limit=4').data)
+            seen.extend(page['events'])
+            after = page['next_after']
+            if not page['has_more']:
+                break
+        self.assertEqual([e['message'] for e in seen], self.logs())
+        self.assertEqual([e['seq'] for e in seen], list(range(1, len(seen) + 1)))
+        plan_event = next(e for e in seen if 'plan' in e['data'])
+        self.assertEqual(plan_event['data']['plan'], ['a', 'b', 'c'])
+        self.assertEqual(plan_event['node'], 'create_plan')
+
+    def test_rejoining_replays_only_missed_events(self):
+        """join_mission with `after` replays persisted events past that sequence number."""
+        agent_service.CONFIG['step_delay'] = 0
+        service = self.run_mission(['a'])
+        total = len(self.logs())
+
+        client = socketio.test_client(self.app)
+        client.emit('join_mission', {'mission_id': service.mission.id, 'after': 3}, callback=True)
+        replayed = [entry['seq'] for event in client.get_received() if event['name'] == 'log_batch'
+                    for entry in event['args'][0]['logs']]
+        self.assertEqual(replayed, list(range(4, total + 1)))
+
+    def test_starting_socket_is_subscribed_before_the_mission_runs(self):
+        """The socket named in the POST gets the mission's events without joining; the ack reports the status."""
+        client = socketio.test_client(self.app)
+        sid = socketio.server.manager.sid_from_eio_sid(client.eio_sid, '/')
+        response = self.app.test_client().post('/api/missions', json={'goal': 'Test goal', 'socket_id': sid})
+        mission_id = json.loads(response.data)['id']
+
+        socketio.emit('status_update', {'mission_id': mission_id, 'status': 'CLARIFYING'}, to=mission_id)
+        self.assertEqual([e['name'] for e in client.get_received()], ['status_update'])
+
+        with self.app.app_context():
+            db.update_mission_fields(mission_id, {'status': MissionStatus.EXECUTING})
+        ack = client.emit('join_mission', {'mission_id': mission_id}, callback=True)
+        self.assertEqual(ack, {'ok': True, 'status': 'EXECUTING', 'node': 'execute_step'})
+
+    def test_join_with_invalid_after_is_rejected(self):
+        """A non-numeric `after` gets an error ack instead of raising."""
+        client = socketio.test_client(self.app)
+        ack = client.emit('join_mission', {'mission_id': 'm-1', 'after': 'abc'}, callback=True)
+        self.assertEqual(ack, {'ok': False, 'error': 'after must be an integer'})
+
+    def test_mission_writes_are_coalesced_and_final_state_is_durable(self):
+        """Node updates are written behind in one go; the terminal status is flushed."""
+        agent_service.CONFIG['step_delay'] = 0
+        agent_service.CONFIG['persist_delay'] = 10
+        service = self.run_mission(['a', 'b'])
+
+        self.assertEqual(service.persister.writes, 1)
+        with self.app.app_context():
+            row = db.get_all_missions()[0]
+        self.assertEqual(row['status'], 'COMPLETED')
+        self.assertEqual(json.loads(row['plan']), ['a', 'b'])
+        self.assertEqual(row['report'], '# Report')
+
+    def test_only_changed_columns_are_written(self):
+        """take_dirty reports just the fields assigned since the last write."""
+        mission = agent_service.Mission(goal='Goal')
+        with self.app.app_context():
+            db.create_mission(mission)
+            self.assertEqual(mission.take_dirty(), {})
+
+            mission.report = 'Draft'
+            self.assertEqual(list(mission.take_dirty()), ['report'])
+            db.get_db().execute("UPDATE missions SET goal = 'changed elsewhere' WHERE id = ?", (mission.id,))
+            db.update_mission_fields(mission.id, {'report': 'Draft'})
+            row = db.get_all_missions()[0]
+        self.assertEqual((row['goal'], row['report']), ('changed elsewhere', 'Draft'))
+
+    def test_connections_are_pooled_with_wal(self):
+        """Requests reuse pooled connections, which are configured for WAL."""
+        client = self.app.test_client()
+        before = db.get_pool_stats()
+        for _ in range(5):
+            client.get('/api/ideas')
+        after = db.get_pool_stats()
+        self.assertLessEqual(after['opened'] - before['opened'], 1)
+        self.assertGreaterEqual(after['reused'] - before['reused'], 4)
+        self.assertEqual(after['in_use'], 0)
+
+        with self.app.app_context():
+            conn = db.get_db()
+            self.assertEqual(conn.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+            self.assertEqual(conn.execute('PRAGMA busy_timeout').fetchone()[0], 5000)
+
+    def test_near_identical_goal_reuses_plan_without_planner(self):
+        """A completed mission's plan is reused for the same goal; the planner is skipped."""
+        agent_service.CONFIG['step_delay'] = 0
+        first = self.run_mission(['a', 'b'])
+        agent_service.llm.prompts.clear()
+        self.run_mission(['other'], reuse_plans=False)
+        self.assertFalse(any('Reusing the plan' in m for m in self.logs()))
+
+        # Opting out of the response cache does not turn off plan reuse.
+        agent_service.llm.prompts.clear()
+        third = self.run_mission(['other'], use_cache=False)
+        self.assertEqual(len(agent_service.llm.prompts), 1)  # Clarify only
+        self.assertEqual(third.mission.plan, first.mission.plan)
+        self.assertEqual(third.mission.status.value, 'COMPLETED')
+        self.assertEqual(sum('Reusing the plan' in m for m in self.logs()), 1)
+
+        stats = json.loads(self.app.test_client().get('/api/plan-library').data)
+        self.assertEqual((stats['entries'], stats['lookups'], stats['reused']), (1, 3, 1))
+        self.assertAlmostEqual(stats['hit_rate'], 1 / 3, places=3)
+
+    def test_similar_goals_are_given_to_planner_as_examples(self):
+        """Below the reuse threshold, similar plans are included in the planner prompt."""
+        agent_service.CONFIG['step_delay'] = 0
+
+        def respond(prompt):
+            if 'Goal Clarifier' in prompt:
+                goal = prompt.rsplit('Goal: ', 1)[1]
+                return json.dumps({'clarified_goal': goal})
+            return json.dumps({'steps': ['Book venue', 'Send invites']})
+        agent_service.llm = FakeLLM(respond)
+
+        self.run_mission([], goal="Plan a team offsite in Lisbon for 20 people")
+        self.run_mission([], goal="Bake sourdough bread")
+        self.run_mission([], goal="Plan a team offsite in Porto for 30 people")
+
+        plan_prompts = [p for p in agent_service.llm.prompts if 'Strategic Planner' in p]
+        self.assertEqual(len(plan_prompts), 3)
+        self.assertNotIn('Example goal', plan_prompts[1])
+        self.assertIn('Example goal: Plan a team offsite in Lisbon', plan_prompts[2])
+        self.assertNotIn('Bake sourdough bread', plan_prompts[2])
+
+    def test_plan_library_loads_completed_missions(self):
+        """Plans of missions completed in earlier runs are indexed on first use."""
+        from backend import plan_library
+        with self.app.app_context():
+            for goal, status in (("Plan a trip to Japan", MissionStatus.COMPLETED),
+                                 ("Plan a trip to Peru", MissionStatus.FAILED)):
+                mission = Mission(goal=goal)
+                db.create_mission(mission)
+                mission.plan = ['Book flights']
+                mission.status = status
+                db.update_mission_fields(mission.id, mission.take_dirty())
+        library = plan_library.get_library(self.app)
+        self.assertEqual([e['goal'] for e in library.entries], ["Plan a trip to Japan"])
+        self.assertGreater(library.search("Plan a trip to Japan")[0]['similarity'], 0.99)
+
+    def test_interrupted_mission_resumes_from_last_checkpoint(self):
+        """After a crash, finished nodes are skipped and only the rest is run."""
+        class Crash(BaseException):
+            """Simulates the process dying; not caught by the mission's error handling."""
+
+        def crash(prompt):
+            raise Crash()
+
+        agent_service.CONFIG['step_delay'] = 0
+        agent_service.llm = FakeLLM(fake_planner(['a', 'b']))
+        agent_service.report_llm = FakeLLM(crash)
+        service = agent_service.AgentService("Test goal", self.socketio, self.app)
+        with self.app.app_context():
+            db.create_mission(service.mission)
+        with self.assertRaises(Crash):
+            service.run()
+
+        with self.app.app_context():
+            rows = db.get_interrupted_missions()
+            self.assertEqual([r['id'] for r in rows], [service.mission.id])
+            self.assertEqual(rows[0]['status'], 'REPORTING')
+            self.assertEqual(db.get_checkpoint(service.mission.id)['completed_nodes'],
+                             ['clarify_goal', 'create_plan', 'execute_step'])
+            resumed = agent_service.AgentService.resume(rows[0], self.socketio, self.app)
+
+        agent_service.llm.prompts.clear()
+        agent_service.report_llm = FakeLLM(lambda prompt: '# Report')
+        resumed.run()
+
+        self.assertEqual(agent_service.llm.prompts, [])  # No clarify or plan calls
+        self.assertEqual(len(agent_service.report_llm.prompts), 1)
+        self.assertIn('Completed step', agent_service.report_llm.prompts[0])
+        with self.app.app_context():
+            row = db.get_mission(service.mission.id)
+            self.assertEqual((row['status'], row['report'], json.loads(row['plan'])),
+                             ('COMPLETED', '# Report', ['a', 'b']))
+            self.assertIsNone(db.get_checkpoint(service.mission.id))
+            self.assertEqual(db.get_interrupted_missions(), [])
+            events = db.get_mission_events(service.mission.id, limit=1000)
+        self.assertEqual([e['seq'] for e in events], list(range(1, len(events) + 1)))
+        self.assertTrue(any('resumed after' in e['message'] for e in events))
+
+    def test_mission_without_checkpoint_resumes_from_start(self):
+        """A mission interrupted before its first node completed runs in full."""
+        agent_service.CONFIG['step_delay'] = 0
+        agent_service.llm = FakeLLM(fake_planner(['a']))
+        with self.app.app_context():
+            mission = Mission(goal="Test goal")
+            db.create_mission(mission)
+            resumed = agent_service.AgentService.resume(db.get_mission(mission.id), self.socketio, self.app)
+        resumed.run()
+        self.assertEqual(len(agent_service.llm.prompts), 2)
+        with self.app.app_context():
+            self.assertEqual(db.get_mission(mission.id)['status'], 'COMPLETED')
+
+    def start_mission_thread(self, steps):
+        agent_service.llm = FakeLLM(fake_planner(steps))
+        service = agent_service.AgentService("Test goal", self.socketio, self.app)
+        with self.app.app_context():
+            db.create_mission(service.mission)
+        thread = threading.Thread(target=service.run)
+        thread.start()
+        return service, thread
+
+    def wait_for_status(self, service, status, timeout=2.0):
+        deadline = time.monotonic() + timeout
+        while service.mission.status != status and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(service.mission.status, status)
+
+    def test_cancel_stops_running_mission(self):
+        """A cancelled mission stops executing promptly and is marked CANCELLED."""
+        agent_service.CONFIG['step_delay'] = 5
+        service, thread = self.start_mission_thread(['a', 'b'])
+        self.wait_for_status(service, MissionStatus.EXECUTING)
+
+        started = time.monotonic()
+        service.cancel()
+        thread.join(2)
+        self.assertFalse(thread.is_alive())
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(agent_service.report_llm.prompts, [])
+        with self.app.app_context():
+            self.assertEqual(db.get_mission(service.mission.id)['status'], 'CANCELLED')
+            self.assertIsNone(db.get_checkpoint(service.mission.id))
+        self.assertIn('🛑 Mission cancelled.', self.logs())
+
+    def test_cancel_aborts_streaming_llm_request(self):
+        """Cancelling during the report closes the model's response stream."""
+        agent_service.CONFIG['step_delay'] = 0
+        closed = threading.Event()
+
+        streaming = threading.Event()
+
+        class SlowReportLLM(FakeLLM):
+            def stream(self, prompt):
+                self.prompts.append(prompt)
+                streaming.set()
+                try:
+                    while True:
+                        time.sleep(0.01)
+                        yield AIMessageChunk(content='word ')
+                finally:
+                    closed.set()
+
+        agent_service.report_llm = SlowReportLLM(None)
+        service, thread = self.start_mission_thread(['a'])
+        # Cancel only once the request is open, so there is a stream to close.
+        self.assertTrue(streaming.wait(2))
+        service.cancel()
+        thread.join(2)
+        # The reader closes the stream when its next chunk arrives.
+        self.assertTrue(closed.wait(1))
+        self.assertEqual(service.mission.status, MissionStatus.CANCELLED)
+
+    def test_cancel_before_first_chunk_does_not_wait_for_it(self):
+        """A mission cancelled while the model is still thinking stops at once; the stream is closed later."""
+        agent_service.CONFIG['step_delay'] = 0
+        streaming, first_token, closed = threading.Event(), threading.Event(), threading.Event()
+
+        class ThinkingReportLLM(FakeLLM):
+            def stream(self, prompt):
+                streaming.set()
+                try:
+                    first_token.wait(10)
+                    yield AIMessageChunk(content='word ')
+                    yield AIMessageChunk(content='more ')
+                finally:
+                    closed.set()
+
+        agent_service.report_llm = ThinkingReportLLM(None)
+        service, thread = self.start_mission_thread(['a'])
+        self.assertTrue(streaming.wait(2))
+        started = time.monotonic()
+        service.cancel()
+        thread.join(2)
+        self.assertFalse(thread.is_alive())
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(service.mission.status, MissionStatus.CANCELLED)
+
+        first_token.set()
+        self.assertTrue(closed.wait(2))
+
+    def test_node_deadline_fails_mission(self):
+        """A node that runs past its deadline fails the mission."""
+        agent_service.CONFIG['step_delay'] = 5
+        agent_service.CONFIG['node_timeouts'] = dict(agent_service.CONFIG['node_timeouts'],
+                                                     execute_step=0.2)
+        started = time.monotonic()
+        service = self.run_mission(['a'])
+        self.assertLess(time.monotonic() - started, 1.5)
+        self.assertEqual(service.mission.status, MissionStatus.FAILED)
+        self.assertTrue(any("'execute_step' exceeded its 0.2s deadline" in m for m in self.logs()))
+
+    def test_mission_deadline_fails_mission(self):
+        agent_service.CONFIG['step_delay'] = 5
+        agent_service.CONFIG['mission_timeout'] = 0.2
+        service = self.run_mission(['a'])
+        self.assertEqual(service.mission.status, MissionStatus.FAILED)
+        self.assertTrue(any('Mission exceeded its 0.2s deadline' in m for m in self.logs()))
+
+    def test_tool_selection_is_skipped_for_steps_no_tool_fits(self):
+        """Only steps matching a tool's hints cost a tool-selection call."""
+        agent_service.CONFIG['step_delay'] = 0
+        self.app.config['PLAN_LIBRARY_ENABLED'] = False
+
+        def selections(steps):
+            agent_service.llm = FakeLLM(fake_planner(steps))
+            self.run_mission(steps, use_cache=False)
+            return [p for p in agent_service.llm.prompts if 'Task Executor' in p]
+
+        selected = selections(['Write the welcome email', 'Research local competitors'])
+        self.assertEqual(len(selected), 1)
+        self.assertIn('Step: Research local competitors', selected[0])
+
+        agent_service.CONFIG['tool_hints'] = False
+        self.assertEqual(len(selections(['Write the welcome email'])), 1)
+
+        agent_service.CONFIG['max_tool_calls_per_step'] = 0
+        self.assertEqual(selections(['Research local competitors']), [])
+
+    def test_tool_calls_chosen_by_model_run_concurrently(self):
+        """Tool calls requested for a step are executed, deduplicated and reported."""
+        agent_service.CONFIG['step_delay'] = 0
+        agent_service.search_backend.latency = 0.2
+        agent_service.search_backend.queries = []
+        agent_service._tool_engine = None  # Fresh counters and cache for this test
+        self.addCleanup(setattr, agent_service, '_tool_engine', None)
+        self.addCleanup(setattr, agent_service.search_backend, 'latency', agent_service.CONFIG['search_latency'])
+
+        def respond(prompt):
+            if 'Task Executor' in prompt:
+                return json.dumps({'tool_calls': [
+                    {'tool': 'web_search', 'args': {'query': 'solar prices'}},
+                    {'tool': 'web_search', 'args': {'query': 'solar installers'}},
+                    {'tool': 'web_search', 'args': {'query': 'solar prices'}},
+                    {'tool': 'rm_rf', 'args': {}},
+                ]})
+            return fake_planner(['Research solar prices', 'Find solar installers'])(prompt)
+        agent_service.llm = FakeLLM(respond)
+
+        started = time.monotonic()
+        service = self.run_mission([])
+        elapsed = time.monotonic() - started
+
+        self.assertEqual(service.mission.status, MissionStatus.COMPLETED)
+        # Both steps ask for the same searches: each distinct query runs once.
+        self.assertEqual(sorted(agent_service.search_backend.queries), ['solar installers', 'solar prices'])
+        self.assertLess(elapsed, 0.6)
+        self.assertIn('Search results for', agent_service.report_llm.prompts[0])
+
+        stats = json.loads(self.app.test_client().get('/api/tools').data)['web_search']
+        self.assertEqual((stats['calls'], stats['executions']), (6, 2))
+        self.assertEqual(stats['cache_hits'] + stats['coalesced'], 4)
+
+    def test_large_execution_log_is_summarized_in_parts(self):
+        """Logs over the token budget are summarized concurrently, then merged."""
+        agent_service.CONFIG.update(step_delay=0, report_token_budget=300, report_max_parallel=8)
+        lock = threading.Lock()
+        summary_prompts = []
+
+        def report(prompt):
+            if 'preparing material for a report' in prompt:
+                with lock:
+                    summary_prompts.append(prompt)
+                time.sleep(0.2)
+                return f"Notes {len(summary_prompts)}"
+            return '# Report'
+        agent_service.report_llm = FakeLLM(report)
+        steps = [f"Investigate topic number {i} in depth and record the findings" for i in range(12)]
+
+        started = time.monotonic()
+        with self.assertLogs('ai_planner.missions', level='INFO') as logged:
+            service = self.run_mission(steps)
+        elapsed = time.monotonic() - started
+
+        self.assertEqual(service.mission.status, MissionStatus.COMPLETED)
+        self.assertGreater(len(summary_prompts), 1)
+        for prompt in summary_prompts:
+            self.assertLessEqual(agent_service.estimate_tokens(prompt), 300)
+        # Every step's entry went into exactly one summary.
+        for step in steps:
+            self.assertEqual(sum(step in p for p in summary_prompts), 1)
+        # The partial summaries run at the same time.
+        self.assertLess(elapsed, 0.2 * len(summary_prompts))
+        final_prompt = agent_service.report_llm.prompts[-1]
+        self.assertIn('Execution Log Summaries:', final_prompt)
+        self.assertNotIn(steps[0], final_prompt)
+        self.assertEqual(service.mission.report, '# Report')
+        self.assertTrue(any(m.startswith('🧩 Report input is') for m in self.logs()))
+        # Each LLM call's prompt size is logged.
+        calls = [line for line in logged.output if 'prompt tokens estimated' in line]
+        self.assertEqual(len(calls), len(agent_service.llm.prompts) + len(agent_service.report_llm.prompts))
+        # Only the clarify and plan responses were cached, not the tool
+        # selections or the summaries.
+        stats = self.app.test_client().get('/api/llm-cache').get_json()
+        self.assertEqual(stats['entries'], 2)
+
+    def test_small_execution_log_uses_a_single_report_call(self):
+        service = self.run_mission(['a', 'b'])
+        self.assertEqual(len(agent_service.report_llm.prompts), 1)
+        self.assertIn('Execution Log:\n[{"step":"a"', agent_service.report_llm.prompts[0])
+        self.assertEqual(service.mission.report, '# Report')
+
+    def status_nodes(self):
+        return [data['node'] for event, data, _ in self.socketio.events if event == 'status_update']
+
+    def test_fused_planning_clarifies_and_plans_in_one_call(self):
+        """One request yields both the clarified goal and the plan, and the UI
+        still sees the clarify_goal and create_plan stages."""
+        agent_service.CONFIG['step_delay'] = 0
+
+        def respond(prompt):
+            if 'Goal Clarifier and Strategic Planner' in prompt:
+                return json.dumps({'clarified_goal': 'A clarified goal',
+                                   'steps': ['a', {'step': 'b', 'depends_on': [1]}]})
+            return json.dumps({'tool_calls': []})
+        agent_service.llm = FakeLLM(respond)
+        service = agent_service.AgentService("Test goal", self.socketio, self.app, fused_planning=True)
+        with self.app.app_context():
+            db.create_mission(service.mission)
+        service.run()
+
+        self.assertEqual(service.mission.status, MissionStatus.COMPLETED)
+        self.assertEqual(service.mission.clarified_goal, 'A clarified goal')
+        self.assertEqual(service.mission.plan, ['a', 'b'])
+        # One planning call; neither step needs tools
+        self.assertEqual(len(agent_service.llm.prompts), 1)
+        nodes = self.status_nodes()
+        self.assertLess(nodes.index('clarify_goal'), nodes.index('create_plan'))
+        self.assertLess(nodes.index('create_plan'), nodes.index('execute_step'))
+
+    def test_fused_planning_falls_back_to_separate_plan_call(self):
+        """A fused response without steps is followed by an ordinary planning call."""
+        agent_service.CONFIG['step_delay'] = 0
+        agent_service.llm = FakeLLM(fake_planner(['a']))  # Answers the fused prompt with a goal only
+        service = agent_service.AgentService("Test goal", self.socketio, self.app, fused_planning=True)
+        with self.app.app_context():
+            db.create_mission(service.mission)
+        service.run()
+
+        self.assertEqual(service.mission.status, MissionStatus.COMPLETED)
+        self.assertEqual(service.mission.clarified_goal, 'A clarified goal')
+        self.assertEqual(service.mission.plan, ['a'])
+        self.assertEqual(len(agent_service.llm.prompts), 2)
+        self.assertIn('Strategic Planner', agent_service.llm.prompts[1])
+
+    def test_fused_planning_follows_app_config(self):
+        self.app.config['FUSED_PLANNING'] = True
+        service = agent_service.AgentService("Test goal", self.socketio, self.app)
+        self.assertTrue(service.fused_planning)
+        self.assertFalse(agent_service.AgentService("Test goal", self.socketio, self.app,
+                                                    fused_planning=False).fused_planning)
+
+    def test_steps_start_while_plan_is_streaming(self):
+        """Step 1 runs while the planner is still generating the later steps."""
+        agent_service.CONFIG['step_delay'] = 0
+        agent_service.llm = SlowPlannerLLM(fake_planner([{'step': s, 'depends_on': []} for s in 'abcd']))
+        service = self.run_mission(None)
+
+        self.assertEqual(service.mission.status, MissionStatus.COMPLETED)
+        self.assertEqual(service.mission.plan, ['a', 'b', 'c', 'd'])
+        logs = self.logs()
+        self.assertLess(logs.index("✔️ Step 1 result: Completed step: 'a'"), logs.index("📝 Step 4 planned: d"))
+        self.assertLess(logs.index("📝 Step 4 planned: d"), logs.index("📋 Plan created (4 steps):"))
+        self.assertEqual(list(dict.fromkeys(self.status_nodes())),
+                         ['clarify_goal', 'create_plan', 'execute_step', 'synthesize_report'])
+        # Each step ran once, including those started before the plan was complete.
+        self.assertEqual(sum(log.startswith('⚙️ Executing step') for log in logs), 4)
+
+    def test_fused_streamed_steps_know_the_clarified_goal(self):
+        """Steps started before the fused response is complete are given the
+        clarified goal it began with, not an empty one."""
+        agent_service.CONFIG['step_delay'] = 0
+
+        def respond(prompt):
+            if 'Goal Clarifier and Strategic Planner' in prompt:
+                return json.dumps({'clarified_goal': 'Open a bakery in Lyon',
+                                   'steps': ['Research bakery rents', 'Research flour suppliers',
+                                             'Research local competitors']})
+            return json.dumps({'tool_calls': []})
+        agent_service.llm = SlowPlannerLLM(respond)
+        service = agent_service.AgentService("bakery", self.socketio, self.app, fused_planning=True)
+        with self.app.app_context():
+            db.create_mission(service.mission)
+        service.run()
+
+        self.assertEqual(service.mission.status, MissionStatus.COMPLETED)
+        logs = self.logs()
+        # The first step started while the plan was still streaming.
+        self.assertLess(logs.index("⚙️ Executing step 1: Research bakery rents"),
+                        logs.index("📝 Step 3 planned: Research local competitors"))
+        selections = [p for p in agent_service.llm.prompts if 'Task Executor' in p]
+        self.assertEqual(len(selections), 3)
+        for prompt in selections:
+            self.assertIn("Goal: Open a bakery in Lyon\nStep: ", prompt)
+
+    def test_malformed_streamed_plan_is_normalized_at_the_end(self):
+        """Work started on streamed steps is dropped if the full response does
+        not parse, and the usual fallback plan runs instead."""
+        agent_service.CONFIG['step_delay'] = 0
+        truncated = '{"steps": [{"step": "a", "depends_on": []}, {"step": "b"'
+
+        def respond(prompt):
+            if 'Goal Clarifier' in prompt:
+                return json.dumps({'clarified_goal': 'A clarified goal'})
+            if 'Strategic Planner' in prompt:
+                return truncated
+            return json.dumps({'tool_calls': []})
+        agent_service.llm = SlowPlannerLLM(respond)
+        service = self.run_mission(None)
+
+        self.assertEqual(service.mission.status, MissionStatus.COMPLETED)
+        self.assertEqual(service.mission.plan, [truncated])
+        logs = self.logs()
+        self.assertIn("📝 Step 1 planned: a", logs)
+        self.assertIn("⚠️ The final plan differs from the streamed steps; discarding work from step 1 on.",
+                      logs)
+        self.assertIn(f"⚙️ Executing step 1/1: {truncated}", logs)
+        self.assertIn(f'"step":{json.dumps(truncated)}', agent_service.report_llm.prompts[0])
+
+    def test_discarded_running_step_stops_and_frees_its_slot(self):
+        """A streamed step dropped from the final plan stops at once and logs no result."""
+        agent_service.CONFIG['step_delay'] = 2
+        agent_service.CONFIG['max_parallel_steps'] = 1
+        truncated = '{"steps": [{"step": "a", "depends_on": []}, {"step": "b"'
+
+        def respond(prompt):
+            if 'Goal Clarifier' in prompt:
+                return json.dumps({'clarified_goal': 'A clarified goal'})
+            if 'Strategic Planner' in prompt:
+                return truncated
+            return json.dumps({'tool_calls': []})
+        agent_service.llm = SlowPlannerLLM(respond)
+        started = time.monotonic()
+        service = self.run_mission(None)
+
+        self.assertEqual(service.mission.status, MissionStatus.COMPLETED)
+        # Step "a" would otherwise hold the only worker for its full delay.
+        self.assertLess(time.monotonic() - started, 2 * agent_service.CONFIG['step_delay'])
+        logs = self.logs()
+        self.assertIn("⚙️ Executing step 1: a", logs)
+        self.assertNotIn("✔️ Step 1 result: Completed step: 'a'", logs)
+
+    def test_async_steps_start_while_plan_is_streaming(self):
+        planner = fake_planner(['a', 'b', 'c'])
+        agent_service.async_llm = SlowPlannerLLM(
+            lambda prompt: '# Report' if 'Senior Analyst' in prompt else planner(prompt))
+        agent_service.CONFIG['step_delay'] = 0
+        service = agent_service.AgentService("Test goal", self.socketio, self.app, async_mode=True)
+        with self.app.app_context():
+            db.create_mission(service.mission)
+        service.run()
+
+        self.assertEqual(service.mission.status, MissionStatus.COMPLETED)
+        logs = self.logs()
+        self.assertLess(logs.index("✔️ Step 1 result: Completed step: 'a'"), logs.index("📝 Step 3 planned: c"))
+        self.assertEqual(sum(log.startswith('⚙️ Executing step') for log in logs), 3)
+
+    def async_planner(self, steps):
+        """Installs one fake model for every call made by async missions."""
+        planner = fake_planner(steps)
+        agent_service.async_llm = FakeLLM(
+            lambda prompt: '# Report' if 'Senior Analyst' in prompt else planner(prompt))
+        return agent_service.async_llm
+
+    def test_async_mode_runs_mission_on_event_loop(self):
+        """Async missions complete with the same events and run steps concurrently."""
+        model = self.async_planner(['a', 'b', 'c', 'd'])
+        service = agent_service.AgentService("Test goal", self.socketio, self.app, async_mode=True)
+        with self.app.app_context():
+            db.create_mission(service.mission)
+        started = time.monotonic()
+        service.run()
+
+        self.assertLess(time.monotonic() - started, 4 * agent_service.CONFIG['step_delay'])
+        self.assertEqual(service.mission.status, MissionStatus.COMPLETED)
+        self.assertEqual(service.mission.report, '# Report')
+        self.assertIn('final_report', [event for event, _, _ in self.socketio.events])
+        # JSON is requested per call; the report is plain text.
+        self.assertEqual(model.formats, ['json'] * 2 + [None])
+        with self.app.app_context():
+            self.assertEqual(db.get_mission(service.mission.id)['status'], 'COMPLETED')
+            self.assertIsNone(db.get_checkpoint(service.mission.id))
+
+    def test_async_mode_summarizes_large_execution_log(self):
+        agent_service.CONFIG.update(step_delay=0, report_token_budget=300)
+        model = self.async_planner([f"Investigate topic number {i} in depth" for i in range(12)])
+        service = agent_service.AgentService("Test goal", self.socketio, self.app, async_mode=True)
+        with self.app.app_context():
+            db.create_mission(service.mission)
+        service.run()
+
+        self.assertEqual(service.mission.status, MissionStatus.COMPLETED)
+        summaries = [p for p in model.prompts if 'preparing material for a report' in p]
+        self.assertGreater(len(summaries), 1)
+        self.assertIn('Execution Log Summaries:', model.prompts[-1])
+
+    def test_sync_and_async_modes_make_the_same_llm_calls(self):
+        """Both modes run the same nodes; only the way they wait differs."""
+        agent_service.CONFIG.update(step_delay=0, report_token_budget=300)
+        self.app.config['PLAN_LIBRARY_ENABLED'] = False
+        steps = [f"Investigate topic number {i} in depth" for i in range(12)]
+        prompts = {}
+        for async_mode in (False, True):
+            model = self.async_planner(steps)
+            agent_service.llm = agent_service.report_llm = model
+            service = agent_service.AgentService("Test goal", self.socketio, self.app, use_cache=False,
+                                                 async_mode=async_mode)
+            with self.app.app_context():
+                db.create_mission(service.mission)
+            service.run()
+            self.assertEqual(service.mission.status, MissionStatus.COMPLETED)
+            prompts[async_mode] = sorted(model.prompts)
+        self.assertTrue(any('preparing material for a report' in p for p in prompts[True]))
+        self.assertEqual(prompts[False], prompts[True])
+
+    def test_async_mode_follows_app_config(self):
+        self.app.config['MISSION_EXECUTION'] = 'async'
+        self.assertTrue(agent_service.AgentService("Test goal", self.socketio, self.app).async_mode)
+        self.app.config['MISSION_EXECUTION'] = 'sync'
+        self.assertFalse(agent_service.AgentService("Test goal", self.socketio, self.app).async_mode)
+
+    def test_async_cancel_aborts_streaming_llm_request(self):
+        """Cancelling an async mission closes its response stream."""
+        agent_service.CONFIG['step_delay'] = 0
+        closed = threading.Event()
+        streaming = threading.Event()
+        planner = fake_planner(['a'])
+
+        class SlowReportLLM(FakeLLM):
+            async def astream(self, prompt, **kwargs):
+                if 'Senior Analyst' not in prompt:
+                    async for chunk in super().astream(prompt, **kwargs):
+                        yield chunk
+                    return
+                streaming.set()
+                try:
+                    # The model is still thinking when the mission is cancelled.
+                    await asyncio.sleep(10)
+                    yield AIMessageChunk(content='word ')
+                finally:
+                    closed.set()
+
+        agent_service.async_llm = SlowReportLLM(planner)
+        service = agent_service.AgentService("Test goal", self.socketio, self.app, async_mode=True)
+        with self.app.app_context():
+            db.create_mission(service.mission)
+        thread = threading.Thread(target=service.run)
+        thread.start()
+        self.assertTrue(streaming.wait(2))
+        service.cancel()
+        thread.join(2)
+        self.assertFalse(thread.is_alive())
+        self.assertTrue(closed.is_set())
+        self.assertEqual(service.mission.status, MissionStatus.CANCELLED)
+
+    def test_scheduler_runs_async_missions_without_background_tasks(self):
+        """Async missions are spawned on the event loop, not one thread each."""
+        self.async_planner(['a'])
+        scheduler = MissionScheduler(self.socketio, max_concurrent=1, max_queue=5)
+        services = [agent_service.AgentService(f"Goal {i}", self.socketio, self.app, async_mode=True)
+                    for i in range(3)]
+        with self.app.app_context():
+            for service in services:
+                db.create_mission(service.mission)
+        for service in services:
+            scheduler.submit(service)
+        for service in services:
+            self.wait_for_status(service, MissionStatus.COMPLETED, timeout=5)
+        deadline = time.monotonic() + 1
+        while scheduler.stats()['running'] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(scheduler.stats()['running'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
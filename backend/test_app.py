@@ -3,8 +3,7 @@ import unittest
 import json
 import tempfile
 
-from ai_planner_app import create_app
-from ai_planner_app.db import get_db, init_db
+from backend import create_app, db
 
 class BackendTestCase(unittest.TestCase):
     """Test suite for the Flask backend application."""
@@ -12,21 +11,25 @@ class BackendTestCase(unittest.TestCase):
     def setUp(self):
         """Set up a test environment before each test."""
         self.db_fd, self.db_path = tempfile.mkstemp()
+        self.cache_dir = tempfile.TemporaryDirectory()
 
         self.app = create_app({
             'TESTING': True,
             'DATABASE': self.db_path,
+            'LLM_CACHE_PATH': os.path.join(self.cache_dir.name, 'llm_cache.sqlite'),
         })
 
         self.client = self.app.test_client()
 
         with self.app.app_context():
-            init_db()
+            db.init_db()
 
     def tearDown(self):
         """Clean up the test environment after each test."""
+        db.pool.close_idle()
         os.close(self.db_fd)
         os.unlink(self.db_path)
+        self.cache_dir.cleanup()
 
     def test_index_serves_html(self):
         """Test that the root URL serves the main HTML file."""
@@ -34,6 +37,14 @@ class BackendTestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn(b'AI Agent Command Center', response.data)
 
+    def test_api_docs_are_built_on_first_request(self):
+        """The API spec is built on the first request for it, after other requests."""
+        self.assertEqual(self.client.get('/api/health').status_code, 200)
+        self.assertEqual(self.client.get('/apidocs/').status_code, 200)
+        spec = json.loads(self.client.get('/apispec_1.json').data)
+        self.assertEqual(spec['info']['title'], 'AI Planner API')
+        self.assertIn('/api/health', spec['paths'])
+
     def test_get_ideas_empty(self):
         """Test that GET /api/ideas returns an empty list when the DB is empty."""
         response = self.client.get('/api/ideas')
@@ -43,7 +54,8 @@ class BackendTestCase(unittest.TestCase):
     def test_save_and_get_ideas(self):
         """Test saving a new idea and then retrieving it."""
         test_goal = "Create a test suite"
-        self.client.post('/api/execute', json={'goal': test_goal})
+        response = self.client.post('/api/ideas', json={'goal': test_goal})
+        self.assertEqual(response.status_code, 201)
 
         response = self.client.get('/api/ideas')
         self.assertEqual(response.status_code, 200)
@@ -51,16 +63,27 @@ class BackendTestCase(unittest.TestCase):
         self.assertEqual(len(data), 1)
         self.assertEqual(data[0]['goal'], test_goal)
 
-    def test_duplicate_ideas_are_ignored(self):
-        """Test that saving a duplicate idea does not create a new entry."""
-        test_goal = "Ensure database integrity"
-        self.client.post('/api/execute', json={'goal': test_goal})
-        self.client.post('/api/execute', json={'goal': test_goal}) # Post again
+    def test_idea_without_goal_is_rejected(self):
+        """Test that an idea needs a goal."""
+        response = self.client.post('/api/ideas', json={})
+        self.assertEqual(response.status_code, 400)
 
-        response = self.client.get('/api/ideas')
+    def test_update_and_delete_idea(self):
+        """Test editing an idea and then deleting it."""
+        idea = json.loads(self.client.post('/api/ideas', json={'goal': 'Draft'}).data)
+
+        response = self.client.put(f"/api/ideas/{idea['id']}", json={'goal': 'Final'})
         self.assertEqual(response.status_code, 200)
-        data = json.loads(response.data)
-        self.assertEqual(len(data), 1, "Duplicate idea should not be added.")
+        self.assertEqual(json.loads(response.data)['goal'], 'Final')
+
+        self.assertEqual(self.client.delete(f"/api/ideas/{idea['id']}").status_code, 200)
+        self.assertEqual(json.loads(self.client.get('/api/ideas').data), [])
+        self.assertEqual(self.client.delete(f"/api/ideas/{idea['id']}").status_code, 404)
+
+    def test_mission_without_goal_is_rejected(self):
+        """Test that POST /api/missions needs a goal."""
+        response = self.client.post('/api/missions', json={})
+        self.assertEqual(response.status_code, 400)
 
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from backend import create_app, db
+
+# The schema the app shipped with before missions had timestamps, events,
+# checkpoints, owners or search indexes.
+ORIGINAL_SCHEMA = """
+CREATE TABLE ideas (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  goal TEXT NOT NULL
+);
+
+CREATE TABLE missions (
+    id TEXT PRIMARY KEY,
+    goal TEXT NOT NULL,
+    clarified_goal TEXT,
+    status TEXT NOT NULL,
+    plan TEXT,
+    report TEXT
+);
+"""
+
+
+class MigrationTestCase(unittest.TestCase):
+    """Test suite for upgrading existing databases to the current schema."""
+
+    def setUp(self):
+        """Set up a database in the original layout, with some data."""
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        conn = sqlite3.connect(self.db_path)
+        conn.executescript(ORIGINAL_SCHEMA)
+        conn.execute("INSERT INTO ideas (goal) VALUES ('Learn the cello')")
+        conn.executemany("INSERT INTO missions (id, goal, status, plan, report) VALUES (?, ?, ?, ?, ?)", [
+            ('m1', 'Plan a garden', 'COMPLETED', '["Dig beds"]', 'Plant tomatoes in spring'),
+            ('m2', 'Write a cookbook', 'EXECUTING', None, None),
+        ])
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        """Clean up the test environment after each test."""
+        db.pool.close_idle()
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+
+    def create_app(self):
+        return create_app({'TESTING': True, 'DATABASE': self.db_path})
+
+    def test_existing_data_is_kept_and_indexed(self):
+        """Creating the app upgrades the database in place."""
+        app = self.create_app()
+        client = app.test_client()
+
+        missions = client.get('/api/missions').get_json()
+        self.assertEqual([m['id'] for m in missions], ['m2', 'm1'])  # Same created_at; newest row first
+        self.assertEqual(client.get('/api/missions/m1').get_json()['plan'], ['Dig beds'])
+        self.assertEqual(client.get('/api/ideas').get_json()[0]['goal'], 'Learn the cello')
+
+        hits = client.get('/api/search?q=tomatoes').get_json()['results']
+        self.assertEqual([h['id'] for h in hits], ['m1'])
+        self.assertEqual(len(client.get('/api/search?q=cello').get_json()['results']), 1)
+
+        with app.app_context():
+            self.assertEqual([m['id'] for m in db.get_interrupted_missions()], ['m2'])
+            self.assertEqual(db.get_orphaned_missions(0)[0]['id'], 'm2')
+            self.assertEqual(db.get_db().execute("PRAGMA user_version").fetchone()[0], db.SCHEMA_VERSION)
+
+    def test_migration_runs_once(self):
+        """A second start only reads the schema version."""
+        self.create_app()
+        with mock.patch.object(db, '_create_schema', side_effect=AssertionError("migrated twice")):
+            app = self.create_app()
+        self.assertEqual(len(app.test_client().get('/api/missions').get_json()), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
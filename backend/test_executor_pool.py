@@ -0,0 +1,145 @@
+import os
+import signal
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from backend import agent_service, create_app, db
+from backend.executor_pool import ExecutorPool, RemoteMission
+from backend.executor_worker import Worker
+from backend.mission import Mission
+from backend.ollama_stub import StubOllama
+from benchmarks.load_test import respond
+
+
+class RecordingSocketIO:
+    """Runs background tasks on plain threads and records emitted events."""
+
+    def __init__(self):
+        self.emitted = []
+
+    def start_background_task(self, target, *args, **kwargs):
+        thread = threading.Thread(target=target, args=args, kwargs=kwargs, daemon=True)
+        thread.start()
+        return thread
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def emit(self, event, data=None, to=None, **kwargs):
+        self.emitted.append((event, data, to))
+
+    def statuses(self, mission_id):
+        return [d['status'] for e, d, _ in list(self.emitted)
+                if e == 'mission_status' and d['mission_id'] == mission_id]
+
+
+def wait_for(predicate, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return predicate()
+
+
+class ExecutorPoolTestCase(unittest.TestCase):
+    """Test suite for running missions in executor processes."""
+
+    def setUp(self):
+        self.stub = StubOllama(respond=respond, latency=0.05).start()
+        self.addCleanup(self.stub.stop)
+        self.saved_config = dict(agent_service.CONFIG)
+        agent_service.CONFIG.update(llm_endpoints=[self.stub.url], step_delay=0, search_latency=0.01)
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.app = create_app({
+            'TESTING': True,
+            'DATABASE': os.path.join(self.tmpdir.name, 'planner.sqlite'),
+            'LLM_CACHE_PATH': os.path.join(self.tmpdir.name, 'llm_cache.sqlite'),
+            'PLAN_LIBRARY_ENABLED': False,
+        })
+        with self.app.app_context():
+            db.init_db()
+        self.socketio = RecordingSocketIO()
+        self.pool = ExecutorPool(self.app, self.socketio, workers=2, restart_delay=0.1)
+        self.pool.start()
+
+    def tearDown(self):
+        self.pool.stop()
+        agent_service.CONFIG.clear()
+        agent_service.CONFIG.update(self.saved_config)
+        db.pool.close_idle()
+        self.tmpdir.cleanup()
+
+    def submit(self):
+        mission = Mission(goal="Open a bakery")
+        with self.app.app_context():
+            db.create_mission(mission)
+        remote = RemoteMission(self.pool, mission, use_cache=False)
+        thread = threading.Thread(target=remote.run, daemon=True)
+        thread.start()
+        return remote, thread
+
+    def mission_status(self, remote):
+        with self.app.app_context():
+            return db.get_mission(remote.mission.id)['status']
+
+    def test_mission_runs_in_a_worker_and_events_are_relayed(self):
+        """The mission completes out of process; its events reach its room here."""
+        remote, thread = self.submit()
+        thread.join(60)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(self.mission_status(remote), 'COMPLETED')
+        self.assertEqual(self.socketio.statuses(remote.mission.id)[-1], 'COMPLETED')
+        self.assertTrue(any(e == 'log_batch' and to == remote.mission.id
+                            for e, _, to in self.socketio.emitted))
+        self.assertEqual(self.pool.stats()['running'], 0)
+
+    def test_cancel_reaches_the_worker(self):
+        """Cancelling a running mission stops it in its worker process."""
+        self.stub.latency = 0.5
+        remote, thread = self.submit()
+        self.assertTrue(wait_for(lambda: 'CLARIFYING' in self.socketio.statuses(remote.mission.id)))
+        remote.cancel()
+        thread.join(30)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(self.mission_status(remote), 'CANCELLED')
+
+    def test_crashed_worker_is_restarted_and_its_mission_resumed(self):
+        """Killing a worker mid-mission resumes the mission elsewhere and replaces the worker."""
+        self.stub.latency = 0.3
+        remote, thread = self.submit()
+        self.assertTrue(wait_for(lambda: 'PLANNING' in self.socketio.statuses(remote.mission.id)))
+        pids = self.pool.worker_pids()
+        slot = next(w.slot for w in self.pool._workers if remote.mission.id in w.missions)
+        os.kill(pids[slot], signal.SIGKILL)
+
+        thread.join(60)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(self.mission_status(remote), 'COMPLETED')
+        self.assertEqual(remote.attempts, 1)
+        self.assertTrue(wait_for(lambda: self.pool.stats()['alive'] == 2))
+        self.assertEqual(self.pool.stats()['restarts'], 1)
+        self.assertNotEqual(self.pool.worker_pids()[slot], pids[slot])
+
+    def test_mission_that_raises_in_a_worker_is_failed(self):
+        """A mission whose service raises is marked FAILED, not left to be resumed again."""
+        mission = Mission(goal="Open a bakery")
+        with self.app.app_context():
+            db.create_mission(mission)
+        sent = []
+        channel = mock.Mock(send=sent.append)
+        worker = Worker(self.app, channel)
+        with mock.patch.object(agent_service.AgentService, 'resume', side_effect=RuntimeError('boom')):
+            worker._run({'mission_id': mission.id})
+
+        with self.app.app_context():
+            self.assertEqual(db.get_mission(mission.id)['status'], 'FAILED')
+            self.assertEqual(db.get_orphaned_missions(time.time()), [])
+        self.assertEqual(sent[-1], {'op': 'finished', 'mission_id': mission.id})
+        statuses = [m['data']['status'] for m in sent if m.get('event') == 'mission_status']
+        self.assertEqual(statuses, ['FAILED'])
+
+
+if __name__ == '__main__':
+    unittest.main()
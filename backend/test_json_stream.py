@@ -0,0 +1,45 @@
+import json
+import unittest
+
+from backend.json_stream import ArrayItemParser
+
+
+def feed_in_pieces(parser, text, size):
+    items = []
+    for i in range(0, len(text), size):
+        items.append(parser.feed(text[i:i + size]))
+    return items
+
+
+class ArrayItemParserTestCase(unittest.TestCase):
+
+    def test_elements_are_returned_as_soon_as_they_close(self):
+        text = json.dumps({'steps': [{'step': 'a', 'depends_on': []}, {'step': 'b', 'depends_on': [1]}]})
+        parser = ArrayItemParser()
+        first_end = text.index('}') + 1
+        self.assertEqual(parser.feed(text[:first_end - 1]), [])
+        self.assertEqual(parser.feed(text[first_end - 1:first_end]), [{'step': 'a', 'depends_on': []}])
+        self.assertEqual(parser.feed(text[first_end:]), [{'step': 'b', 'depends_on': [1]}])
+
+    def test_any_split_gives_the_same_elements(self):
+        steps = ['plain, "quoted" [text]', {'step': 'x}', 'depends_on': [1]}, 3, None, {'nested': {'a': [1, 2]}}]
+        text = json.dumps({'clarified_goal': '{"steps": [0]}', 'steps': steps, 'other': [9]}, indent=2)
+        for size in (1, 2, 7, len(text)):
+            with self.subTest(size=size):
+                parser = ArrayItemParser()
+                items = [item for piece in feed_in_pieces(parser, text, size) for item in piece]
+                self.assertEqual(items, steps)
+                self.assertEqual(parser.text, text)
+                self.assertEqual(parser.values, {'clarified_goal': '{"steps": [0]}'})
+
+    def test_only_the_top_level_key_is_read(self):
+        text = json.dumps({'plan': {'steps': ['inner']}, 'steps': ['outer']})
+        self.assertEqual(ArrayItemParser().feed(text), ['outer'])
+
+    def test_invalid_elements_are_skipped(self):
+        parser = ArrayItemParser()
+        self.assertEqual(parser.feed('{"steps": [{"step": bad}, "ok", {"step": "cut'), ['ok'])
+
+
+if __name__ == '__main__':
+    unittest.main()
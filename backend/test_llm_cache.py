@@ -0,0 +1,60 @@
+import os
+import unittest
+import tempfile
+import time
+
+from backend.llm_cache import LLMCache
+
+
+class LLMCacheTestCase(unittest.TestCase):
+    """Test suite for the persistent LLM response cache."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'cache.sqlite')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_key_depends_on_model_settings(self):
+        """Changing the model, temperature or format changes the key."""
+        base = LLMCache.make_key('m', 0.2, 'json', 'prompt')
+        self.assertEqual(base, LLMCache.make_key('m', 0.2, 'json', 'prompt'))
+        self.assertNotEqual(base, LLMCache.make_key('other', 0.2, 'json', 'prompt'))
+        self.assertNotEqual(base, LLMCache.make_key('m', 0.7, 'json', 'prompt'))
+        self.assertNotEqual(base, LLMCache.make_key('m', 0.2, None, 'prompt'))
+        self.assertNotEqual(base, LLMCache.make_key('m', 0.2, 'json', 'prompt!'))
+
+    def test_entries_survive_reopen(self):
+        """A new cache object on the same file sees earlier entries."""
+        LLMCache(self.path).put('k', 'm', 'value')
+        cache = LLMCache(self.path)
+        self.assertEqual(cache.get('k'), 'value')
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        """Reading an entry protects it from eviction."""
+        cache = LLMCache(self.path, max_entries=2)
+        cache.put('a', 'm', '1')
+        time.sleep(0.01)
+        cache.put('b', 'm', '2')
+        time.sleep(0.01)
+        cache.get('a')
+        time.sleep(0.01)
+        cache.put('c', 'm', '3')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), '1')
+        self.assertEqual(cache.get('c'), '3')
+        self.assertEqual(cache.stats()['entries'], 2)
+
+    def test_expired_entries_are_misses(self):
+        """Entries older than the TTL are not returned."""
+        cache = LLMCache(self.path, ttl=0.01)
+        cache.put('k', 'm', 'value')
+        time.sleep(0.02)
+        self.assertIsNone(cache.get('k'))
+        self.assertEqual(cache.stats()['misses'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,201 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from backend import create_app, agent_service, db
+from backend.llm_router import LLMRouter, NoEndpointAvailable, RoutedLLM
+from backend.mission import MissionStatus
+from backend.ollama_stub import StubOllama
+
+
+def routed(stubs, json_mode=True, hedge_delay=None, **router_kwargs):
+    router = LLMRouter([stub.url for stub in stubs], **router_kwargs)
+    model = RoutedLLM(router, lambda url: agent_service.initialize_llm(json_mode=json_mode, base_url=url),
+                      model='llama3.2:1b', temperature=0.2, format='json' if json_mode else None,
+                      hedge_delay=hedge_delay)
+    return router, model
+
+
+def text(model, prompt='Hello'):
+    return ''.join(chunk.content for chunk in model.stream(prompt))
+
+
+class LLMRouterTestCase(unittest.TestCase):
+    """Routing, failover and hedging against stub Ollama servers."""
+
+    def setUp(self):
+        self.stubs = []
+
+    def tearDown(self):
+        for stub in self.stubs:
+            stub.stop()
+
+    def start_stub(self, reply='{"answer": 1}', **kwargs):
+        stub = StubOllama(respond=lambda prompt, format: reply, **kwargs).start()
+        self.stubs.append(stub)
+        return stub
+
+    def test_least_loaded_endpoint_is_chosen(self):
+        router = LLMRouter(['http://a', 'http://b'])
+        a, b = router.acquire(), router.acquire()
+        self.assertNotEqual(a, b)
+        router.release(a, True, latency=0.1)
+        router.release(b, True, latency=1.0)
+        # The faster endpoint wins even with a request already in flight.
+        first = router.acquire()
+        second = router.acquire()
+        self.assertEqual((first, second), (a, a))
+        # ...until enough requests queue up on it to outweigh the latency gap.
+        picks = [router.acquire() for _ in range(8)]
+        self.assertEqual(picks, [a] * 7 + [b])
+
+    def test_endpoint_without_latency_sample_is_not_flooded(self):
+        """An endpoint that has not answered yet is weighted by the pool's
+        average latency, so requests piling up on it still count."""
+        router = LLMRouter(['http://known', 'http://new'])
+        known, new = router.endpoints
+        router.release(router.acquire(), True, latency=0.5)
+        self.assertEqual(known.latency, 0.5)
+        self.assertIsNone(new.latency)
+        picks = [router.acquire() for _ in range(6)]  # None of them answers
+        self.assertEqual((picks.count(known), picks.count(new)), (3, 3))
+
+    def test_failing_endpoint_is_ejected_then_given_a_trial(self):
+        down, up = self.start_stub(), self.start_stub(reply='{"from": "up"}')
+        down.status = 500
+        router, model = routed([down, up], failure_threshold=2, reset_timeout=0.3)
+
+        # Requests fail over to the healthy endpoint until the bad one is ejected.
+        for _ in range(4):
+            self.assertEqual(text(model), '{"from": "up"}')
+        stats = {s['url']: s for s in router.stats()}
+        self.assertEqual(stats[down.url]['state'], 'open')
+        self.assertEqual(stats[down.url]['errors'], 2)
+        self.assertEqual(stats[up.url]['requests'], 4)
+
+        down.status = 200
+        time.sleep(0.35)
+        self.assertEqual(text(model), '{"answer": 1}')
+        self.assertEqual(router.stats()[0]['state'], 'closed')
+
+    def test_error_is_raised_when_every_endpoint_fails(self):
+        stubs = [self.start_stub(), self.start_stub()]
+        for stub in stubs:
+            stub.status = 503
+        router, model = routed(stubs, failure_threshold=1)
+        with self.assertRaises(Exception) as raised:
+            text(model)
+        self.assertIn('503', str(raised.exception))
+        with self.assertRaises(NoEndpointAvailable):
+            text(model)
+
+    def test_health_checks_eject_and_restore_endpoints(self):
+        stub = self.start_stub()
+        router, _ = routed([stub])
+        stub.status = 500
+        router.check_health()
+        self.assertEqual(router.stats()[0]['state'], 'open')
+        stub.status = 200
+        router.check_health()
+        self.assertEqual(router.stats()[0]['state'], 'closed')
+
+    def test_slow_json_request_is_hedged(self):
+        slow = self.start_stub(reply='{"from": "slow"}', latency=2.0)
+        fast = self.start_stub(reply='{"from": "fast"}')
+        router, model = routed([slow, fast], hedge_delay=0.1)
+
+        started = time.monotonic()
+        self.assertEqual(text(model), '{"from": "fast"}')
+        self.assertLess(time.monotonic() - started, 1.0)
+        stats = {s['url']: s for s in router.stats()}
+        self.assertEqual(stats[fast.url]['hedges'], 1)
+        # The abandoned request says nothing about the slow endpoint's health.
+        self.assertEqual(stats[slow.url]['errors'], 0)
+
+    def test_async_slow_json_request_is_hedged(self):
+        slow = self.start_stub(reply='{"from": "slow"}', latency=2.0)
+        fast = self.start_stub(reply='{"from": "fast"}')
+        router, model = routed([slow, fast], json_mode=False, hedge_delay=0.1)
+
+        async def ask(fmt):
+            return ''.join([chunk.content async for chunk in model.astream('Hello', format=fmt)])
+
+        started = time.monotonic()
+        self.assertEqual(asyncio.run(ask('json')), '{"from": "fast"}')
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(router.stats()[1]['hedges'], 1)
+        self.assertEqual(router.stats()[0]['in_flight'], 0)
+
+    def test_plain_text_requests_are_not_hedged(self):
+        slow = self.start_stub(reply='slow report', latency=0.3)
+        fast = self.start_stub(reply='fast report')
+        router, model = routed([slow, fast], json_mode=False, hedge_delay=0.05)
+        self.assertEqual(text(model), 'slow report')
+        self.assertEqual(sum(s['hedges'] for s in router.stats()), 0)
+
+
+class RoutedMissionTestCase(unittest.TestCase):
+    """A whole mission served by two stub endpoints."""
+
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.app = create_app({
+            'TESTING': True,
+            'DATABASE': self.db_path,
+            'LLM_CACHE_PATH': os.path.join(self.cache_dir.name, 'llm_cache.sqlite'),
+            'PLAN_LIBRARY_ENABLED': False,
+        })
+        with self.app.app_context():
+            db.init_db()
+        self.stubs = [StubOllama(respond=self.respond, latency=0.05).start() for _ in range(2)]
+        self._saved = (agent_service.llm, agent_service.report_llm, agent_service.router,
+                       dict(agent_service.CONFIG))
+        agent_service.llm = agent_service.report_llm = agent_service.router = None
+        agent_service.CONFIG.update(llm_endpoints=[stub.url for stub in self.stubs], step_delay=0)
+
+    def tearDown(self):
+        for stub in self.stubs:
+            stub.stop()
+        agent_service.llm, agent_service.report_llm, agent_service.router, config = self._saved
+        agent_service.CONFIG.clear()
+        agent_service.CONFIG.update(config)
+        db.pool.close_idle()
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+        self.cache_dir.cleanup()
+
+    @staticmethod
+    def respond(prompt, format):
+        if 'Goal Clarifier' in prompt:
+            return json.dumps({'clarified_goal': 'A clarified goal'})
+        if 'Strategic Planner' in prompt:
+            return json.dumps({'steps': ['Research a', 'Research b', 'Research c', 'Research d']})
+        if 'Task Executor' in prompt:
+            return json.dumps({'tool_calls': []})
+        return '# Report'
+
+    def test_mission_requests_are_spread_over_endpoints(self):
+        service = agent_service.AgentService("Test goal", None, self.app, use_cache=False)
+        service.socketio = type('Silent', (), {'emit': lambda *args, **kwargs: None})()
+        with self.app.app_context():
+            db.create_mission(service.mission)
+        service.run()
+
+        self.assertEqual(service.mission.status, MissionStatus.COMPLETED)
+        self.assertEqual(service.mission.report, '# Report')
+        # clarify + plan + 4 concurrent tool selections + report
+        self.assertEqual(sum(stub.requests for stub in self.stubs), 7)
+        self.assertTrue(all(stub.requests for stub in self.stubs))
+
+        endpoints = json.loads(self.app.test_client().get('/api/llm-endpoints').data)
+        self.assertEqual([e['url'] for e in endpoints], [stub.url for stub in self.stubs])
+        self.assertEqual(sum(e['requests'] for e in endpoints), 7)
+        self.assertTrue(all(e['state'] == 'closed' and e['in_flight'] == 0 for e in endpoints))
+
+
+if __name__ == '__main__':
+    unittest.main()
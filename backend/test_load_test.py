@@ -0,0 +1,40 @@
+import json
+import os
+import tempfile
+import unittest
+
+from benchmarks import load_test
+
+
+class LoadTestTestCase(unittest.TestCase):
+    """Runs the load-test harness at a tiny scale to keep it working."""
+
+    def test_missions_complete_and_results_are_written(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            output = os.path.join(workdir, 'results.json')
+            status = load_test.main(['--missions', '3', '--observers', '2', '--latency', '0.01',
+                                     '--token-rate', '0', '--step-delay', '0', '--timeout', '60',
+                                     '--output', output])
+            with open(output) as f:
+                result = json.load(f)
+            # A second run can be compared with the first.
+            compared = os.path.join(workdir, 'compared.json')
+            load_test.main(['--missions', '1', '--observers', '1', '--latency', '0.01',
+                            '--token-rate', '0', '--step-delay', '0', '--timeout', '60',
+                            '--output', compared, '--compare', output])
+            with open(compared) as f:
+                comparison = json.load(f)['comparison']
+
+        self.assertEqual(status, 0)
+        self.assertEqual(result['missions']['statuses'], {'COMPLETED': 3})
+        for node in ('mission', 'clarify_goal', 'create_plan', 'execute_step', 'synthesize_report'):
+            self.assertEqual(result['latency_s'][node]['count'], 3, node)
+        self.assertGreater(result['socketio']['server_emits_per_s'], 0)
+        self.assertGreater(result['socketio']['observer_events_per_s'], 0)
+        self.assertGreater(result['sqlite']['writes_per_s'], 0)
+        self.assertGreater(result['llm']['requests'], 0)
+        self.assertIn('missions.submitted', comparison['changes'])
+
+
+if __name__ == '__main__':
+    unittest.main()
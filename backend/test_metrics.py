@@ -0,0 +1,123 @@
+import os
+import re
+import tempfile
+import unittest
+
+from langchain_core.messages import AIMessageChunk
+
+from backend import create_app, agent_service, db, metrics
+from backend.app import socketio
+from backend.mission import MissionStatus
+from backend.test_agent_service import FakeLLM, FakeSocketIO, fake_planner
+
+
+def sample(text, name, **labels):
+    """Returns the value of one sample in a Prometheus text exposition, or None."""
+    label_text = ','.join(f'{key}="{value}"' for key, value in labels.items())
+    pattern = '^' + re.escape(name + ('{' + label_text + '}' if label_text else '')) + r' (\S+)$'
+    match = re.search(pattern, text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+class UsageLLM(FakeLLM):
+    """A fake model that reports token usage on its last chunk, like Ollama."""
+
+    def stream(self, prompt):
+        yield from super().stream(prompt)
+        yield AIMessageChunk(content='', usage_metadata={'input_tokens': 10, 'output_tokens': 5,
+                                                         'total_tokens': 15})
+
+
+class RegistryTestCase(unittest.TestCase):
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = metrics.Registry()
+        histogram = metrics.Histogram('test_seconds', 'A test histogram.', ['node'],
+                                      buckets=(0.1, 1), registry=registry)
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value, 'a')
+        text = registry.render()
+        self.assertIn('# TYPE test_seconds histogram', text)
+        self.assertEqual(sample(text, 'test_seconds_bucket', node='a', le='0.1'), 2)
+        self.assertEqual(sample(text, 'test_seconds_bucket', node='a', le='1'), 3)
+        self.assertEqual(sample(text, 'test_seconds_bucket', node='a', le='+Inf'), 4)
+        self.assertEqual(sample(text, 'test_seconds_count', node='a'), 4)
+        self.assertAlmostEqual(sample(text, 'test_seconds_sum', node='a'), 3.65)
+
+    def test_label_values_are_escaped(self):
+        registry = metrics.Registry()
+        counter = metrics.Counter('test_total', 'A test counter.', ['event'], registry=registry)
+        counter.inc('say "hi"\n', amount=2)
+        self.assertIn('test_total{event="say \\"hi\\"\\n"} 2', registry.render())
+
+
+class MetricsEndpointTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.app = create_app({
+            'TESTING': True,
+            'DATABASE': self.db_path,
+            'LLM_CACHE_PATH': os.path.join(self.cache_dir.name, 'llm_cache.sqlite'),
+        })
+        with self.app.app_context():
+            db.init_db()
+        self._saved = (agent_service.llm, agent_service.report_llm, dict(agent_service.CONFIG))
+        agent_service.CONFIG['step_delay'] = 0
+
+    def tearDown(self):
+        agent_service.llm, agent_service.report_llm, config = self._saved
+        agent_service.CONFIG.clear()
+        agent_service.CONFIG.update(config)
+        db.pool.close_idle()
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+        self.cache_dir.cleanup()
+
+    def scrape(self):
+        response = self.app.test_client().get('/api/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+        return response.get_data(as_text=True)
+
+    def test_mission_is_measured(self):
+        before = self.scrape()
+        model = agent_service.CONFIG['llm_model']
+        agent_service.llm = UsageLLM(fake_planner(['Research a', 'Research b']))
+        agent_service.report_llm = UsageLLM(lambda prompt: '# Report')
+        service = agent_service.AgentService("Test goal", FakeSocketIO(), self.app, use_cache=False)
+        with self.app.app_context():
+            db.create_mission(service.mission)
+        service.run()
+        self.assertEqual(service.mission.status, MissionStatus.COMPLETED)
+        after = self.scrape()
+
+        def delta(name, **labels):
+            return (sample(after, name, **labels) or 0) - (sample(before, name, **labels) or 0)
+
+        for node in ('clarify_goal', 'create_plan', 'execute_step', 'synthesize_report'):
+            self.assertEqual(delta('ai_planner_node_duration_seconds_count', node=node), 1, node)
+        # clarify + plan + two tool selections + report
+        self.assertEqual(delta('ai_planner_llm_request_duration_seconds_count', model=model), 5)
+        self.assertEqual(delta('ai_planner_llm_prompt_tokens_total', model=model), 50)
+        self.assertEqual(delta('ai_planner_llm_completion_tokens_total', model=model), 25)
+        self.assertGreater(delta('ai_planner_sqlite_query_duration_seconds_count', operation='insert'), 0)
+        self.assertGreater(delta('ai_planner_sqlite_query_duration_seconds_count', operation='commit'), 0)
+
+    def test_emits_and_mission_gauges(self):
+        socketio.test_client(self.app)  # Packets are only encoded when a client is connected
+        before = self.scrape()
+        socketio.emit('mission_status', {'mission_id': 'm1', 'status': 'RUNNING'})
+        after = self.scrape()
+        self.assertEqual((sample(after, 'ai_planner_socketio_emits_total', event='mission_status') or 0)
+                         - (sample(before, 'ai_planner_socketio_emits_total', event='mission_status') or 0), 1)
+        self.assertEqual((sample(after, 'ai_planner_socketio_emit_bytes_total', event='mission_status') or 0)
+                         - (sample(before, 'ai_planner_socketio_emit_bytes_total', event='mission_status') or 0),
+                         len('2["mission_status",{"mission_id":"m1","status":"RUNNING"}]'))
+        self.assertEqual(sample(after, 'ai_planner_missions_active'), 0)
+        self.assertEqual(sample(after, 'ai_planner_missions_queued'), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
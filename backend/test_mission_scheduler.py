@@ -0,0 +1,126 @@
+import threading
+import time
+import unittest
+
+from backend.mission import Mission, MissionStatus
+from backend.mission_scheduler import MissionScheduler, QueueFullError
+
+
+class ThreadSocketIO:
+    """Runs background tasks on plain threads."""
+
+    def start_background_task(self, target, *args, **kwargs):
+        thread = threading.Thread(target=target, args=args, kwargs=kwargs, daemon=True)
+        thread.start()
+        return thread
+
+
+class BlockingService:
+    """An AgentService stand-in whose run() blocks until released."""
+
+    started = []
+
+    def __init__(self, name):
+        self.mission = Mission(goal=name)
+        self.release = threading.Event()
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        if self.cancelled:
+            return
+        BlockingService.started.append(self.mission.goal)
+        self.release.wait(5)
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+class MissionSchedulerTestCase(unittest.TestCase):
+    """Test suite for admission control and queueing of missions."""
+
+    def setUp(self):
+        BlockingService.started = []
+        self.scheduler = MissionScheduler(ThreadSocketIO(), max_concurrent=2, max_queue=2)
+
+    def test_concurrency_cap_and_queue_limit(self):
+        """Missions beyond the cap are queued; beyond the queue they are refused."""
+        services = [BlockingService(f"m{i}") for i in range(5)]
+        admissions = [self.scheduler.submit(s) for s in services[:4]]
+        self.assertEqual([a['position'] for a in admissions], [0, 0, 1, 2])
+        self.assertEqual(services[2].mission.status, MissionStatus.QUEUED)
+
+        with self.assertRaises(QueueFullError) as ctx:
+            self.scheduler.submit(services[4])
+        self.assertGreaterEqual(ctx.exception.retry_after, 1)
+
+        stats = self.scheduler.stats()
+        self.assertEqual((stats['running'], stats['queued']), (2, 2))
+
+        for s in services[:4]:
+            s.release.set()
+        self.assertTrue(wait_for(lambda: self.scheduler.stats()['running'] == 0))
+        self.assertEqual(sorted(BlockingService.started), ['m0', 'm1', 'm2', 'm3'])
+
+    def test_higher_priority_runs_first_then_fifo(self):
+        """Queued missions start by priority, then in submission order."""
+        self.scheduler = MissionScheduler(ThreadSocketIO(), max_concurrent=1, max_queue=5)
+        running = BlockingService("running")
+        self.scheduler.submit(running)
+        queued = [BlockingService("low-1"), BlockingService("high"), BlockingService("low-2")]
+        self.scheduler.submit(queued[0])
+        self.assertEqual(self.scheduler.submit(queued[1], priority=5)['position'], 1)
+        self.scheduler.submit(queued[2])
+
+        for s in [running] + queued:
+            s.release.set()
+        self.assertTrue(wait_for(lambda: len(BlockingService.started) == 4))
+        self.assertEqual(BlockingService.started, ['running', 'high', 'low-1', 'low-2'])
+
+    def test_cancel_frees_slot_immediately(self):
+        """Cancelling a running mission starts the next one without waiting for it to end."""
+        self.scheduler = MissionScheduler(ThreadSocketIO(), max_concurrent=1, max_queue=5)
+        running, queued, waiting = BlockingService("running"), BlockingService("queued"), BlockingService("next")
+        for s in (running, queued, waiting):
+            self.scheduler.submit(s)
+        self.assertTrue(wait_for(lambda: BlockingService.started == ['running']))
+
+        self.assertTrue(self.scheduler.cancel(queued.mission.id))
+        self.assertTrue(queued.cancelled)
+        self.assertEqual(self.scheduler.stats()['queued'], 1)
+
+        self.assertTrue(self.scheduler.cancel(running.mission.id))
+        self.assertTrue(wait_for(lambda: BlockingService.started == ['running', 'next']))
+        self.assertEqual(self.scheduler.stats()['running'], 1)
+        self.assertFalse(self.scheduler.cancel('unknown'))
+
+        running.release.set()
+        waiting.release.set()
+        self.assertTrue(wait_for(lambda: self.scheduler.stats()['running'] == 0))
+
+    def test_reports_mission_ids_and_finished_missions(self):
+        """mission_ids() covers running and queued missions; on_finished sees each one end."""
+        finished = []
+        self.scheduler = MissionScheduler(ThreadSocketIO(), max_concurrent=1, max_queue=5,
+                                          on_finished=finished.append)
+        running, queued = BlockingService("running"), BlockingService("queued")
+        for s in (running, queued):
+            self.scheduler.submit(s)
+        self.assertEqual(self.scheduler.mission_ids(), [running.mission.id, queued.mission.id])
+
+        self.scheduler.cancel(queued.mission.id)
+        self.assertEqual(finished, [queued.mission.id])
+        running.release.set()
+        self.assertTrue(wait_for(lambda: len(finished) == 2))
+        self.assertEqual(finished[1], running.mission.id)
+        self.assertEqual(self.scheduler.mission_ids(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
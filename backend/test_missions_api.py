@@ -0,0 +1,99 @@
+import os
+import unittest
+import json
+import tempfile
+
+from backend import create_app, db
+from backend.mission import Mission, MissionStatus
+
+
+class MissionsApiTestCase(unittest.TestCase):
+    """Test suite for listing and fetching missions."""
+
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.app = create_app({
+            'TESTING': True,
+            'DATABASE': self.db_path,
+        })
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.init_db()
+
+    def tearDown(self):
+        db.pool.close_idle()
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+
+    def add_missions(self, count, status=MissionStatus.COMPLETED):
+        missions = []
+        with self.app.app_context():
+            for i in range(count):
+                mission = Mission(goal=f"Goal {i}")
+                mission.status = status
+                db.create_mission(mission)
+                mission.report = "A long report " * 100
+                db.update_mission_fields(mission.id, mission.take_dirty())
+                missions.append(mission)
+        return missions
+
+    def test_keyset_pagination_returns_newest_first_without_heavy_fields(self):
+        """Pages follow X-Next-Before and only carry the list columns."""
+        missions = self.add_missions(5)
+        expected = [m.id for m in reversed(missions)]
+
+        seen = []
+        url = '/api/missions?limit=2'
+        while url:
+            response = self.client.get(url)
+            page = json.loads(response.data)
+            seen.extend(m['id'] for m in page)
+            self.assertTrue(all(set(m) == {'id', 'goal', 'status', 'created_at', 'updated_at'} for m in page))
+            before = response.headers.get('X-Next-Before')
+            url = f'/api/missions?limit=2&before={before}' if before else None
+        self.assertEqual(seen, expected)
+
+    def test_status_filter(self):
+        """?status= limits the listing to missions in that status."""
+        self.add_missions(2)
+        queued = self.add_missions(1, status=MissionStatus.QUEUED)
+        page = json.loads(self.client.get('/api/missions?status=QUEUED').data)
+        self.assertEqual([m['id'] for m in page], [queued[0].id])
+
+    def test_unchanged_list_returns_304(self):
+        """A matching If-None-Match yields 304 until a mission changes."""
+        missions = self.add_missions(2)
+        etag = self.client.get('/api/missions').headers['ETag']
+        response = self.client.get('/api/missions', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        with self.app.app_context():
+            db.update_mission_fields(missions[0].id, {'status': MissionStatus.FAILED})
+        response = self.client.get('/api/missions', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_get_mission_returns_plan_and_report(self):
+        """Heavy fields are available from the single-mission endpoint."""
+        mission = self.add_missions(1)[0]
+        with self.app.app_context():
+            db.update_mission_fields(mission.id, {'plan': ['a', 'b']})
+        data = json.loads(self.client.get(f'/api/missions/{mission.id}').data)
+        self.assertEqual(data['plan'], ['a', 'b'])
+        self.assertTrue(data['report'].startswith('A long report'))
+        self.assertEqual(self.client.get('/api/missions/unknown').status_code, 404)
+
+    def test_cancel_mission(self):
+        """Unknown and finished missions cannot be cancelled; orphaned ones can."""
+        self.assertEqual(self.client.post('/api/missions/unknown/cancel').status_code, 404)
+
+        finished = self.add_missions(1)[0]
+        self.assertEqual(self.client.post(f'/api/missions/{finished.id}/cancel').status_code, 409)
+
+        orphaned = self.add_missions(1, status=MissionStatus.EXECUTING)[0]
+        response = self.client.post(f'/api/missions/{orphaned.id}/cancel')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.client.get(f'/api/missions/{orphaned.id}').get_json()['status'], 'CANCELLED')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+
+import numpy as np
+
+from backend.plan_library import PlanLibrary
+
+
+class PlanLibraryTestCase(unittest.TestCase):
+    """Test suite for the in-memory plan library."""
+
+    def setUp(self):
+        self.library = PlanLibrary(dim=1024)
+        self.library.add("Plan a team offsite in Lisbon", ['Book venue'], mission_id='m1')
+        self.library.add("Research the best electric cars", ['Compare range'], mission_id='m2')
+        self.library.add("Learn conversational Spanish", ['Find a tutor'], mission_id='m3')
+
+    def test_search_ranks_by_similarity(self):
+        results = self.library.search("plan a team offsite in lisbon!", k=2)
+        self.assertEqual([r['mission_id'] for r in results][0], 'm1')
+        self.assertGreater(results[0]['similarity'], 0.99)
+        self.assertLess(results[1]['similarity'], results[0]['similarity'])
+
+        results = self.library.search("research hybrid cars", k=1)
+        self.assertEqual(results[0]['mission_id'], 'm2')
+        self.assertLess(results[0]['similarity'], 0.9)
+
+    def test_same_goal_replaces_older_plan(self):
+        self.library.add("Plan a team offsite in Lisbon", ['Book hotel', 'Book venue'], mission_id='m4')
+        self.assertEqual(len(self.library.entries), 3)
+        best = self.library.search("Plan a team offsite in Lisbon", k=1)[0]
+        self.assertEqual((best['mission_id'], best['plan']), ('m4', ['Book hotel', 'Book venue']))
+
+    def test_scores_match_dense_tf_idf(self):
+        self.library.add("Plan a team retreat in Porto", ['Book venue'], mission_id='m4')
+        self.library.add("Research the best electric cars", ['Compare price'], mission_id='m5')
+        dense = np.zeros((len(self.library.entries), self.library.dim))
+        for row, entry in enumerate(self.library.entries):
+            indices, tf = self.library.vectorize(entry['goal'])
+            dense[row, indices] = tf
+        idf = np.log((1 + len(dense)) / (1 + (dense > 0).sum(axis=0))) + 1
+        weighted = dense * idf
+        weighted /= np.linalg.norm(weighted, axis=1, keepdims=True)
+        indices, tf = self.library.vectorize("plan a team offsite in porto")
+        query = np.zeros(self.library.dim)
+        query[indices] = tf * idf[indices]
+        expected = weighted @ (query / np.linalg.norm(query))
+
+        results = self.library.search("plan a team offsite in porto", k=4)
+        by_id = {r['mission_id']: r['similarity'] for r in results}
+        ids = [e['mission_id'] for e in self.library.entries]
+        for row, mission_id in enumerate(ids):
+            self.assertAlmostEqual(by_id[mission_id], expected[row], places=5)
+
+    def test_many_entries_are_searchable(self):
+        for i in range(40):
+            self.library.add(f"Goal number {i} about topic {i * 7}", [f"Step {i}"])
+        self.assertEqual(len(self.library.entries), 43)
+        self.assertEqual(self.library.search("Goal number 33 about topic 231", k=1)[0]['plan'], ['Step 33'])
+
+    def test_empty_inputs(self):
+        self.assertEqual(PlanLibrary().search("anything"), [])
+        self.assertEqual(self.library.search("!!!"), [])
+        self.library.add("", ['x'])
+        self.library.add("No plan", [])
+        self.assertEqual(len(self.library.entries), 3)
+
+    def test_stats_report_hit_rate_and_time_saved(self):
+        self.library.record('miss', plan_seconds=2.0)
+        self.library.record('seeded', plan_seconds=4.0)
+        self.library.record('reused')
+        self.library.record('reused')
+        stats = self.library.stats()
+        self.assertEqual((stats['lookups'], stats['reused'], stats['seeded']), (4, 2, 1))
+        self.assertEqual(stats['hit_rate'], 0.5)
+        self.assertEqual(stats['average_plan_seconds'], 3.0)
+        self.assertEqual(stats['time_saved_seconds'], 6.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import os
+import tempfile
+import time
+import unittest
+import uuid
+
+import socketio
+
+from backend import create_app, db
+from backend.mission import Mission, MissionStatus
+from backend.mission_ownership import MissionOwnership
+from backend.socket_queue import LocalPubSubManager, create_client_manager
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+class SocketQueueTestCase(unittest.TestCase):
+    """Test suite for relaying Socket.IO events between workers."""
+
+    def make_worker(self, url):
+        server = socketio.Server(async_mode='threading',
+                                 client_manager=create_client_manager(url, 'test'))
+        server.manager.initialize()
+        self.addCleanup(server.manager.close)
+        # Record the encoded packets a connected client would be sent.
+        server.sent = []
+        server._send_eio_packet = lambda eio_sid, packet: server.sent.append(packet.data)
+        return server
+
+    def test_room_emit_reaches_clients_of_other_workers(self):
+        """An event emitted by one worker reaches a room member connected to another."""
+        url = f'local://{uuid.uuid4().hex}'
+        worker_a = self.make_worker(url)
+        worker_b = self.make_worker(url)
+        sid = worker_b.manager.connect('eio-1', '/')
+        worker_b.manager.enter_room(sid, '/', 'm1')
+
+        worker_a.emit('mission_status', {'mission_id': 'm2', 'status': 'EXECUTING'}, to='m2')
+        worker_a.emit('mission_status', {'mission_id': 'm1', 'status': 'EXECUTING'}, to='m1')
+        self.assertTrue(wait_for(lambda: worker_b.sent))
+        time.sleep(0.05)
+        self.assertEqual(worker_b.sent, ['2["mission_status",{"mission_id":"m1","status":"EXECUTING"}]'])
+        self.assertEqual(worker_a.sent, [])
+
+    def test_client_manager_by_url(self):
+        """No URL keeps events local; local:// uses the in-process bus."""
+        self.assertIsNone(create_client_manager(None, 'test'))
+        manager = create_client_manager('local://x', 'test')
+        self.addCleanup(manager.close)
+        self.assertIsInstance(manager, LocalPubSubManager)
+
+
+class MissionOwnershipTestCase(unittest.TestCase):
+    """Test suite for assigning each mission to exactly one worker."""
+
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.app = create_app({
+            'TESTING': True,
+            'DATABASE': self.db_path,
+            'WORKER_ID': 'worker-a',
+        })
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.init_db()
+        self.worker_a = self.app.extensions['mission_ownership']
+        self.worker_b = MissionOwnership(self.app, 'worker-b', lease_timeout=30)
+
+    def tearDown(self):
+        db.pool.close_idle()
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+
+    def add_mission(self):
+        mission = Mission(goal="Test goal")
+        with self.app.app_context():
+            db.create_mission(mission)
+        return mission
+
+    def test_only_one_worker_can_claim_a_mission(self):
+        """A live lease keeps other workers out; an expired one does not."""
+        mission = self.add_mission()
+        self.assertTrue(self.worker_a.claim(mission.id))
+        self.assertFalse(self.worker_b.claim(mission.id))
+        self.assertTrue(self.worker_a.claim(mission.id))  # Re-claiming is fine
+        with self.app.app_context():
+            self.assertEqual(db.get_orphaned_missions(time.time()), [])
+
+        dead = MissionOwnership(self.app, 'worker-dead', lease_timeout=-1)
+        other = self.add_mission()
+        self.assertTrue(dead.claim(other.id))
+        with self.app.app_context():
+            self.assertEqual([r['id'] for r in db.get_orphaned_missions(time.time())], [other.id])
+        self.assertTrue(self.worker_b.claim(other.id))
+
+        self.worker_a.release(mission.id)
+        self.assertTrue(self.worker_b.claim(mission.id))
+
+    def test_cancel_of_mission_owned_by_another_worker(self):
+        """The request is recorded for the owner, which sees it when renewing."""
+        mission = self.add_mission()
+        self.assertTrue(self.worker_b.claim(mission.id))
+        self.assertEqual(self.worker_b.renew([mission.id]), [])
+
+        response = self.client.post(f'/api/missions/{mission.id}/cancel')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.worker_b.renew([mission.id]), [mission.id])
+        with self.app.app_context():
+            self.assertEqual(db.get_mission(mission.id)['status'], MissionStatus.PENDING.value)
+
+    def test_cancel_of_orphaned_mission_drops_its_owner(self):
+        """Without a live owner the mission is cancelled in the database."""
+        mission = self.add_mission()
+        MissionOwnership(self.app, 'worker-dead', lease_timeout=-1).claim(mission.id)
+
+        response = self.client.post(f'/api/missions/{mission.id}/cancel')
+        self.assertEqual(response.status_code, 202)
+        with self.app.app_context():
+            self.assertEqual(db.get_mission(mission.id)['status'], 'CANCELLED')
+        self.assertTrue(self.worker_b.claim(mission.id))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import os
+import unittest
+import tempfile
+
+from backend import create_app, db
+from backend.mission import Mission, MissionStatus
+
+
+class SearchTestCase(unittest.TestCase):
+    """Test suite for full-text search over ideas and missions."""
+
+    def setUp(self):
+        """Set up a test environment before each test."""
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.app = create_app({
+            'TESTING': True,
+            'DATABASE': self.db_path,
+        })
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.init_db()
+
+    def tearDown(self):
+        """Clean up the test environment after each test."""
+        db.pool.close_idle()
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+
+    def add_mission(self, goal, report=None):
+        """Creates a mission; with a report it is stored as completed."""
+        with self.app.app_context():
+            mission = Mission(goal=goal)
+            db.create_mission(mission)
+            if report is not None:
+                mission.report = report
+                mission.status = MissionStatus.COMPLETED
+                db.update_mission_fields(mission.id, mission.take_dirty())
+        return mission
+
+    def search(self, q, **params):
+        """Calls /api/search and returns the JSON body."""
+        response = self.client.get('/api/search', query_string=dict(q=q, **params))
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()
+
+    def test_finds_missions_and_ideas_ranked_by_relevance(self):
+        """Missions and ideas both match, and goal matches rank above report matches."""
+        goal_hit = self.add_mission("Plan a solar panel installation")
+        report_hit = self.add_mission("Renovate the kitchen", report="Consider adding a solar water heater.")
+        self.add_mission("Learn to bake bread")
+        self.client.post('/api/ideas', json={'goal': 'Compare solar inverters'})
+
+        results = self.search('solar')['results']
+
+        self.assertEqual(len(results), 3)
+        self.assertEqual({r['type'] for r in results}, {'mission', 'idea'})
+        # A match in the goal outranks a match buried in the report.
+        mission_ids = [r['id'] for r in results if r['type'] == 'mission']
+        self.assertEqual(mission_ids, [goal_hit.id, report_hit.id])
+        self.assertIn('<mark>solar</mark>', results[0]['snippet'])
+
+    def test_missions_and_ideas_are_interleaved(self):
+        """Each source is ranked on its own, so ideas are not buried behind missions."""
+        for i in range(3):
+            self.add_mission(f"Compost bins {i}")
+        self.client.post('/api/ideas', json={'goal': 'Start composting at home'})
+        self.client.post('/api/ideas', json={'goal': 'Compost tea for the garden'})
+
+        types = [r['type'] for r in self.search('compost')['results']]
+        self.assertEqual(types, ['mission', 'idea', 'mission', 'idea', 'mission'])
+        page = self.search('compost', limit=2, offset=2)['results']
+        self.assertEqual([r['type'] for r in page], ['mission', 'idea'])
+
+    def test_last_word_matches_as_prefix(self):
+        """The last word also matches as a prefix (search-as-you-type)."""
+        self.add_mission("Organize a marathon training schedule")
+        self.assertEqual(len(self.search('marathon train')['results']), 1)
+        self.assertEqual(len(self.search('mara')['results']), 1)
+
+    def test_index_follows_updates_and_deletes(self):
+        """The triggers keep the index in step with updated and deleted rows."""
+        mission = self.add_mission("Write a novel")
+        with self.app.app_context():
+            mission.report = "Chapter outline about dragons"
+            db.update_mission_fields(mission.id, mission.take_dirty())
+        self.assertEqual(len(self.search('dragons')['results']), 1)
+
+        with self.app.app_context():
+            db.delete_mission(mission.id)
+        self.assertEqual(self.search('dragons')['results'], [])
+
+        idea_id = self.client.post('/api/ideas', json={'goal': 'Visit Kyoto'}).get_json()['id']
+        self.client.put(f'/api/ideas/{idea_id}', json={'goal': 'Visit Osaka'})
+        self.assertEqual(self.search('Kyoto')['results'], [])
+        self.assertEqual(len(self.search('Osaka')['results']), 1)
+
+    def test_index_survives_vacuum(self):
+        """Index entries stay attached to their missions after a VACUUM."""
+        first = self.add_mission("Paint the fence")
+        second = self.add_mission("Tune the piano")
+        with self.app.app_context():
+            db.delete_mission(first.id)
+            db.get_db().execute("VACUUM")
+        results = self.search('piano')['results']
+        self.assertEqual([r['id'] for r in results], [second.id])
+        self.assertEqual(self.search('fence')['results'], [])
+
+    def test_snippets_are_escaped_and_operators_are_text(self):
+        """Stored text is HTML-escaped and FTS5 operators typed by the user are plain words."""
+        self.add_mission("Fix <script> injection AND NOT quoting")
+        results = self.search('script AND "NOT')['results']
+        self.assertEqual(len(results), 1)
+        self.assertNotIn('<script>', results[0]['snippet'])
+        self.assertIn('&lt;', results[0]['snippet'])
+
+    def test_pagination(self):
+        """limit and offset page through the hits without repeating any."""
+        for i in range(5):
+            self.add_mission(f"Garden project {i}")
+        first = self.search('garden', limit=3)
+        second = self.search('garden', limit=3, offset=3)
+        self.assertTrue(first['has_more'])
+        self.assertFalse(second['has_more'])
+        ids = [r['id'] for r in first['results'] + second['results']]
+        self.assertEqual(len(set(ids)), 5)
+
+    def test_empty_query_is_rejected(self):
+        """An empty query is a 400; one without words returns no results."""
+        self.assertEqual(self.client.get('/api/search?q=').status_code, 400)
+        self.assertEqual(self.search('!!!')['results'], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,21 @@
+import unittest
+
+from benchmarks import bench_startup
+
+
+class StartupTestCase(unittest.TestCase):
+    """Guards the cost of importing the backend and serving the first request."""
+
+    def test_heavy_modules_stay_off_startup_path(self):
+        """LangChain and LangGraph are not imported before they are needed."""
+        result = bench_startup.measure_once()
+        self.assertEqual(result['status_code'], 200)
+        self.assertEqual(result['heavy_modules'], [])
+
+    def test_time_to_first_request_within_budget(self):
+        """A cold start serves its first request within a generous budget."""
+        self.assertEqual(bench_startup.main(['--runs', '1', '--budget', '5']), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
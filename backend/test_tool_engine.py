@@ -0,0 +1,135 @@
+import threading
+import time
+import unittest
+
+from backend.tool_engine import StubSearchBackend, ToolEngine, ToolTimeout, UnknownTool
+
+
+class ToolEngineTestCase(unittest.TestCase):
+    """Test suite for concurrent tool execution."""
+
+    def setUp(self):
+        self.engine = ToolEngine(max_workers=8)
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+        self.calls = []
+
+    def slow_tool(self, value, delay=0.1):
+        with self.lock:
+            self.calls.append(value)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(delay)
+        with self.lock:
+            self.active -= 1
+        return value * 2
+
+    def test_concurrency_limit_is_per_tool(self):
+        self.engine.register('slow', self.slow_tool, max_concurrency=2)
+        futures = [self.engine.submit('slow', {'value': i}) for i in range(6)]
+        self.assertEqual([f.result(2) for f in futures], [0, 2, 4, 6, 8, 10])
+        self.assertEqual(self.peak, 2)
+
+    def test_identical_calls_in_flight_are_executed_once(self):
+        self.engine.register('slow', self.slow_tool)
+        futures = [self.engine.submit('slow', {'value': 1}) for _ in range(3)]
+        self.assertEqual({f.result(2) for f in futures}, {2})
+        self.assertEqual(self.calls, [1])
+        stats = self.engine.stats()['slow']
+        self.assertEqual((stats['calls'], stats['executions'], stats['coalesced']), (3, 1, 2))
+
+    def test_results_are_cached_until_ttl_expires(self):
+        self.engine.register('slow', self.slow_tool, ttl=0.2)
+        self.engine.call('slow', {'value': 1, 'delay': 0})
+        self.engine.call('slow', {'delay': 0, 'value': 1})  # Argument order does not matter
+        self.assertEqual(self.calls, [1])
+        self.assertEqual(self.engine.stats()['slow']['cache_hits'], 1)
+        time.sleep(0.25)
+        self.engine.call('slow', {'value': 1, 'delay': 0})
+        self.assertEqual(self.calls, [1, 1])
+
+    def test_slow_call_times_out(self):
+        self.engine.register('slow', self.slow_tool, timeout=0.05)
+        started = time.monotonic()
+        with self.assertRaises(ToolTimeout):
+            self.engine.call('slow', {'value': 1, 'delay': 0.5})
+        self.assertLess(time.monotonic() - started, 0.3)
+        self.assertEqual(self.engine.stats()['slow']['timeouts'], 1)
+
+    def test_timed_out_call_gives_its_slot_back(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def tool(value):
+            if value.startswith('hang'):
+                release.wait(5)
+            return value
+
+        self.engine.register('tool', tool, max_concurrency=1, timeout=0.1)
+        hung = self.engine.submit('tool', {'value': 'hang'})
+        with self.assertRaises(ToolTimeout):
+            hung.result(1)
+        # The next call runs although the hung one still has not returned.
+        self.assertEqual(self.engine.call('tool', {'value': 'ok'}), 'ok')
+        self.assertEqual(self.engine.stats()['tool']['abandoned'], 1)
+
+        # Only max_concurrency calls are abandoned at a time; the next one keeps its slot.
+        second = self.engine.submit('tool', {'value': 'hang2'})
+        with self.assertRaises(ToolTimeout):
+            second.result(1)
+        self.assertEqual(self.engine.stats()['tool']['abandoned'], 1)
+
+        release.set()
+        deadline = time.monotonic() + 2
+        while self.engine.stats()['tool']['abandoned'] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.engine.stats()['tool']['abandoned'], 0)
+        self.assertEqual(self.engine.call('tool', {'value': 'again'}), 'again')
+
+    def test_saturated_tool_does_not_starve_other_tools(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def blocked(value):
+            release.wait(5)
+            return value
+
+        engine = ToolEngine(max_workers=2)
+        engine.register('blocked', blocked, max_concurrency=1)
+        engine.register('slow', self.slow_tool)
+        queued = [engine.submit('blocked', {'value': i}) for i in range(5)]
+        # One worker runs the blocked call; its queued calls hold no worker.
+        self.assertEqual(engine.call('slow', {'value': 1, 'delay': 0}), 2)
+        release.set()
+        self.assertEqual([f.result(2) for f in queued], list(range(5)))
+
+    def test_errors_are_not_cached(self):
+        attempts = []
+
+        def flaky():
+            attempts.append(1)
+            raise RuntimeError("backend down")
+
+        self.engine.register('flaky', flaky)
+        for _ in range(2):
+            with self.assertRaises(RuntimeError):
+                self.engine.call('flaky')
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(self.engine.stats()['flaky']['errors'], 2)
+
+    def test_unknown_tool(self):
+        with self.assertRaises(UnknownTool):
+            self.engine.submit('missing', {})
+
+    def test_latency_is_recorded(self):
+        backend = StubSearchBackend(latency=0.02)
+        self.engine.register('web_search', backend.search)
+        self.assertIn("'cats'", self.engine.call('web_search', {'query': 'cats'}))
+        latency = self.engine.stats()['web_search']['latency_ms']
+        self.assertGreaterEqual(latency['max'], 20)
+        self.assertEqual(backend.queries, ['cats'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,277 @@
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+class ToolTimeout(Exception):
+    """Raised when a tool call does not finish within its tool's timeout."""
+
+
+class UnknownTool(Exception):
+    """Raised when a call names a tool that has not been registered."""
+
+
+class _Tool:
+    """A registered tool with its limits and counters."""
+    def __init__(self, name: str, fn: Callable[..., Any], max_concurrency: int,
+                 timeout: float, ttl: float):
+        self.name = name
+        self.fn = fn
+        self.timeout = timeout
+        self.ttl = ttl
+        self.max_concurrency = max(1, max_concurrency)
+        self.running = 0  # Slots taken, by executing and queued-to-the-pool calls
+        self.pending = deque()  # Calls waiting for a slot
+        self.calls = 0
+        self.executions = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.abandoned = 0  # Timed-out calls still running without a slot
+        self.latencies = deque(maxlen=500)
+
+
+class _Call:
+    """Whether an executing call holds its tool's slot, or gave it back
+    when it timed out (see ToolEngine._expire)."""
+    __slots__ = ('holds_slot', 'abandoned')
+
+    def __init__(self):
+        self.holds_slot = False
+        self.abandoned = False
+
+
+class ToolEngine:
+    """
+    Executes tool calls concurrently on a shared worker pool.
+
+    Each tool has its own concurrency limit, timeout and result TTL.
+    Identical calls (same tool and arguments) that are already running are
+    joined instead of executed again (single-flight), and successful
+    results are cached for the tool's TTL. Calls return Futures, so the
+    caller decides how to wait for them.
+
+    A call that times out cannot be stopped, but it gives its concurrency
+    slot back so that hung calls do not starve the tool. At most
+    `max_concurrency` such abandoned calls per tool are let go at a time;
+    beyond that, timed-out calls keep their slots until they return, which
+    bounds the worker threads one tool can tie up.
+
+    Calls wait for their tool's slot before they reach the shared pool, so
+    a saturated tool queues its own calls without holding worker threads
+    that other tools need.
+    """
+    def __init__(self, max_workers: int = 8, max_cache_entries: int = 1000):
+        self.max_cache_entries = max_cache_entries
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='tool')
+        self._tools: Dict[str, _Tool] = {}
+        self._cache: Dict[str, Any] = {}  # key -> (expires_at, result)
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, fn: Callable[..., Any], max_concurrency: int = 4,
+                 timeout: float = 10.0, ttl: float = 300.0):
+        """Registers `fn` as a tool; it is called with the call's arguments as keywords."""
+        with self._lock:
+            self._tools[name] = _Tool(name, fn, max_concurrency, timeout, ttl)
+
+    @property
+    def tool_names(self):
+        return list(self._tools)
+
+    @staticmethod
+    def make_key(name: str, args: Dict[str, Any]) -> str:
+        """Builds the cache/single-flight key for a call."""
+        return f"{name}|{json.dumps(args, sort_keys=True, default=str)}"
+
+    def submit(self, name: str, args: Optional[Dict[str, Any]] = None) -> Future:
+        """Starts a tool call and returns a Future for its result.
+
+        The Future fails with ToolTimeout if the call takes longer than the
+        tool's timeout, or with the exception the tool raised.
+        """
+        args = args or {}
+        tool = self._tools.get(name)
+        if tool is None:
+            raise UnknownTool(f"Unknown tool: {name}")
+        key = self.make_key(name, args)
+        with self._lock:
+            tool.calls += 1
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                tool.cache_hits += 1
+                future = Future()
+                future.set_result(cached[1])
+                return future
+            future = self._inflight.get(key)
+            if future is not None:
+                tool.coalesced += 1
+                return future
+            future = Future()
+            self._inflight[key] = future
+
+        call = _Call()
+        timer = threading.Timer(tool.timeout, self._expire, (tool, key, future, call))
+        timer.daemon = True
+        job = (tool, key, args, future, timer, call)
+        with self._lock:
+            if tool.running < tool.max_concurrency:
+                tool.running += 1
+                call.holds_slot = True
+            else:
+                tool.pending.append(job)
+                job = None
+        timer.start()
+        if job is not None:
+            self._executor.submit(self._execute, *job)
+        return future
+
+    def call(self, name: str, args: Optional[Dict[str, Any]] = None) -> Any:
+        """Runs a tool call and waits for its result."""
+        return self.submit(name, args).result()
+
+    def _execute(self, tool: _Tool, key: str, args: Dict[str, Any], future: Future,
+                 timer: threading.Timer, call: _Call):
+        if future.done():
+            self._release(tool, call)
+            return  # Timed out while waiting for a worker thread
+        started = time.monotonic()
+        try:
+            result = tool.fn(**args)
+        except Exception as e:
+            with self._lock:
+                tool.errors += 1
+            self._settle(key, future, exception=e)
+            return
+        finally:
+            timer.cancel()
+            self._release(tool, call)
+        with self._lock:
+            tool.executions += 1
+            tool.latencies.append(time.monotonic() - started)
+            self._cache[key] = (time.monotonic() + tool.ttl, result)
+            self._evict()
+        self._settle(key, future, result=result)
+
+    def _expire(self, tool: _Tool, key: str, future: Future, call: _Call):
+        if self._settle(key, future, exception=ToolTimeout(
+                f"Tool '{tool.name}' timed out after {tool.timeout}s")):
+            with self._lock:
+                tool.timeouts += 1
+                if call.holds_slot and tool.abandoned < tool.max_concurrency:
+                    # Let the next call run instead of waiting for this one.
+                    call.holds_slot, call.abandoned = False, True
+                    tool.abandoned += 1
+                    job = self._next_job(tool)
+                else:
+                    job = None
+            if job is not None:
+                self._executor.submit(self._execute, *job)
+
+    def _release(self, tool: _Tool, call: _Call):
+        with self._lock:
+            if call.abandoned:
+                call.abandoned = False
+                tool.abandoned -= 1
+            if not call.holds_slot:
+                return
+            call.holds_slot = False
+            job = self._next_job(tool)
+        if job is not None:
+            self._executor.submit(self._execute, *job)
+
+    def _next_job(self, tool: _Tool):
+        """Hands a freed slot to the oldest queued call that has not timed
+        out yet, or frees it if there is none. Caller must hold self._lock."""
+        while tool.pending:
+            job = tool.pending.popleft()
+            if not job[3].done():
+                job[5].holds_slot = True
+                return job
+        tool.running -= 1
+        return None
+
+    def _settle(self, key: str, future: Future, result: Any = None,
+                exception: Optional[BaseException] = None) -> bool:
+        """Completes a call's Future unless it is already done; returns
+        whether this call completed it."""
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+        try:
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+        except InvalidStateError:
+            return False
+        return True
+
+    def _evict(self):
+        # Caller must hold self._lock.
+        if len(self._cache) <= self.max_cache_entries:
+            return
+        now = time.monotonic()
+        for key in [k for k, (expires, _) in self._cache.items() if expires <= now]:
+            del self._cache[key]
+        while len(self._cache) > self.max_cache_entries:
+            # Dicts keep insertion order, so this drops the oldest entry.
+            del self._cache[next(iter(self._cache))]
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Reports call counters and execution latency (in ms) per tool."""
+        with self._lock:
+            report = {}
+            for name, tool in self._tools.items():
+                latencies = sorted(tool.latencies)
+                report[name] = {
+                    "calls": tool.calls,
+                    "executions": tool.executions,
+                    "cache_hits": tool.cache_hits,
+                    "coalesced": tool.coalesced,
+                    "errors": tool.errors,
+                    "timeouts": tool.timeouts,
+                    "abandoned": tool.abandoned,
+                    "max_concurrency": tool.max_concurrency,
+                    "latency_ms": _latency_summary(latencies),
+                }
+            return report
+
+
+def _latency_summary(latencies):
+    if not latencies:
+        return {"avg": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+    def pick(q):
+        return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 2)
+    return {
+        "avg": round(sum(latencies) / len(latencies) * 1000, 2),
+        "p50": pick(0.5),
+        "p95": pick(0.95),
+        "max": round(latencies[-1] * 1000, 2),
+    }
+
+
+class StubSearchBackend:
+    """
+    An offline stand-in for a web search API.
+
+    Returns deterministic results for a query after a fixed `latency`, so
+    missions and tests can run without network access.
+    """
+    def __init__(self, latency: float = 0.5):
+        self.latency = latency
+        self.queries = []
+
+    def search(self, query: str) -> str:
+        self.queries.append(query)
+        time.sleep(self.latency)
+        return (f"Search results for '{query}': Found relevant information about "
+                f"market trends and industry insights.")
@@ -0,0 +1,131 @@
+"""Planning benchmark: separate clarify/plan calls versus fused planning.
+
+Runs the same missions in both modes against a local stub Ollama server
+that adds a fixed latency to every request (prompt processing and time to
+first token) and a delay per streamed word, and reports how long each mode
+takes until the plan is ready and until the mission has finished, along
+with the number of LLM requests each mission made.
+
+Usage:
+    python benchmarks/bench_fused_planning.py [--runs N] [--latency SECONDS]
+                                              [--token-delay SECONDS] [--json]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from backend import create_app, agent_service, db  # noqa: E402
+from backend.ollama_stub import StubOllama  # noqa: E402
+
+STEPS = [
+    {'step': 'Research the market', 'depends_on': []},
+    {'step': 'Identify target customers', 'depends_on': [1]},
+    {'step': 'Draft a pricing model', 'depends_on': [1]},
+    {'step': 'Write the launch plan', 'depends_on': [2, 3]},
+]
+CLARIFIED = 'Launch an online bakery in Lisbon within six months with a validated pricing model'
+
+
+def respond(prompt, format):
+    if 'Goal Clarifier and Strategic Planner' in prompt:
+        return json.dumps({'clarified_goal': CLARIFIED, 'steps': STEPS})
+    if 'Goal Clarifier' in prompt:
+        return json.dumps({'clarified_goal': CLARIFIED})
+    if 'Strategic Planner' in prompt:
+        return json.dumps({'steps': STEPS})
+    if 'Task Executor' in prompt:
+        return json.dumps({'tool_calls': []})
+    return '# Report\n\nThe bakery can launch on schedule.'
+
+
+class TimedSocketIO:
+    """Records when each pipeline stage started."""
+    def __init__(self):
+        self.started = time.monotonic()
+        self.stages = {}
+
+    def emit(self, event, data=None, **kwargs):
+        if event == 'status_update':
+            self.stages.setdefault(data['node'], time.monotonic() - self.started)
+
+
+def run_mission(app, stub, fused):
+    socketio = TimedSocketIO()
+    service = agent_service.AgentService("Open a bakery", socketio, app, use_cache=False,
+                                         fused_planning=fused)
+    with app.app_context():
+        db.create_mission(service.mission)
+    requests_before = stub.requests
+    socketio.started = time.monotonic()
+    service.run()
+    total = time.monotonic() - socketio.started
+    return {
+        'status': service.mission.status.value,
+        'plan_ready_s': socketio.stages.get('execute_step', total),
+        'total_s': total,
+        'llm_requests': stub.requests - requests_before,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.5,
+                        help='seconds the stub waits before the first token of every reply')
+    parser.add_argument('--token-delay', type=float, default=0.01,
+                        help='seconds between streamed words')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args(argv)
+
+    stub = StubOllama(respond=respond, latency=args.latency, token_delay=args.token_delay).start()
+    fd, path = tempfile.mkstemp()
+    cache_dir = tempfile.TemporaryDirectory()
+    app = create_app({'TESTING': True, 'DATABASE': path, 'PLAN_LIBRARY_ENABLED': False,
+                      'LLM_CACHE_PATH': os.path.join(cache_dir.name, 'llm_cache.sqlite')})
+    with app.app_context():
+        db.init_db()
+    agent_service.CONFIG.update(llm_endpoints=[stub.url], step_delay=0)
+    agent_service.llm = agent_service.report_llm = agent_service.router = None
+    agent_service.LLM_STATUS.update(state='ready')
+
+    try:
+        result = {'latency_s': args.latency, 'token_delay_s': args.token_delay, 'runs': args.runs}
+        for mode, fused in (('separate', False), ('fused', True)):
+            runs = [run_mission(app, stub, fused) for _ in range(args.runs)]
+            result[mode] = {
+                'median_plan_ready_s': round(statistics.median(r['plan_ready_s'] for r in runs), 3),
+                'median_total_s': round(statistics.median(r['total_s'] for r in runs), 3),
+                'llm_requests': runs[0]['llm_requests'],
+                'completed': all(r['status'] == 'COMPLETED' for r in runs),
+            }
+        result['plan_ready_speedup'] = round(result['separate']['median_plan_ready_s']
+                                             / max(result['fused']['median_plan_ready_s'], 1e-9), 2)
+    finally:
+        stub.stop()
+        db.pool.close_idle()
+        os.close(fd)
+        os.unlink(path)
+        cache_dir.cleanup()
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"stub latency {args.latency * 1000:.0f} ms, {args.token_delay * 1000:.0f} ms per word, "
+              f"{args.runs} runs per mode")
+        for mode in ('separate', 'fused'):
+            r = result[mode]
+            print(f"{mode:>9}: plan ready {r['median_plan_ready_s'] * 1000:8.1f} ms | "
+                  f"mission {r['median_total_s'] * 1000:8.1f} ms | {r['llm_requests']} LLM requests")
+        print(f"plan ready {result['plan_ready_speedup']}x sooner with fused planning")
+    return 0 if result['separate']['completed'] and result['fused']['completed'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
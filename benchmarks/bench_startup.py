@@ -0,0 +1,91 @@
+"""Startup benchmark: time from a cold interpreter to the first served request.
+
+Runs the measurement in a fresh Python process so module caches do not hide
+import costs, then checks the result against a time budget and verifies
+that the heavy LLM libraries were not imported on the startup path.
+
+Usage:
+    python benchmarks/bench_startup.py [--budget SECONDS] [--runs N] [--json]
+
+Exits with status 1 if the median time exceeds the budget or a heavy module
+was imported, so it can be used as a regression guard.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must stay off the import/startup path.
+HEAVY_MODULES = ['langchain_core', 'langchain_ollama', 'langgraph']
+
+_PROBE = r"""
+import json, os, sys, tempfile, time
+t0 = time.perf_counter()
+from backend import create_app
+t_import = time.perf_counter()
+fd, path = tempfile.mkstemp()
+# The default config; TESTING keeps the background tasks (model warm-up,
+# health checks, mission resume) from starting against the empty database.
+app = create_app({'TESTING': True, 'DATABASE': path})
+t_app = time.perf_counter()
+response = app.test_client().get('/api/health')
+t_first = time.perf_counter()
+os.close(fd)
+os.unlink(path)
+print(json.dumps({
+    'import_s': t_import - t0,
+    'create_app_s': t_app - t_import,
+    'first_request_s': t_first - t_app,
+    'total_s': t_first - t0,
+    'status_code': response.status_code,
+    'heavy_modules': [m for m in %r if m in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def measure_once():
+    """Runs the startup probe in a fresh interpreter and returns its timings."""
+    out = subprocess.run([sys.executable, '-c', _PROBE], cwd=ROOT,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--budget', type=float, default=2.0,
+                        help='maximum median seconds from interpreter start to first response')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args(argv)
+
+    runs = [measure_once() for _ in range(args.runs)]
+    result = {
+        'median_total_s': statistics.median(r['total_s'] for r in runs),
+        'median_import_s': statistics.median(r['import_s'] for r in runs),
+        'median_create_app_s': statistics.median(r['create_app_s'] for r in runs),
+        'median_first_request_s': statistics.median(r['first_request_s'] for r in runs),
+        'heavy_modules': sorted({m for r in runs for m in r['heavy_modules']}),
+        'budget_s': args.budget,
+    }
+    result['ok'] = (result['median_total_s'] <= args.budget and not result['heavy_modules']
+                    and all(r['status_code'] == 200 for r in runs))
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"import:        {result['median_import_s'] * 1000:8.1f} ms")
+        print(f"create_app:    {result['median_create_app_s'] * 1000:8.1f} ms")
+        print(f"first request: {result['median_first_request_s'] * 1000:8.1f} ms")
+        print(f"total:         {result['median_total_s'] * 1000:8.1f} ms (budget {args.budget * 1000:.0f} ms)")
+        if result['heavy_modules']:
+            print(f"heavy modules imported at startup: {', '.join(result['heavy_modules'])}")
+        print("OK" if result['ok'] else "FAILED")
+    return 0 if result['ok'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
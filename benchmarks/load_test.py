@@ -0,0 +1,393 @@
+"""Load test: concurrent missions against the server and a stub Ollama.
+
+Starts a stub Ollama server (backend/ollama_stub.py) with a configurable
+time to first token and token rate, runs the app in a separate process with
+the eventlet server it uses in production, connects M Socket.IO observers
+and submits N missions at once through POST /api/missions. Once every
+mission has finished it reports:
+
+- missions per minute
+- p50/p95/p99 mission latency, queue wait and time per graph node (from
+  the mission_status transitions the observers receive)
+- Socket.IO events and bytes emitted by the server and received by the
+  observers, per second
+- SQLite statements per second by kind (from /api/metrics)
+- the server process's peak RSS (Linux only)
+
+Results can be written as JSON (--output) and compared with an earlier
+run (--compare) to spot regressions between commits.
+
+Usage:
+    python benchmarks/load_test.py [--missions N] [--observers M] [--latency SECONDS]
+                                   [--token-rate TOKENS_PER_SECOND] [--max-concurrent K]
+                                   [--step-delay SECONDS] [--executor-workers W] [--timeout SECONDS]
+                                   [--output FILE] [--compare FILE] [--server-log FILE] [--json]
+"""
+import argparse
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from backend.ollama_stub import StubOllama  # noqa: E402
+
+# The server process: monkey-patched eventlet, as in run.py.
+_SERVER = r"""
+try:
+    import trio  # Needs the unpatched select module (see run.py)
+except ImportError:
+    pass
+import eventlet
+eventlet.monkey_patch()
+import json, sys
+from backend import agent_service, create_app, db
+from backend.app import socketio
+options = json.loads(sys.argv[1])
+agent_service.CONFIG.update(options['agent'])
+app = create_app(options['app'])
+with app.app_context():
+    db.init_db()
+socketio.run(app, host='127.0.0.1', port=options['port'], log_output=False)
+"""
+
+STEPS = [
+    {'step': 'Research the market', 'depends_on': []},
+    {'step': 'Identify target customers', 'depends_on': [1]},
+    {'step': 'Draft a pricing model', 'depends_on': [1]},
+    {'step': 'Write the launch plan', 'depends_on': [2, 3]},
+]
+REPORT = ('# Report\n\nThe market research, customer profile and pricing model support a '
+          'launch within six months. ' * 4)
+
+NODES = {'CLARIFYING': 'clarify_goal', 'PLANNING': 'create_plan',
+         'EXECUTING': 'execute_step', 'REPORTING': 'synthesize_report'}
+TERMINAL = {'COMPLETED', 'FAILED', 'CANCELLED'}
+
+
+def respond(prompt, format):
+    if 'Goal Clarifier and Strategic Planner' in prompt:
+        return json.dumps({'clarified_goal': 'Launch an online bakery', 'steps': STEPS})
+    if 'Goal Clarifier' in prompt:
+        return json.dumps({'clarified_goal': 'Launch an online bakery within six months'})
+    if 'Strategic Planner' in prompt:
+        return json.dumps({'steps': STEPS})
+    if 'Task Executor' in prompt:
+        return json.dumps({'tool_calls': [{'tool': 'web_search', 'args': {'query': 'bakery market'}}]})
+    if 'preparing material for a report' in prompt:
+        return 'Summary of the steps so far.'
+    return REPORT
+
+
+class Observer:
+    """A Socket.IO client standing in for a browser: counts every event it
+    receives and records when each mission changed status."""
+    def __init__(self, url):
+        import socketio
+        self.client = socketio.Client(reconnection=False)
+        self.events = 0
+        self.bytes = 0
+        self.timelines = {}  # mission id -> [(status, monotonic time)]
+        self.changed = threading.Condition()
+        self.client.on('*', self._on_event)
+        self.client.connect(url, wait_timeout=10)
+
+    def _on_event(self, event, data=None):
+        size = len(json.dumps(data, separators=(',', ':')))
+        with self.changed:
+            self.events += 1
+            self.bytes += size
+            if event == 'mission_status':
+                self.timelines.setdefault(data['mission_id'], []).append((data['status'], time.monotonic()))
+                self.changed.notify_all()
+
+    def join(self, mission_id):
+        self.client.emit('join_mission', {'mission_id': mission_id})
+
+    def wait_until_finished(self, mission_ids, timeout):
+        deadline = time.monotonic() + timeout
+        with self.changed:
+            while not all(self._finished(m) for m in mission_ids):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.changed.wait(remaining)
+        return True
+
+    def _finished(self, mission_id):
+        return any(status in TERMINAL for status, _ in self.timelines.get(mission_id, []))
+
+    def close(self):
+        self.client.disconnect()
+
+
+def percentiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+
+    def at(q):
+        position = (len(values) - 1) * q
+        low = int(position)
+        high = min(low + 1, len(values) - 1)
+        return values[low] + (values[high] - values[low]) * (position - low)
+    return {'p50': round(at(0.5), 4), 'p95': round(at(0.95), 4), 'p99': round(at(0.99), 4),
+            'max': round(values[-1], 4), 'count': len(values)}
+
+
+def parse_metrics(text):
+    """Returns {(name, labels): value} for the samples in a Prometheus text exposition."""
+    samples = {}
+    for line in text.splitlines():
+        match = re.match(r'^([a-zA-Z_:][\w:]*)(\{.*\})? (\S+)$', line)
+        if match:
+            samples[(match.group(1), match.group(2) or '')] = float(match.group(3))
+    return samples
+
+
+def metric_deltas(before, after, name):
+    """Returns {label text: increase} for one metric between two scrapes."""
+    return {labels: value - before.get((metric, labels), 0)
+            for (metric, labels), value in after.items() if metric == name}
+
+
+def label(labels, key):
+    match = re.search(key + r'="([^"]*)"', labels)
+    return match.group(1) if match else ''
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def peak_rss_mb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_server(port, stub, args, db_path, cache_path):
+    options = {
+        'port': port,
+        'app': {'DATABASE': db_path, 'LLM_CACHE_PATH': cache_path, 'LLM_WARMUP': False,
+                'SWAGGER_ENABLED': False, 'MAX_CONCURRENT_MISSIONS': args.max_concurrent,
+                'MISSION_QUEUE_SIZE': args.missions, 'PLAN_LIBRARY_ENABLED': False,
+                'EXECUTOR_POOL_WORKERS': args.executor_workers},
+        'agent': {'llm_endpoints': [stub.url], 'step_delay': args.step_delay,
+                  'search_latency': 0.05},
+    }
+    log = open(args.server_log, 'w') if args.server_log else subprocess.DEVNULL
+    process = subprocess.Popen([sys.executable, '-c', _SERVER, json.dumps(options)], cwd=ROOT,
+                               stdout=log, stderr=subprocess.STDOUT)
+    import requests
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with status {process.returncode}")
+        try:
+            if requests.get(f'http://127.0.0.1:{port}/api/health', timeout=1).ok:
+                return process
+        except requests.RequestException:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("server did not start within 30s")
+
+
+def run(args):
+    import requests
+    token_delay = 1.0 / args.token_rate if args.token_rate > 0 else 0.0
+    stub = StubOllama(respond=respond, latency=args.latency, token_delay=token_delay).start()
+    workdir = tempfile.TemporaryDirectory()
+    port = free_port()
+    url = f'http://127.0.0.1:{port}'
+    server = start_server(port, stub, args, os.path.join(workdir.name, 'planner.sqlite'),
+                          os.path.join(workdir.name, 'llm_cache.sqlite'))
+    observers = []
+    try:
+        observers = [Observer(url) for _ in range(args.observers)]
+        before = parse_metrics(requests.get(f'{url}/api/metrics').text)
+        submitted = {}
+
+        def submit(i):
+            started = time.monotonic()
+            response = requests.post(f'{url}/api/missions', timeout=30, json={
+                'goal': f'Open bakery number {i} in a new city', 'use_cache': False})
+            if response.status_code != 202:
+                return None
+            mission_id = response.json()['id']
+            submitted[mission_id] = started
+            # Each mission is watched by one observer, as a browser would.
+            observers[i % len(observers)].join(mission_id)
+            return mission_id
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=min(args.missions, 32)) as pool:
+            ids = [m for m in pool.map(submit, range(args.missions)) if m]
+        finished = observers[0].wait_until_finished(ids, args.timeout)
+        elapsed = time.monotonic() - started
+        time.sleep(0.5)  # Let trailing events arrive before counting them
+        after = parse_metrics(requests.get(f'{url}/api/metrics').text)
+        rss = peak_rss_mb(server.pid)
+    finally:
+        for observer in observers:
+            observer.close()
+        server.terminate()
+        try:
+            server.wait(10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        stub.stop()
+        workdir.cleanup()
+
+    timelines = observers[0].timelines
+    latencies = {'mission': [], 'queue_wait': []}
+    statuses = {}
+    for mission_id, submitted_at in submitted.items():
+        timeline = timelines.get(mission_id, [])
+        if not timeline:
+            continue
+        statuses[timeline[-1][0]] = statuses.get(timeline[-1][0], 0) + 1
+        if timeline[-1][0] in TERMINAL:
+            latencies['mission'].append(timeline[-1][1] - submitted_at)
+        latencies['queue_wait'].append(timeline[0][1] - submitted_at)
+        for (status, at), (_, until) in zip(timeline, timeline[1:]):
+            if status in NODES:
+                latencies.setdefault(NODES[status], []).append(until - at)
+
+    emits = metric_deltas(before, after, 'ai_planner_socketio_emits_total')
+    emit_bytes = metric_deltas(before, after, 'ai_planner_socketio_emit_bytes_total')
+    queries = metric_deltas(before, after, 'ai_planner_sqlite_query_duration_seconds_count')
+    statements = {label(labels, 'operation'): round(count / elapsed, 1)
+                  for labels, count in sorted(queries.items()) if count}
+    events = sum(o.events for o in observers)
+    return {
+        'commit': git_commit(),
+        'parameters': {'missions': args.missions, 'observers': args.observers, 'latency_s': args.latency,
+                       'token_rate': args.token_rate, 'max_concurrent': args.max_concurrent,
+                       'step_delay_s': args.step_delay},
+        'missions': {'submitted': len(ids), 'rejected': args.missions - len(ids),
+                     'finished_in_time': finished, 'statuses': statuses,
+                     'elapsed_s': round(elapsed, 3),
+                     'per_minute': round(statuses.get('COMPLETED', 0) / elapsed * 60, 2)},
+        'latency_s': {name: percentiles(values) for name, values in latencies.items()},
+        'socketio': {
+            'server_emits_per_s': round(sum(emits.values()) / elapsed, 1),
+            'server_emit_bytes_per_s': round(sum(emit_bytes.values()) / elapsed, 1),
+            'server_emits_by_event': {label(k, 'event'): int(v) for k, v in sorted(emits.items()) if v},
+            'observer_events_per_s': round(events / elapsed, 1),
+            'observer_bytes_per_s': round(sum(o.bytes for o in observers) / elapsed, 1),
+        },
+        'sqlite': {
+            'statements_per_s': statements,
+            'writes_per_s': round(sum(statements.get(op, 0) for op in ('insert', 'update', 'delete')), 1),
+            'commits_per_s': statements.get('commit', 0),
+        },
+        'llm': {'requests': stub.requests, 'max_in_flight': stub.max_active},
+        'server': {'peak_rss_mb': rss},
+    }
+
+
+def flatten(value, prefix=''):
+    if isinstance(value, dict):
+        items = {}
+        for key, item in value.items():
+            items.update(flatten(item, f'{prefix}{key}.'))
+        return items
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix[:-1]: value}
+    return {}
+
+
+def compare(result, baseline):
+    """Lists the numeric results that changed since `baseline`, as relative changes."""
+    current, previous = flatten(result), flatten(baseline)
+    changes = {}
+    for key in sorted(current.keys() & previous.keys()):
+        if key.startswith('parameters.') or current[key] == previous[key]:
+            continue
+        change = (current[key] - previous[key]) / previous[key] if previous[key] else None
+        changes[key] = {'baseline': previous[key], 'current': current[key],
+                        'change': None if change is None else round(change, 4)}
+    return changes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--missions', type=int, default=20, help='missions submitted at once')
+    parser.add_argument('--observers', type=int, default=4, help='Socket.IO clients watching missions')
+    parser.add_argument('--latency', type=float, default=0.2,
+                        help='seconds the stub waits before the first token of every reply')
+    parser.add_argument('--token-rate', type=float, default=200,
+                        help='tokens (words) per second the stub streams; 0 for no delay')
+    parser.add_argument('--max-concurrent', type=int, default=4, help='MAX_CONCURRENT_MISSIONS')
+    parser.add_argument('--step-delay', type=float, default=0.1, help='simulated work per step')
+    parser.add_argument('--executor-workers', type=int, default=0,
+                        help='run missions in this many executor processes (EXECUTOR_POOL_WORKERS)')
+    parser.add_argument('--timeout', type=float, default=600, help='seconds to wait for the missions')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='compare with the results of an earlier run')
+    parser.add_argument('--server-log', help="write the server's console output to this file")
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args(argv)
+    if args.missions < 1 or args.observers < 1:
+        parser.error('--missions and --observers must be at least 1')
+
+    result = run(args)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        result['comparison'] = {'baseline_commit': baseline.get('commit'),
+                                'changes': compare(result, baseline)}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        missions = result['missions']
+        print(f"{missions['submitted']} missions ({missions['rejected']} rejected), {args.observers} observers, "
+              f"stub latency {args.latency * 1000:.0f} ms at {args.token_rate:g} tokens/s")
+        print(f"missions/minute: {missions['per_minute']} ({missions['statuses']} in {missions['elapsed_s']} s)")
+        for name, stats in result['latency_s'].items():
+            if stats:
+                print(f"{name:>18}: p50 {stats['p50'] * 1000:8.1f} ms | p95 {stats['p95'] * 1000:8.1f} ms | "
+                      f"p99 {stats['p99'] * 1000:8.1f} ms")
+        sio = result['socketio']
+        print(f"socket.io: server {sio['server_emits_per_s']} emits/s ({sio['server_emit_bytes_per_s']} B/s), "
+              f"observers {sio['observer_events_per_s']} events/s")
+        print(f"sqlite: {result['sqlite']['writes_per_s']} writes/s, {result['sqlite']['commits_per_s']} commits/s")
+        print(f"server peak RSS: {result['server']['peak_rss_mb']} MB")
+        for key, change in result.get('comparison', {}).get('changes', {}).items():
+            if change['change'] is not None:
+                print(f"  {key}: {change['baseline']} -> {change['current']} ({change['change']:+.1%})")
+    missions = result['missions']
+    ok = missions['finished_in_time'] and missions['statuses'].get('COMPLETED', 0) == missions['submitted']
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
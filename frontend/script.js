@@ -3,14 +3,28 @@ document.addEventListener('DOMContentLoaded', () => {
     // --- 1. State and Constants ---
     const API_URL = 'http://localhost:5000/api/missions';
     const IDEAS_URL = 'http://localhost:5000/api/ideas';
+    const SEARCH_URL = 'http://localhost:5000/api/search';
     const SOCKET_URL = 'http://localhost:5000';
+    // WebSocket first: behind a load balancer it needs no sticky sessions,
+    // unlike long-polling (the server can be limited to it, see wsgi.py).
+    const SOCKET_TRANSPORTS = ['websocket', 'polling'];
+    // Mission statuses in the order a mission goes through them.
+    const STATUS_ORDER = ['PENDING', 'QUEUED', 'CLARIFYING', 'PLANNING', 'EXECUTING', 'REPORTING',
+                          'COMPLETED', 'FAILED', 'CANCELLED'];
 
     const appState = {
         isSidebarOpen: false,
         isExecuting: false,
         completedNodes: new Set(), // Track all completed nodes for visualization
         socket: null, // To hold the socket instance
+        missionId: null, // The mission whose room this page has joined
+        lastSeq: 0, // Sequence number of the last log entry rendered for that mission
+        missionStatus: null, // Last status shown for that mission
+        pendingEvents: null, // Mission events received while a new mission is being started
+        missionsEtag: null, // ETag of the mission list currently rendered
         status: 'IDLE', // IDLE, CONNECTING, RUNNING, COMPLETED, FAILED
+        reportText: '', // Report Markdown received so far (streamed in chunks)
+        reportRenderPending: false, // Whether a report re-render is scheduled
     };
 
     // --- 2. DOM Element Cache ---
@@ -21,6 +35,7 @@ document.addEventListener('DOMContentLoaded', () => {
         sidebarClose: document.getElementById('sidebar-close'),
         goalInput: document.getElementById('goal-input'),
         startButton: document.getElementById('start-button'),
+        cancelButton: document.getElementById('cancel-button'),
         statusIndicator: document.getElementById('status-indicator'),
         logContainer: document.getElementById('log-container'),
         logPlaceholder: document.getElementById('log-placeholder'),
@@ -37,6 +52,8 @@ document.addEventListener('DOMContentLoaded', () => {
         editIdeaId: document.getElementById('edit-idea-id'),
         editIdeaInput: document.getElementById('edit-idea-input'),
         saveIdeaBtn: document.getElementById('save-idea-btn'),
+        searchInput: document.getElementById('search-input'),
+        searchResultsList: document.getElementById('search-results-list'),
     };
 
     const graph = {
@@ -68,14 +85,16 @@ document.addEventListener('DOMContentLoaded', () => {
             appState.isExecuting = isExecuting;
             dom.startButton.disabled = isExecuting;
             dom.goalInput.disabled = isExecuting;
+            dom.cancelButton.classList.toggle('d-none', !isExecuting);
+            dom.cancelButton.disabled = false;
         },
         updateStatus(status, color, connected) {
             appState.status = status;
             const icons = {
-                IDLE: 'bi-broadcast', CONNECTING: 'bi-plug', RUNNING: 'bi-gear-wide-connected',
-                COMPLETED: 'bi-check-circle', FAILED: 'bi-exclamation-triangle-fill'
+                IDLE: 'bi-broadcast', CONNECTING: 'bi-plug', QUEUED: 'bi-hourglass-split', RUNNING: 'bi-gear-wide-connected',
+                COMPLETED: 'bi-check-circle', FAILED: 'bi-exclamation-triangle-fill', CANCELLED: 'bi-stop-circle'
             };
-            const pulseClass = (status === 'RUNNING' || status === 'CONNECTING') ? 'animate-pulse' : '';
+            const pulseClass = (status === 'RUNNING' || status === 'CONNECTING' || status === 'QUEUED') ? 'animate-pulse' : '';
             const dotClass = connected ? 'connected' : '';
 
             dom.statusIndicator.innerHTML = `
@@ -124,7 +143,29 @@ document.addEventListener('DOMContentLoaded', () => {
             const activeNode = document.querySelector(`[data-node="${nodeName}"]`);
             if (activeNode) activeNode.classList.add('loading');
         },
+        renderReport(markdown) {
+            // Use the 'marked' library (included in ai_planner.html) to parse the report.
+            // This converts Markdown into rich HTML.
+            if (window.marked) {
+                dom.finalReport.innerHTML = window.marked.parse(markdown);
+            } else {
+                dom.finalReport.innerHTML = `<p>${markdown.replace(/\n/g, '<br>')}</p>`;
+            }
+        },
+        appendReportChunk(chunk) {
+            const isFirstChunk = appState.reportText === '';
+            appState.reportText += chunk;
+            if (isFirstChunk) dom.reportTab.show();
+            // Re-render at most once per animation frame while chunks stream in.
+            if (appState.reportRenderPending) return;
+            appState.reportRenderPending = true;
+            requestAnimationFrame(() => {
+                appState.reportRenderPending = false;
+                this.renderReport(appState.reportText);
+            });
+        },
         reset() {
+            appState.reportText = '';
             dom.logContainer.innerHTML = templates.emptyLog;
             dom.logPlaceholder = document.getElementById('log-placeholder'); // Re-cache
             dom.finalReport.innerHTML = templates.emptyReport;
@@ -142,9 +183,13 @@ document.addEventListener('DOMContentLoaded', () => {
     // --- 4. Data & Event Handling ---
     async function fetchAndRenderMissions() {
         try {
-            const response = await fetch(API_URL);
+            // Send the ETag of what is on screen; 304 means nothing changed.
+            const headers = appState.missionsEtag ? { 'If-None-Match': appState.missionsEtag } : {};
+            const response = await fetch(`${API_URL}?limit=50`, { headers, cache: 'no-store' });
+            if (response.status === 304) return;
             if (!response.ok) throw new Error('Failed to fetch missions.');
             const missions = await response.json();
+            appState.missionsEtag = response.headers.get('ETag');
 
             dom.activeMissionsList.innerHTML = ''; // Clear loading message
             if (missions.length === 0) {
@@ -167,6 +212,7 @@ document.addEventListener('DOMContentLoaded', () => {
             });
         } catch (error) {
             console.error('Error fetching missions:', error);
+            appState.missionsEtag = null; // Force a full reload next time
             dom.activeMissionsList.innerHTML = '<li class="list-group-item bg-transparent text-danger small">Could not load missions.</li>';
         }
     }
@@ -264,6 +310,74 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    let searchTimer = null;
+
+    function handleSearchInput() {
+        // Debounce so we search once the user pauses typing.
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(runSearch, 250);
+    }
+
+    async function runSearch() {
+        const q = dom.searchInput.value.trim();
+        if (!q) {
+            dom.searchResultsList.innerHTML = '';
+            return;
+        }
+        try {
+            const response = await fetch(`${SEARCH_URL}?q=${encodeURIComponent(q)}&limit=10`);
+            if (!response.ok) throw new Error('Search failed.');
+            const { results } = await response.json();
+            if (q !== dom.searchInput.value.trim()) return; // A newer search is pending
+
+            if (results.length === 0) {
+                dom.searchResultsList.innerHTML = '<li class="list-group-item bg-transparent text-muted small">No matches.</li>';
+                return;
+            }
+            dom.searchResultsList.innerHTML = '';
+            results.forEach(result => {
+                const li = document.createElement('li');
+                li.className = 'list-group-item bg-transparent border-secondary search-result';
+                li.dataset.type = result.type;
+                li.dataset.id = result.id;
+                li.dataset.goal = result.goal;
+                const badge = result.type === 'mission' ? (result.status || 'MISSION') : 'IDEA';
+                // The snippet is escaped by the server; only <mark> tags are HTML.
+                li.innerHTML = `
+                    <small class="text-muted">${badge}</small>
+                    <div class="small text-truncate">${result.snippet}</div>`;
+                dom.searchResultsList.appendChild(li);
+            });
+        } catch (error) {
+            console.error('Error searching:', error);
+            dom.searchResultsList.innerHTML = '<li class="list-group-item bg-transparent text-danger small">Search failed.</li>';
+        }
+    }
+
+    async function handleSearchResultClick(e) {
+        const item = e.target.closest('.search-result');
+        if (!item) return;
+        if (item.dataset.type === 'idea') {
+            dom.goalInput.value = item.dataset.goal;
+            return;
+        }
+        // Missions: load the full record (plan and report are fetched on demand).
+        try {
+            const response = await fetch(`${API_URL}/${item.dataset.id}`);
+            if (!response.ok) throw new Error('Failed to load mission.');
+            const mission = await response.json();
+            if (mission.report) {
+                appState.reportText = mission.report;
+                ui.renderReport(mission.report);
+                dom.reportTab.show();
+            } else {
+                dom.goalInput.value = mission.goal;
+            }
+        } catch (error) {
+            console.error('Error loading mission:', error);
+        }
+    }
+
     function handleIdeaClick(e) {
         const useBtn = e.target.closest('.use-idea-btn');
         const editBtn = e.target.closest('.edit-idea-btn');
@@ -330,14 +444,23 @@ document.addEventListener('DOMContentLoaded', () => {
             ui.toggleSidebar(false);
         }
 
+        // The server subscribes this socket to the new mission before it starts;
+        // hold on to its events until the POST tells us the mission's id.
+        leaveMission();
+        appState.pendingEvents = [];
+
         try {
             // Use fetch to start the mission
             const response = await fetch(API_URL, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ goal })
+                body: JSON.stringify({ goal, socket_id: appState.socket.id })
             });
 
+            if (response.status === 429) {
+                const retryAfter = response.headers.get('Retry-After');
+                throw new Error(`The server is busy. Please try again in about ${retryAfter} seconds.`);
+            }
             if (!response.ok) {
                 const errorData = await response.json();
                 throw new Error(errorData.error || `HTTP error! status: ${response.status}`);
@@ -345,11 +468,17 @@ document.addEventListener('DOMContentLoaded', () => {
 
             const missionData = await response.json();
             console.log('Mission started:', missionData);
+            joinMission(missionData.id);
+            if (missionData.status === 'QUEUED') {
+                ui.updateStatus('QUEUED', 'warning', true);
+                ui.logMessage(`⏳ Mission queued at position ${missionData.queue_position} (estimated wait ~${missionData.estimated_wait}s).`);
+            }
             // Refresh the active missions list to include the new one
             await fetchAndRenderMissions();
             // The backend will now send updates via WebSocket
 
         } catch (error) {
+            appState.pendingEvents = null;
             console.error('Execution failed:', error);
             ui.logMessage(`<strong>Error starting mission:</strong> ${error.message}`);
             ui.updateStatus('FAILED', 'danger', false);
@@ -358,11 +487,93 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    async function handleCancel() {
+        if (!appState.missionId) return;
+        dom.cancelButton.disabled = true;
+        try {
+            const response = await fetch(`${API_URL}/${appState.missionId}/cancel`, { method: 'POST' });
+            if (!response.ok) {
+                const errorData = await response.json();
+                throw new Error(errorData.error || `HTTP error! status: ${response.status}`);
+            }
+            // The CANCELLED status arrives over the socket once the mission has stopped.
+        } catch (error) {
+            console.error('Cancel failed:', error);
+            ui.logMessage(`<strong>Error cancelling mission:</strong> ${error.message}`);
+            dom.cancelButton.disabled = false;
+        }
+    }
+
+    function joinMission(missionId) {
+        // Mission events are sent to a room per mission; follow only this one.
+        if (appState.missionId !== missionId) leaveMission();
+        appState.missionId = missionId;
+        appState.lastSeq = 0;
+        appState.missionStatus = null;
+        // Deliver what arrived for this mission before its id was known.
+        const pending = appState.pendingEvents || [];
+        appState.pendingEvents = null;
+        pending.filter(e => e.data.mission_id === missionId).forEach(e => e.handler(e.data));
+        requestJoin();
+    }
+
+    function leaveMission() {
+        if (!appState.missionId) return;
+        appState.socket.emit('leave_mission', { mission_id: appState.missionId });
+        appState.missionId = null;
+    }
+
+    function requestJoin() {
+        // The server replays the log entries we have not seen; status updates are
+        // not replayed, so catch up with the status it reports in the ack.
+        const missionId = appState.missionId;
+        appState.socket.emit('join_mission', { mission_id: missionId, after: appState.lastSeq }, (ack) => {
+            if (!ack || !ack.ok || !ack.status || missionId !== appState.missionId) return;
+            if (STATUS_ORDER.indexOf(ack.status) > STATUS_ORDER.indexOf(appState.missionStatus)) {
+                applyStatus({ mission_id: missionId, status: ack.status, node: ack.node });
+            }
+        });
+    }
+
+    function isCurrentMission(data) {
+        return !data.mission_id || data.mission_id === appState.missionId;
+    }
+
+    function onMissionEvent(name, handler) {
+        appState.socket.on(name, (data) => {
+            if (data.mission_id && appState.pendingEvents && !appState.missionId) {
+                appState.pendingEvents.push({ handler, data });
+                return;
+            }
+            if (!isCurrentMission(data)) return;
+            handler(data);
+        });
+    }
+
+    function applyStatus(data) {
+        console.log('Status update:', data);
+        appState.missionStatus = data.status;
+        if (data.node) ui.updateGraph(data.node);
+        ui.updateStatus(data.status, 'info', true);
+
+        if (['COMPLETED', 'FAILED', 'CANCELLED'].includes(data.status)) {
+            ui.setExecuting(false);
+            graph.nodes.forEach(n => n.classList.remove('loading'));
+            const colors = { COMPLETED: 'success', FAILED: 'danger', CANCELLED: 'secondary' };
+            ui.updateStatus(data.status, colors[data.status], true);
+            // Refresh the list to show the final status
+            fetchAndRenderMissions();
+        }
+    }
+
     function setupSocketListeners() {
-        appState.socket = io(SOCKET_URL);
+        appState.socket = io(SOCKET_URL, { transports: SOCKET_TRANSPORTS });
 
         appState.socket.on('connect', () => {
             console.log('Socket.IO connected!');
+            // Rooms do not survive a reconnect, so re-join the current mission and
+            // let the server replay only the log entries we have not seen yet.
+            if (appState.missionId) requestJoin();
             ui.updateStatus(appState.isExecuting ? 'RUNNING' : 'IDLE', 'secondary', true);
             dom.connectionError.classList.add('d-none');
         });
@@ -381,44 +592,57 @@ document.addEventListener('DOMContentLoaded', () => {
             dom.connectionError.classList.remove('d-none');
         });
 
-        appState.socket.on('log', (data) => {
-            console.log('Log received:', data.message);
+        function renderLogEntry(entry) {
+            // Entries replayed or batched by the server carry a sequence number;
+            // skip any we have already shown (e.g. after a reconnect).
+            if (entry.seq !== undefined) {
+                if (entry.seq <= appState.lastSeq) return;
+                appState.lastSeq = entry.seq;
+            }
             // Check if the log message includes a plan to be formatted
-            if (data.plan && Array.isArray(data.plan)) {
-                const planHtml = data.plan.map(step => `<li>${step}</li>`).join('');
+            const plan = entry.plan || (entry.data && entry.data.plan);
+            if (plan && Array.isArray(plan)) {
+                const planHtml = plan.map(step => `<li>${step}</li>`).join('');
                 const formattedMessage = `
-                    ${data.message}
+                    ${entry.message}
                     <ul class="log-plan-list">${planHtml}</ul>
                 `;
                 ui.logMessage(formattedMessage);
             } else {
-                ui.logMessage(data.message);
+                ui.logMessage(entry.message);
             }
+        }
+
+        onMissionEvent('log', (data) => {
+            console.log('Log received:', data.message);
+            renderLogEntry(data);
+        });
+
+        // The backend batches log lines; render each entry of the batch in order.
+        onMissionEvent('log_batch', (data) => {
+            data.logs.forEach(renderLogEntry);
         });
 
-        appState.socket.on('status_update', (data) => {
-            console.log('Status update:', data);
-            ui.updateGraph(data.node);
-            ui.updateStatus(data.status, 'info', true);
+        onMissionEvent('status_update', applyStatus);
 
-            if (data.status === 'COMPLETED' || data.status === 'FAILED') {
-                ui.setExecuting(false);
-                graph.nodes.forEach(n => n.classList.remove('loading'));
-                ui.updateStatus(data.status, data.status === 'COMPLETED' ? 'success' : 'danger', true);
-                // Refresh the list to show the final status
-                fetchAndRenderMissions();
-            }
+        onMissionEvent('report_chunk', (data) => {
+            ui.appendReportChunk(data.chunk);
         });
 
-        appState.socket.on('final_report', (data) => {
-            // Use the 'marked' library (included in ai_planner.html) to parse the report.
-            // This converts Markdown into rich HTML.
-            if (window.marked) {
-                dom.finalReport.innerHTML = window.marked.parse(data.report);
-            } else {
-                dom.finalReport.innerHTML = `<p>${data.report.replace(/\n/g, '<br>')}</p>`;
+        onMissionEvent('final_report', (data) => {
+            // The complete report replaces whatever was streamed so far.
+            const wasStreaming = appState.reportText !== '';
+            appState.reportText = data.report;
+            ui.renderReport(data.report);
+            if (!wasStreaming) dom.reportTab.show();
+        });
+
+        // Global summary channel: refresh the list when any other mission finishes.
+        appState.socket.on('mission_status', (data) => {
+            if (data.mission_id === appState.missionId) return; // Handled by status_update
+            if (['COMPLETED', 'FAILED', 'CANCELLED'].includes(data.status)) {
+                fetchAndRenderMissions();
             }
-            dom.reportTab.show();
         });
 
         // If server requests a reload (e.g. backend restarted), reload the page
@@ -442,6 +666,9 @@ document.addEventListener('DOMContentLoaded', () => {
         dom.addIdeaForm.addEventListener('submit', handleAddIdea);
         dom.saveIdeaBtn.addEventListener('click', handleSaveIdea);
         dom.startButton.addEventListener('click', handleExecute);
+        dom.cancelButton.addEventListener('click', handleCancel);
+        dom.searchInput.addEventListener('input', handleSearchInput);
+        dom.searchResultsList.addEventListener('click', handleSearchResultClick);
 
         // Initial render
         fetchAndRenderIdeas();
@@ -1,13 +1,29 @@
 # This is the main entry point to run the application.
 import os
-import threading
-import webbrowser
-from backend.app import create_app, socketio
+
+# Async missions run on eventlet's asyncio hub, which has to be chosen before
+# eventlet is imported.
+if os.environ.get('MISSION_EXECUTION') == 'async':
+    os.environ.setdefault('EVENTLET_HUB', 'asyncio')
+
+# httpcore (used to reach Ollama) imports trio when it is installed, and trio
+# needs select.epoll, which eventlet's green select module does not provide.
+# Import it before patching; nothing here runs on trio.
+try:
+    import trio  # noqa: F401
+except ImportError:
+    pass
+
 import eventlet
 
-# Apply eventlet's monkey patching for cooperative multi-threading.
+# Apply eventlet's monkey patching for cooperative multi-threading. This must
+# happen before anything else imports threading, socket or the app.
 eventlet.monkey_patch()
 
+import threading
+import webbrowser
+from backend.app import create_app, socketio
+
 if __name__ == '__main__':
     print("\n" + "=" * 60)
     print("🚀 AI Planner Backend Server")
@@ -0,0 +1,56 @@
+"""
+Production entry point. Unlike run.py it opens no browser tabs and takes its
+settings from the environment, and it can be served by gunicorn:
+
+    gunicorn --worker-class eventlet -w 1 --bind 0.0.0.0:5001 wsgi:app
+
+or run directly with `python wsgi.py` (HOST and PORT, default 0.0.0.0:5000).
+Do not use gunicorn's --preload: each worker must create its own app.
+
+To scale out, run several such processes on one host (they share the SQLite
+database in the instance folder):
+
+- Set SOCKETIO_MESSAGE_QUEUE (e.g. redis://localhost:6379/0) so that events
+  of a mission running on one worker reach clients connected to the others.
+- Route every client to a single worker with sticky sessions (e.g. nginx
+  ip_hash), which Socket.IO's long-polling requires, or set
+  SOCKETIO_TRANSPORTS=websocket, which needs no stickiness and also allows
+  more than one gunicorn worker per process.
+- Give each process a distinct WORKER_ID if hostname and pid do not tell
+  them apart. A mission is owned by the worker that started it; if that
+  worker dies, another resumes it once MISSION_LEASE_TIMEOUT has passed.
+
+Setting EXECUTOR_POOL_WORKERS runs missions in that many executor processes
+per server instead of in the server itself (see backend/executor_pool.py).
+"""
+import os
+import sys
+
+# See run.py: the asyncio hub has to be chosen before eventlet is imported.
+if os.environ.get('MISSION_EXECUTION') == 'async':
+    os.environ.setdefault('EVENTLET_HUB', 'asyncio')
+
+import eventlet.patcher
+
+if eventlet.patcher.is_monkey_patched('select'):
+    # Already patched by gunicorn's eventlet worker. trio would fail to
+    # import without select.epoll, so make httpcore run without it.
+    sys.modules.setdefault('trio', None)
+else:
+    # See run.py: trio must be imported before patching.
+    try:
+        import trio  # noqa: F401
+    except ImportError:
+        pass
+    import eventlet
+    eventlet.monkey_patch()
+
+from backend.app import create_app, socketio
+
+app = create_app()
+
+if __name__ == '__main__':
+    host = os.environ.get('HOST', '0.0.0.0')
+    port = int(os.environ.get('PORT', 5000))
+    print(f"AI Planner worker {app.config['WORKER_ID']} listening on {host}:{port}")
+    socketio.run(app, host=host, port=port)